@@ -0,0 +1,332 @@
+"""
+Throughput benchmarks for the Archess environments.
+
+Every scenario plays real games, so the numbers reflect legal play rather
+than the invalid-move fast path that random ``action_space.sample()``
+actions mostly hit:
+
+- legal_random: single env, uniform random legal move vs. the random opponent
+- greedy_vs_greedy: single env, greedy agent vs. the greedy opponent
+- masked: single env, random move drawn from ``action_masks()`` (the MaskablePPO path)
+- vectorized_b<B>: ``ArchessVecEnv`` with B games, masked random moves
+- render_rgb_array: single env stepping and rendering every frame to an array
+- startup: import time and peak RSS of a fresh interpreter that creates an
+  ArchessEnv, with and without the pygame rendering backend loaded; the
+  difference is what every headless worker process saves
+
+Each scenario runs twice: once untouched for steps per second, and once
+with a ``PhaseTimer`` that wraps the env's decode, validation, move
+generation, game-end, opponent and observation methods for a per-phase
+breakdown. Phase times are exclusive (a nested phase is not counted in its
+caller), and whatever no phase covers is reported as ``other``.
+
+Run ``python archess_benchmark.py --json bench.json`` and later
+``python archess_benchmark.py --baseline bench.json`` to flag regressions.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from archess_profiling import PhaseTimer
+
+VEC_SIZES = (1, 4, 16, 64, 256, 1024)
+MAX_EPISODE_STEPS = 200  # Same limit as the registered Archess-v0
+
+# Env method -> phase
+ENV_PHASES = {
+    '_decode_action': 'decode',
+    '_is_valid_move': 'validation',
+    '_get_possible_moves': 'movegen',
+    'action_masks': 'movegen',
+    '_apply_move': 'apply',
+    '_check_game_end': 'game_end',
+    '_opponent_move': 'opponent',
+    '_get_observation': 'observation',
+    'render': 'render',
+}
+VEC_ENV_PHASES = {
+    'action_masks': 'movegen',
+    '_apply_moves': 'apply',
+    '_finished': 'game_end',
+    '_choose_opponent_moves': 'opponent',
+    '_get_observations': 'observation',
+    '_reset_games': 'reset',
+}
+
+
+class ScenarioResult(NamedTuple):
+    name: str
+    steps: int        # Agent moves, summed over games for vectorized scenarios
+    episodes: int     # Finished games
+    seconds: float    # Uninstrumented run
+    phases: Dict[str, dict]
+
+    @property
+    def steps_per_sec(self) -> float:
+        return self.steps / self.seconds if self.seconds > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        return {'steps': self.steps, 'episodes': self.episodes, 'seconds': self.seconds,
+                'steps_per_sec': self.steps_per_sec, 'phases': self.phases}
+
+
+def _play_single(env, choose_action: Callable, steps: int, seed: int,
+                 timer: Optional[PhaseTimer], render: bool = False) -> Tuple[int, int]:
+    """Step one env for ``steps`` agent moves; return (steps, finished episodes)."""
+    agent = timer.phase('agent') if timer is not None else nullcontext()
+    env.reset(seed=seed)
+    episodes = 0
+    episode_steps = 0
+    for _ in range(steps):
+        with agent:
+            action = choose_action(env)
+        _, _, terminated, truncated, _ = env.step(action)
+        if render:
+            env.render()
+        episode_steps += 1
+        if terminated or truncated or episode_steps >= MAX_EPISODE_STEPS:
+            episodes += terminated
+            episode_steps = 0
+            env.reset()
+    return steps, episodes
+
+
+def _single_env_scenario(opponent: str, make_chooser: Callable, render_mode: Optional[str] = None):
+    def run(steps: int, seed: int, timer: Optional[PhaseTimer]) -> Tuple[int, int]:
+        from archess_env import ArchessEnv
+        env = ArchessEnv(opponent=opponent, render_mode=render_mode)
+        if timer is not None:
+            for attr, phase in ENV_PHASES.items():
+                timer.wrap(env, attr, phase)
+        try:
+            return _play_single(env, make_chooser(seed), steps, seed, timer, render=render_mode is not None)
+        finally:
+            env.close()
+    return run
+
+
+def _legal_random(seed: int) -> Callable:
+    rng = np.random.default_rng(seed)
+
+    def choose(env) -> int:
+        moves = env.position.legal_moves()
+        return moves[rng.integers(len(moves))] if moves else 0
+    return choose
+
+
+def _masked_random(seed: int) -> Callable:
+    rng = np.random.default_rng(seed)
+
+    def choose(env) -> int:
+        legal = np.flatnonzero(env.action_masks())
+        return int(legal[rng.integers(len(legal))]) if len(legal) else 0
+    return choose
+
+
+def _greedy(seed: int) -> Callable:
+    from archess_policy import GreedyPolicy
+    policy = GreedyPolicy(seed)
+
+    def choose(env) -> int:
+        return max(policy(env.position), 0)
+    return choose
+
+
+def _vectorized_scenario(num_envs: int):
+    def run(steps: int, seed: int, timer: Optional[PhaseTimer]) -> Tuple[int, int]:
+        import archess_vec_env
+        env = archess_vec_env.ArchessVecEnv(num_envs=num_envs, seed=seed)
+        if timer is not None:
+            for attr, phase in VEC_ENV_PHASES.items():
+                timer.wrap(env, attr, phase)
+            timer.wrap(archess_vec_env, 'batch_destinations', 'movegen')
+        agent = timer.phase('agent') if timer is not None else nullcontext()
+        rng = np.random.default_rng(seed)
+        rounds = max(steps // num_envs, 4)
+        episodes = 0
+        try:
+            env.reset()
+            for _ in range(rounds):
+                masks = env.action_masks()
+                with agent:
+                    # One uniform legal action per game, drawn for the whole batch at once
+                    rows, legal = np.nonzero(masks)
+                    counts = np.bincount(rows, minlength=num_envs)
+                    starts = np.cumsum(counts) - counts
+                    picks = starts + (rng.random(num_envs) * counts).astype(np.int64)
+                    actions = np.where(counts > 0, legal[np.minimum(picks, len(legal) - 1)], 0)
+                _, _, dones, infos = env.step(actions)
+                episodes += sum(infos[i]["winner"] is not None for i in np.flatnonzero(dones))
+        finally:
+            env.close()
+        return rounds * num_envs, episodes
+    return run
+
+
+SCENARIOS: Dict[str, Tuple[Callable, int]] = {
+    # name -> (runner(steps, seed, timer), default steps)
+    'legal_random': (_single_env_scenario("random", _legal_random), 5000),
+    'greedy_vs_greedy': (_single_env_scenario("greedy", _greedy), 5000),
+    'masked': (_single_env_scenario("random", _masked_random), 5000),
+    **{f'vectorized_b{size}': (_vectorized_scenario(size), max(20000, 20 * size)) for size in VEC_SIZES},
+    'render_rgb_array': (_single_env_scenario("random", _legal_random, render_mode="rgb_array"), 300),
+}
+
+
+# Run in a fresh interpreter; prints total seconds, seconds spent on the
+# variant's extra imports and peak RSS in bytes
+_STARTUP_SCRIPT = """
+import resource, sys, time
+sys.path.insert(0, {path!r})
+start = time.perf_counter()
+import archess_env
+extra_start = time.perf_counter()
+{extra}
+extra = time.perf_counter() - extra_start
+archess_env.ArchessEnv()
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(elapsed, extra, rss if sys.platform == "darwin" else rss * 1024)
+"""
+STARTUP_VARIANTS = {
+    'headless': 'pass',                        # What a training worker pays
+    'with_renderer': 'import archess_render',  # Previous cost: pygame imported by archess_env
+}
+
+
+def measure_startup(repeats: int = 5) -> Dict[str, dict]:
+    """
+    Median import + env creation time and peak RSS per ``STARTUP_VARIANTS``
+    entry, and what the headless start saves. The saved time is the
+    renderer import timed inside the same interpreter, which is steadier
+    than the difference of two whole-startup times.
+    """
+    path = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for variant, extra in STARTUP_VARIANTS.items():
+        script = _STARTUP_SCRIPT.format(path=path, extra=extra)
+        runs = []
+        for _ in range(repeats):
+            output = subprocess.run([sys.executable, "-c", script], check=True, capture_output=True,
+                                    text=True, env={**os.environ, "PYGAME_HIDE_SUPPORT_PROMPT": "1"})
+            runs.append([float(value) for value in output.stdout.split()[-3:]])
+        seconds, extra_seconds, rss = np.median(runs, axis=0)
+        results[variant] = {'seconds': seconds, 'extra_seconds': extra_seconds, 'rss_mb': rss / 2 ** 20}
+    results['saved'] = {'seconds': results['with_renderer']['extra_seconds'],
+                        'rss_mb': results['with_renderer']['rss_mb'] - results['headless']['rss_mb']}
+    return results
+
+
+def run_scenario(name: str, steps: Optional[int] = None, seed: int = 0) -> ScenarioResult:
+    """Run one scenario: a clean timed run, then an instrumented one for the phases."""
+    runner, default_steps = SCENARIOS[name]
+    steps = default_steps if steps is None else steps
+
+    runner(1, seed, None)  # Warm-up: imports, lazily built tables
+    start = time.perf_counter_ns()
+    played, episodes = runner(steps, seed, None)
+    seconds = (time.perf_counter_ns() - start) / 1e9
+
+    timer = PhaseTimer()
+    start = time.perf_counter_ns()
+    try:
+        runner(steps, seed, timer)
+    finally:
+        timer.restore()
+    return ScenarioResult(name, played, episodes, seconds, timer.report(time.perf_counter_ns() - start))
+
+
+def run_benchmarks(names: Optional[Sequence[str]] = None, scale: float = 1.0, seed: int = 0,
+                   verbose: bool = True) -> dict:
+    """Run scenarios (default: all, plus "startup") and return the JSON-ready report."""
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'scale': scale,
+            'seed': seed,
+        },
+        'scenarios': {},
+    }
+    names = list(names or [*SCENARIOS, 'startup'])
+    if 'startup' in names:
+        names.remove('startup')
+        report['startup'] = measure_startup()
+        if verbose:
+            print_startup(report['startup'])
+    for name in names:
+        steps = max(1, int(SCENARIOS[name][1] * scale))
+        try:
+            result = run_scenario(name, steps, seed)
+        except ImportError as e:  # e.g. no pygame for rendering
+            report['scenarios'][name] = {'skipped': str(e)}
+            if verbose:
+                print(f"{name:20s} skipped: {e}")
+            continue
+        report['scenarios'][name] = result.to_dict()
+        if verbose:
+            print_result(result)
+    return report
+
+
+def print_result(result: ScenarioResult):
+    phases = "  ".join(f"{phase} {stats['share']:.0%}" for phase, stats in result.phases.items()
+                       if stats['share'] >= 0.005)
+    print(f"{result.name:20s} {result.steps_per_sec:>11,.0f} steps/s  "
+          f"{result.steps:>8,d} steps {result.episodes:>6,d} games  | {phases}")
+
+
+def print_startup(startup: Dict[str, dict]):
+    for variant in (*STARTUP_VARIANTS, 'saved'):
+        stats = startup[variant]
+        print(f"startup {variant:12s} {stats['seconds'] * 1000:>8.1f} ms  {stats['rss_mb']:>7.1f} MB RSS")
+
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.1) -> List[Tuple[str, float, float]]:
+    """Scenarios whose steps/s dropped more than ``tolerance`` below the baseline."""
+    regressions = []
+    for name, stats in current['scenarios'].items():
+        before = baseline['scenarios'].get(name, {}).get('steps_per_sec')
+        after = stats.get('steps_per_sec')
+        if before and after is not None and after < before * (1 - tolerance):
+            regressions.append((name, before, after))
+    return regressions
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Archess environment throughput benchmarks")
+    parser.add_argument("scenarios", nargs="*",
+                        help=f"Scenarios to run (default: all of {', '.join(SCENARIOS)}, startup)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every scenario's step count")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--baseline", help="Earlier report to check for steps/s regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed slowdown vs. the baseline")
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - set(SCENARIOS) - {'startup'}
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    report = run_benchmarks(args.scenarios, args.scale, args.seed)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before:,.0f} -> {after:,.0f} steps/s ({after / before - 1:+.0%})")
+        sys.exit(1 if regressions else 0)
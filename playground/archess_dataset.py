@@ -0,0 +1,366 @@
+"""
+Offline Archess datasets for behavior cloning.
+
+``build_dataset`` replays recorded games through the move engine and
+writes one training sample per half-move into sharded ``.npz`` files:
+
+    obs       observations in the chosen obs_mode
+    masks     legal actions, bit-packed along the action axis (B, 1024)
+    actions   the action played, the behavior-cloning policy target
+    outcomes  +1 if the player to move went on to win, -1 if it lost, 0 otherwise
+
+Black's moves are mirrored onto white's side (see ``archess_policy``),
+so every sample is seen from the agent's seat as white and a model
+trained on it plays both colors through ``ModelPolicy``.
+
+Games come from ``GameStore`` directories (``archess_records``) or from
+the web version's "Export History" files, one ``white: pw e2-e4`` line
+per half-move, as text or a JSON list of lines. Shards are built in a
+process pool; ``iter_batches`` streams them back one shard at a time and
+``pretrain`` fits an SB3 actor-critic policy to the played moves.
+"""
+
+import glob
+import json
+import os
+import re
+from multiprocessing import get_context
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from archess_env import encode_observations
+from archess_policy import MIRROR_ACTIONS, mirror_batch, obs_mode_for
+from archess_position import Position, WHITE, BLACK, KING, TYPE_MASK, encode_move, square, squares_mask
+from archess_records import (
+    GameStore, MoveRecord, replay, to_move_array, WHITE_WINS, BLACK_WINS, DRAW, UNFINISHED,
+)
+
+# "white: pw e2-e4", "black: nb g8xpw@f6", "white: aw b2→b4 (Knight paralyzed)"
+WEB_MOVE = re.compile(
+    r'^(?P<color>white|black):\s*[a-z][wb]\s+(?P<from>[a-h][1-8])'
+    r'(?:-(?P<to>[a-h][1-8])|x[a-z][wb]@(?P<capture>[a-h][1-8])'
+    r'|→(?P<target>[a-h][1-8])\s*\((?P<note>[^)]*)\))\s*$'
+)
+
+# Status the web game shows after a mating move, sometimes exported with the moves
+WEB_CHECKMATE = re.compile(r'^Checkmate!\s*(?P<winner>White|Black) wins!?\s*$')
+
+
+def _web_square(name: str) -> int:
+    return square(8 - int(name[1]), ord(name[0]) - ord('a'))
+
+
+def _king_attacked(position: Position, color: int) -> bool:
+    """Whether the other side could take ``color``'s king."""
+    king_sq = position.mailbox.find(KING | (color << 3))
+    return king_sq >= 0 and any((move >> 1) & 63 == king_sq for move in position.legal_moves(color ^ 1))
+
+
+def is_checkmated(position: Position) -> bool:
+    """
+    The web game's checkmate: the side to move is in check and every move
+    leaves its king capturable. Archess itself lets such a king be taken,
+    so the side may still have legal moves.
+    """
+    color = position.side
+    if not _king_attacked(position, color):
+        return False
+    for move in position.legal_moves():
+        after = position.copy()
+        after.make_move(move)
+        if not _king_attacked(after, color):
+            return False
+    return True
+
+
+def parse_web_history(lines: Iterable[str], start: Optional[Position] = None) -> Tuple[Position, np.ndarray, int]:
+    """
+    Replay an exported web game and return (start, ``MOVE_DTYPE`` moves, result).
+
+    Games end on a king capture or, as in the web version, on checkmate;
+    a trailing "Checkmate! White wins!" status line is accepted.
+    Raises ValueError on a line that is not a legal Archess move.
+    """
+    start = start if start is not None else Position.initial()
+    position = start.copy()
+    records = []
+    declared = None  # Winner of a "Checkmate!" status line
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        status = WEB_CHECKMATE.match(line)
+        if status is not None:
+            declared = WHITE_WINS if status['winner'] == 'White' else BLACK_WINS
+            continue
+        match = WEB_MOVE.match(line)
+        if match is None:
+            raise ValueError(f"Line {number}: cannot parse {line!r}")
+        if (match['color'] == 'black') != (position.side == BLACK):
+            raise ValueError(f"Line {number}: {match['color']} is not to move")
+
+        from_sq = _web_square(match['from'])
+        shot = match['target'] is not None
+        to_sq = _web_square(match['to'] or match['capture'] or match['target'])
+        move = encode_move(from_sq, to_sq, int(shot))
+        if move not in position.legal_moves():
+            raise ValueError(f"Line {number}: illegal move {line!r}")
+
+        piece, target = position.mailbox[from_sq], position.mailbox[to_sq]
+        if shot and 'Knight' in match['note']:
+            paralyze = 'paralyzed' in match['note']
+            records.append(MoveRecord(move, piece, 0, True, paralyze))
+        else:
+            paralyze = False
+            records.append(MoveRecord(move, piece, target, shot, None))
+        position.make_move(move, paralyze)
+
+    if records and records[-1].captured & TYPE_MASK == KING:
+        result = WHITE_WINS if position.side == BLACK else BLACK_WINS
+    elif declared is not None:
+        result = declared
+    elif is_checkmated(position):
+        result = WHITE_WINS if position.side == BLACK else BLACK_WINS
+    elif not position.has_legal_move():
+        result = DRAW
+    else:
+        result = UNFINISHED
+    return start, to_move_array(records), result
+
+
+def read_web_history(path: str) -> Tuple[Position, np.ndarray, int]:
+    """Parse an "Export History" file, plain text or a JSON list of lines."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    lines = json.loads(text) if path.endswith(".json") else text.splitlines()
+    return parse_web_history(lines)
+
+
+def game_samples(start: Position, moves: np.ndarray, result: int,
+                 obs_mode: str = "planes") -> Dict[str, np.ndarray]:
+    """Training arrays for every half-move of one game, each seen from the mover's side."""
+    from archess_vec_env import batch_action_masks, batch_destinations
+
+    n = len(moves)
+    boards = np.empty((n, 64), dtype=np.uint8)
+    paralyzed = np.empty((n, 64), dtype=bool)
+    sides = np.empty(n, dtype=np.int8)
+    for i, (position, _) in enumerate(replay(start, moves)):
+        boards[i] = np.frombuffer(position.mailbox, dtype=np.uint8)
+        paralyzed[i] = squares_mask(position.paralyzed)
+        sides[i] = position.side
+
+    actions = moves['action'].astype(np.int64)
+    black = sides == BLACK
+    boards[black], paralyzed[black] = mirror_batch(boards[black], paralyzed[black])
+    actions[black] = MIRROR_ACTIONS[actions[black]]
+
+    whites = np.full(n, WHITE, dtype=np.int8)
+    masks = batch_action_masks(boards, batch_destinations(boards, paralyzed, whites))
+    outcomes = np.zeros(n, dtype=np.int8)
+    if result in (WHITE_WINS, BLACK_WINS):
+        outcomes[:] = np.where(sides == result, 1, -1)
+    return {
+        'obs': encode_observations(boards, paralyzed, whites, obs_mode),
+        'masks': np.packbits(masks, axis=1, bitorder='little'),
+        'actions': actions.astype(np.int16),
+        'outcomes': outcomes,
+    }
+
+
+def _iter_task_games(task, skipped: List[Dict[str, str]]) -> Iterator[Tuple[Position, np.ndarray, int]]:
+    """Games of a task; web exports that fail to parse are listed in ``skipped`` instead."""
+    kind, source, games = task
+    if kind == "store":
+        store = GameStore(source, mode="r")
+        try:
+            yield from store.iter_games(*games)
+        finally:
+            store.close()
+    else:
+        for path in games:
+            try:
+                game = read_web_history(path)
+            except ValueError as e:  # Also malformed JSON and undecodable text
+                skipped.append({'file': path, 'error': str(e)})
+                continue
+            yield game
+
+
+def _build_shard(args) -> Tuple[str, int, List[Dict[str, str]]]:
+    task, out_path, obs_mode = args
+    skipped = []
+    parts = [game_samples(start, moves, result, obs_mode)
+             for start, moves, result in _iter_task_games(task, skipped) if len(moves)]
+    if parts:
+        arrays = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+    else:
+        arrays = game_samples(Position.initial(), to_move_array([]), UNFINISHED, obs_mode)
+    np.savez(out_path, **arrays)
+    return out_path, len(arrays['actions']), skipped
+
+
+def _plan_tasks(sources: Sequence[str], games_per_shard: int) -> List[tuple]:
+    """Split every source into shard-sized tasks."""
+    tasks = []
+    web_files = []
+    for source in sources:
+        if os.path.exists(os.path.join(source, "meta.json")):
+            store = GameStore(source, mode="r")
+            count = len(store)
+            store.close()
+            for begin in range(0, count, games_per_shard):
+                tasks.append(("store", source, (begin, min(begin + games_per_shard, count))))
+        elif os.path.isdir(source):
+            web_files += sorted(glob.glob(os.path.join(source, "*.txt")) + glob.glob(os.path.join(source, "*.json")))
+        else:
+            web_files.append(source)
+    for begin in range(0, len(web_files), games_per_shard):
+        tasks.append(("web", None, web_files[begin:begin + games_per_shard]))
+    return tasks
+
+
+def build_dataset(sources: Union[str, Sequence[str]], out_dir: str, obs_mode: str = "planes",
+                  games_per_shard: int = 1000, n_workers: Optional[int] = None) -> Dict:
+    """
+    Convert recorded games into sharded training arrays.
+
+    Args:
+        sources: ``GameStore`` directories, web export files, or directories of them
+        out_dir: Output directory for ``shard_#####.npz`` files and ``manifest.json``
+        obs_mode: Observation encoding (match the model to be trained)
+        games_per_shard: Games replayed into each shard
+        n_workers: Worker processes, 0 to build in this process (default: CPU count)
+
+    Returns the manifest: obs_mode, shard file names, sample counts, and the
+    web exports skipped because they could not be parsed (file and error).
+    """
+    if isinstance(sources, str):
+        sources = [sources]
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = _plan_tasks(sources, games_per_shard)
+    jobs = [(task, os.path.join(out_dir, f"shard_{i:05d}.npz"), obs_mode) for i, task in enumerate(tasks)]
+
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    if n_workers <= 1 or len(jobs) <= 1:
+        shards = [_build_shard(job) for job in jobs]
+    else:
+        with get_context("spawn").Pool(min(n_workers, len(jobs))) as pool:
+            shards = pool.map(_build_shard, jobs)
+
+    manifest = {
+        'obs_mode': obs_mode,
+        'shards': [os.path.basename(path) for path, _, _ in shards],
+        'samples': [count for _, count, _ in shards],
+        'skipped': [game for _, _, skipped in shards for game in skipped],
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_manifest(path: str) -> Dict:
+    with open(os.path.join(path, "manifest.json")) as f:
+        return json.load(f)
+
+
+def iter_batches(path: str, batch_size: int = 1024, shuffle: bool = True, seed: Optional[int] = None,
+                 unpack_masks: bool = True, loop: bool = False) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Stream batches from a built dataset, holding one shard in memory at a time.
+
+    Shards and the samples within each shard are visited in random order
+    when ``shuffle`` is set. Masks are expanded to (B, 8192) booleans
+    unless ``unpack_masks`` is False.
+    """
+    shards = [os.path.join(path, name) for name in load_manifest(path)['shards']]
+    rng = np.random.default_rng(seed)
+    while True:
+        for shard in (rng.permutation(shards) if shuffle else shards):
+            with np.load(shard) as data:
+                arrays = {key: data[key] for key in data.files}
+            n = len(arrays['actions'])
+            order = rng.permutation(n) if shuffle else np.arange(n)
+            for begin in range(0, n, batch_size):
+                rows = order[begin:begin + batch_size]
+                batch = {key: value[rows] for key, value in arrays.items()}
+                if unpack_masks:
+                    batch['masks'] = np.unpackbits(batch['masks'], axis=1, count=8192,
+                                                   bitorder='little').view(bool)
+                yield batch
+        if not loop:
+            return
+
+
+def pretrain(model, path: str, epochs: int = 1, batch_size: int = 256,
+             learning_rate: Optional[float] = None, seed: Optional[int] = None) -> List[float]:
+    """
+    Behavior cloning: fit an actor-critic model's policy to the dataset's moves.
+
+    Works with PPO, A2C and MaskablePPO (which also gets the legal-action
+    masks). Returns the mean negative log-likelihood of each epoch.
+    """
+    import torch
+
+    policy = model.policy
+    if not hasattr(policy, "evaluate_actions"):
+        raise ValueError("Behavior cloning needs an actor-critic policy (PPO, A2C or MaskablePPO)")
+    obs_mode, channels_first = obs_mode_for(model.observation_space)
+    if load_manifest(path)['obs_mode'] != obs_mode:
+        raise ValueError(f"Dataset observations do not match the model's obs_mode {obs_mode!r}")
+
+    try:
+        from sb3_contrib.common.maskable.policies import MaskableActorCriticPolicy
+        masked = isinstance(policy, MaskableActorCriticPolicy)
+    except ImportError:  # Optional dependency: without it no policy is maskable
+        masked = False
+    if learning_rate is not None:
+        for group in policy.optimizer.param_groups:
+            group['lr'] = learning_rate
+
+    policy.set_training_mode(True)
+    losses = []
+    for epoch in range(epochs):
+        total, batches = 0.0, 0
+        for batch in iter_batches(path, batch_size, seed=None if seed is None else seed + epoch,
+                                  unpack_masks=masked):
+            obs = batch['obs']
+            if channels_first:
+                obs = np.ascontiguousarray(obs.transpose(0, 3, 1, 2))
+            obs_tensor, _ = policy.obs_to_tensor(obs)
+            actions = torch.as_tensor(batch['actions'].astype(np.int64), device=policy.device)
+            if masked:
+                _, log_prob, _ = policy.evaluate_actions(obs_tensor, actions, action_masks=batch['masks'])
+            else:
+                _, log_prob, _ = policy.evaluate_actions(obs_tensor, actions)
+            loss = -log_prob.mean()
+
+            policy.optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(policy.parameters(), model.max_grad_norm)
+            policy.optimizer.step()
+            total += loss.item()
+            batches += 1
+        losses.append(total / max(batches, 1))
+    policy.set_training_mode(False)
+    return losses
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build a behavior-cloning dataset from recorded Archess games")
+    parser.add_argument("sources", nargs="+", help="GameStore directories or web history exports")
+    parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--obs-mode", default="planes")
+    parser.add_argument("--games-per-shard", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    manifest = build_dataset(args.sources, args.out, args.obs_mode, args.games_per_shard, args.workers)
+    print(f"Wrote {sum(manifest['samples'])} samples in {len(manifest['shards'])} shards to {args.out}")
+    if manifest['skipped']:
+        print(f"Skipped {len(manifest['skipped'])} unreadable games:")
+        for game in manifest['skipped']:
+            print(f"  {game['file']}: {game['error']}")
@@ -6,11 +6,13 @@ A chess variant with Archer pieces that can perform ranged attacks.
 import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
-import pygame
 from typing import Optional, Dict, Any, Tuple, List
-import chess
-import chess.engine
 from enum import Enum
+from archess_records import GameStore, MoveRecord, to_move_array
+from archess_position import (
+    Position, WHITE, BLACK, KNIGHT, TYPE_MASK, CHAR_TO_CODE,
+    square, square_to_coords, encode_move, iter_squares, squares_mask,
+)
 
 class PieceType(Enum):
     PAWN = 1
@@ -21,6 +23,100 @@ class PieceType(Enum):
     KING = 6
     ARCHER = 7
 
+# Piece values for rewards and evaluation
+PIECE_VALUES = {
+    PieceType.PAWN: 1,
+    PieceType.ARCHER: 2,
+    PieceType.KNIGHT: 3,
+    PieceType.BISHOP: 3,
+    PieceType.ROOK: 5,
+    PieceType.QUEEN: 9,
+    PieceType.KING: 1000
+}
+
+# Opponents played by the env itself; any other opponent is a policy (see archess_policy)
+BUILTIN_OPPONENTS = ("random", "greedy", "minimax")
+
+# Minimax search budget unless overridden: a fixed node budget is fast and
+# plays the same moves on every machine, where a time limit depends on load
+SEARCH_DEFAULTS = {"max_depth": 2, "time_limit_ms": None, "node_limit": 2000}
+
+# Observation channel per piece letter
+PIECE_TO_INDEX = {
+    'P': 0, 'N': 1, 'B': 2, 'R': 3, 'Q': 4, 'K': 5,  # White pieces (0-5)
+    'p': 6, 'n': 7, 'b': 8, 'r': 9, 'q': 10, 'k': 11,  # Black pieces (6-11)
+    'A': 0, 'a': 6  # Archers map to same as pawns for simplicity
+}
+
+# One-hot observation row per piece code, so a board encodes in one lookup
+OBSERVATION_TABLE = np.zeros((16, 12), dtype=np.float32)
+for _piece, _index in PIECE_TO_INDEX.items():
+    OBSERVATION_TABLE[CHAR_TO_CODE[_piece], _index] = 1.0
+
+# Observation modes: the original 12 planes, or planes_v2 as float32, uint8
+# or bit-packed along the plane axis (4x and 32x smaller than float32)
+OBS_MODES = ("planes", "planes_v2", "planes_v2_uint8", "planes_v2_packed")
+
+# planes_v2: one plane per piece type and color (archers get their own),
+# then paralyzed knights and a constant plane set when black is to move
+PLANES_V2 = ('P', 'N', 'B', 'R', 'Q', 'K', 'A', 'p', 'n', 'b', 'r', 'q', 'k', 'a',
+             'paralyzed', 'black_to_move')
+PLANES_V2_TABLE = np.zeros((16, len(PLANES_V2)), dtype=np.uint8)
+for _index, _piece in enumerate(PLANES_V2[:14]):
+    PLANES_V2_TABLE[CHAR_TO_CODE[_piece], _index] = 1
+_PLANES_V2_FLOAT = PLANES_V2_TABLE.astype(np.float32)
+
+
+def observation_space(obs_mode: str = "planes") -> spaces.Box:
+    """Observation space of an observation mode."""
+    if obs_mode == "planes":
+        return spaces.Box(low=0, high=1, shape=(8, 8, 12), dtype=np.float32)
+    if obs_mode == "planes_v2":
+        return spaces.Box(low=0, high=1, shape=(8, 8, len(PLANES_V2)), dtype=np.float32)
+    if obs_mode == "planes_v2_uint8":
+        return spaces.Box(low=0, high=1, shape=(8, 8, len(PLANES_V2)), dtype=np.uint8)
+    if obs_mode == "planes_v2_packed":
+        return spaces.Box(low=0, high=255, shape=(8, 8, len(PLANES_V2) // 8), dtype=np.uint8)
+    raise ValueError(f"Unknown obs_mode {obs_mode!r}, expected one of {OBS_MODES}")
+
+
+def encode_observations(boards: np.ndarray, paralyzed: np.ndarray, sides: np.ndarray,
+                        obs_mode: str = "planes", out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Observation batch from integer boards, in one table lookup.
+
+    Args:
+        boards: (B, 64) uint8 piece codes
+        paralyzed: (B, 64) bool paralyzed-knight squares
+        sides: (B,) color to move
+        obs_mode: One of ``OBS_MODES``
+        out: Optional (B, 64, 16) buffer for the planes_v2 modes, reused
+            between calls; it must match the mode's dtype (uint8 for packed)
+
+    Returns:
+        (B, 8, 8, planes) observations; for planes_v2 modes without packing
+        this is a view of ``out`` when one is given
+    """
+    n = len(boards)
+    if obs_mode == "planes":
+        return OBSERVATION_TABLE[boards].reshape(n, 8, 8, 12)
+
+    table = _PLANES_V2_FLOAT if obs_mode == "planes_v2" else PLANES_V2_TABLE
+    if out is None:
+        out = np.empty((n, 64, len(PLANES_V2)), dtype=table.dtype)
+    np.take(table, boards, axis=0, out=out)
+    out[:, :, 14] = paralyzed
+    out[:, :, 15] = np.asarray(sides)[:, None]
+    planes = out.reshape(n, 8, 8, len(PLANES_V2))
+    if obs_mode == "planes_v2_packed":
+        return np.packbits(planes, axis=-1, bitorder='little')
+    return planes
+
+
+def unpack_observations(packed: np.ndarray) -> np.ndarray:
+    """Expand planes_v2_packed observations back to (..., 8, 8, 16) uint8 planes."""
+    return np.unpackbits(packed, axis=-1, bitorder='little')
+
 class ArchessEnv(gym.Env):
     """
     Archess Environment for reinforcement learning.
@@ -28,6 +124,8 @@ class ArchessEnv(gym.Env):
     Observation Space:
         - 8x8x12 board representation (6 piece types x 2 colors)
         - Additional features: castling rights, en passant, disabled knights
+        - obs_mode="planes_v2": 8x8x16 with archer, paralyzed-knight and
+          side-to-move planes (also as uint8 or bit-packed, see OBS_MODES)
     
     Action Space:
         - From square (64 possibilities)
@@ -38,83 +136,137 @@ class ArchessEnv(gym.Env):
     
     metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 4}
     
-    def __init__(self, render_mode: Optional[str] = None, opponent: str = "random"):
+    def __init__(self, render_mode: Optional[str] = None, opponent: Any = "random",
+                 search_options: Optional[Dict[str, Any]] = None, obs_mode: str = "planes",
+                 game_store: Optional[Any] = None, profile: Optional[str] = None,
+                 profile_every: int = 100):
         super().__init__()
         
         # Board dimensions
         self.board_size = 8
         
-        # Observation space: 8x8x12 (piece types x colors) + additional features
-        self.observation_space = spaces.Box(
-            low=0, high=1, shape=(8, 8, 12), dtype=np.float32
-        )
+        # Observation space: 8x8x12 (piece types x colors), or the 16
+        # planes_v2 planes with archers, paralyzed knights and side to move
+        self.obs_mode = obs_mode
+        self.observation_space = observation_space(obs_mode)
+        self._obs_buffer = None
+        if obs_mode != "planes":
+            dtype = np.float32 if obs_mode == "planes_v2" else np.uint8
+            self._obs_buffer = np.empty((1, 64, len(PLANES_V2)), dtype=dtype)
         
         # Action space: from_square (64) * to_square (64) * action_type (2)
         self.action_space = spaces.Discrete(8192)
         
-        # Rendering
+        # Rendering; the sprite renderer (archess_render) is loaded on the
+        # first render() call, so headless envs never import pygame
         self.render_mode = render_mode
-        self.window = None
-        self.clock = None
+        self._renderer = None
         self.window_size = 512
         
-        # Game state
-        self.board = None
-        self.white_king_pos = (7, 4)
-        self.black_king_pos = (0, 4)
-        self.disabled_knights = set()
-        self.current_player = 'white'
+        # Game state (board, kings, disabled knights and side to move
+        # all live in the bitboard position); move_history holds one
+        # MoveRecord per half-move of both sides
+        self.position = None
         self.move_history = []
         self.game_over = False
         self.winner = None
         
-        # Opponent type
+        # Games are appended to a GameStore (or a store directory) when they
+        # end, or at the next reset/close if they were cut short
+        self._owns_store = isinstance(game_store, str)
+        self.game_store = GameStore(game_store) if self._owns_store else game_store
+        self._start_position = None
+        self._game_saved = True
+        
+        # Opponent type; search_options configure the minimax opponent
+        # (max_depth, time_limit_ms, node_limit; see SEARCH_DEFAULTS). Anything else is a policy:
+        # a callable position -> move, an SB3 model or a checkpoint path
         self.opponent = opponent
+        self.search_options = {**SEARCH_DEFAULTS, **(search_options or {})}
+        self._search_engine = None
+        self._opponent_policy = None
+        if not (isinstance(opponent, str) and opponent in BUILTIN_OPPONENTS):
+            from archess_policy import make_policy
+            self._opponent_policy = make_policy(opponent)
         
         # Piece values for evaluation
-        self.piece_values = {
-            PieceType.PAWN: 1,
-            PieceType.ARCHER: 2,
-            PieceType.KNIGHT: 3,
-            PieceType.BISHOP: 3,
-            PieceType.ROOK: 5,
-            PieceType.QUEEN: 9,
-            PieceType.KING: 1000
-        }
+        self.piece_values = dict(PIECE_VALUES)
+        self._code_values = [
+            self.piece_values[PieceType(code & TYPE_MASK)] if code & TYPE_MASK else 0
+            for code in range(16)
+        ]
+        
+        # Opt-in instrumentation behind stats(), see archess_profiling
+        self._profiler = None
         
         # Initialize board
         self.reset()
+        
+        if profile:
+            self.enable_profiling(profile, profile_every)
     
     def reset(self, seed: Optional[int] = None, options: Optional[Dict[str, Any]] = None):
-        """Reset the environment to initial state."""
+        """
+        Reset the environment to initial state.
+        
+        ``options={"fen": ...}`` starts from an Archess FEN instead (see
+        archess_position.STARTING_FEN); if black is to move there, the
+        opponent replies before the first observation.
+        """
         super().reset(seed=seed)
+        self._save_game()
         
-        # Initialize board with Archess starting position
-        self.board = np.array([
-            ['r', 'n', 'b', 'q', 'k', 'b', 'n', 'r'],
-            ['p', 'a', 'p', 'p', 'p', 'p', 'a', 'p'],
-            ['', '', '', '', '', '', '', ''],
-            ['', '', '', '', '', '', '', ''],
-            ['', '', '', '', '', '', '', ''],
-            ['', '', '', '', '', '', '', ''],
-            ['P', 'A', 'P', 'P', 'P', 'P', 'A', 'P'],
-            ['R', 'N', 'B', 'Q', 'K', 'B', 'N', 'R']
-        ])
+        # Initialize board with Archess starting position or the given FEN
+        fen = (options or {}).get("fen")
+        self.position = Position.initial() if fen is None else Position.from_fen(fen)
+        self._start_position = self.position.copy()
         
         # Reset game state
-        self.white_king_pos = (7, 4)
-        self.black_king_pos = (0, 4)
-        self.disabled_knights = set()
-        self.current_player = 'white'
         self.move_history = []
         self.game_over = False
         self.winner = None
+        self._game_saved = False
+        
+        if fen is not None and not self._check_game_end() and self.position.side == BLACK:
+            self._opponent_move()
         
         observation = self._get_observation()
         info = self._get_info()
         
         return observation, info
     
+    @property
+    def board(self) -> np.ndarray:
+        """8x8 read-only array of piece letters ('' for empty squares)."""
+        return self.position.board_view()
+    
+    @property
+    def board_codes(self) -> np.ndarray:
+        """8x8 int8 piece codes (see archess_position), a view over the live board."""
+        return self.position.to_array()
+    
+    @property
+    def current_player(self) -> str:
+        """Side to move, 'white' or 'black'."""
+        return 'white' if self.position.side == WHITE else 'black'
+    
+    @property
+    def disabled_knights(self) -> set:
+        """Squares of knights paralyzed by an archer shot."""
+        return {square_to_coords(sq) for sq in iter_squares(self.position.paralyzed)}
+    
+    @property
+    def white_king_pos(self) -> Optional[Tuple[int, int]]:
+        """Square of the white king, None once captured."""
+        sq = self.position.king_square(WHITE)
+        return None if sq is None else square_to_coords(sq)
+    
+    @property
+    def black_king_pos(self) -> Optional[Tuple[int, int]]:
+        """Square of the black king, None once captured."""
+        sq = self.position.king_square(BLACK)
+        return None if sq is None else square_to_coords(sq)
+    
     def step(self, action: int):
         """Execute one step in the environment."""
         if self.game_over:
@@ -129,6 +281,10 @@ class ArchessEnv(gym.Env):
         # If it's opponent's turn and game not over, make opponent move
         if not terminated and not truncated and self.current_player == 'black':
             self._opponent_move()
+            terminated = self.game_over  # The reply may end the game
+        
+        if terminated:
+            self._save_game()
         
         observation = self._get_observation()
         info = self._get_info()
@@ -137,6 +293,7 @@ class ArchessEnv(gym.Env):
     
     def _decode_action(self, action: int) -> Tuple[Tuple[int, int], Tuple[int, int], int]:
         """Decode action integer into from_square, to_square, action_type."""
+        action = int(action)  # Policies hand over NumPy integers
         action_type = action % 2
         action //= 2
         to_col = action % 8
@@ -156,68 +313,73 @@ class ArchessEnv(gym.Env):
     
     def _execute_move(self, from_square: Tuple[int, int], to_square: Tuple[int, int], action_type: int) -> Tuple[float, bool, bool]:
         """Execute a move and return reward, terminated, truncated."""
-        from_row, from_col = from_square
-        to_row, to_col = to_square
-        
         # Validate move
         if not self._is_valid_move(from_square, to_square, action_type):
             return -0.1, False, False  # Small penalty for invalid move
         
-        piece = self.board[from_row, from_col]
-        captured_piece = self.board[to_row, to_col]
-        
-        reward = 0
+        return self._apply_move(from_square, to_square)
+    
+    def _apply_move(self, from_square: Tuple[int, int], to_square: Tuple[int, int]) -> Tuple[float, bool, bool]:
+        """Play an already validated move and return reward, terminated, truncated."""
+        from_sq = square(*from_square)
+        to_sq = square(*to_square)
         
         # Check for archer ranged attack
-        is_archer_ranged = (piece.lower() == 'a' and 
-                           abs(to_row - from_row) <= 2 and to_col == from_col and 
-                           captured_piece != '')
-        
-        if is_archer_ranged:
-            reward += self._handle_archer_attack(from_square, to_square)
+        if self.position.is_ranged_attack(from_sq, to_sq):
+            reward = self._handle_archer_attack(from_square, to_square)
         else:
             # Normal move/capture
-            if captured_piece != '':
-                reward += self._get_piece_value(captured_piece)
-            
-            self.board[to_row, to_col] = piece
-            self.board[from_row, from_col] = ''
-            
-            # Update king positions
-            if piece == 'K':
-                self.white_king_pos = (to_row, to_col)
-            elif piece == 'k':
-                self.black_king_pos = (to_row, to_col)
-        
-        # Check for game end conditions
+            mailbox = self.position.mailbox
+            piece, target = mailbox[from_sq], mailbox[to_sq]
+            reward = self._code_values[target]
+            move = encode_move(from_sq, to_sq)
+            self.position.make_move(move)
+            self.move_history.append(MoveRecord(move, piece, target, False, None))
+        
+        # Check for game end conditions (the position has already switched players)
         terminated = self._check_game_end()
         
-        # Switch players
-        if not terminated:
-            self.current_player = 'black' if self.current_player == 'white' else 'white'
-        
         return reward, terminated, False
     
     def _handle_archer_attack(self, from_square: Tuple[int, int], to_square: Tuple[int, int]) -> float:
         """Handle archer ranged attack logic."""
-        to_row, to_col = to_square
-        target_piece = self.board[to_row, to_col]
-        reward = 0
+        from_sq = square(*from_square)
+        to_sq = square(*to_square)
+        target_code = self.position.mailbox[to_sq]
+        paralyze = False
         
-        if target_piece.lower() == 'n':  # Knight
+        if target_code & TYPE_MASK == KNIGHT:
             # Coin flip for knight paralysis
-            if np.random.random() < 0.5:  # Heads - paralyze
-                self.disabled_knights.add((to_row, to_col))
-                reward += 1.5  # Bonus for disabling knight
+            if self.np_random.random() < 0.5:  # Heads - paralyze
+                paralyze = True
+                reward = 1.5  # Bonus for disabling knight
             else:  # Tails - no damage
-                reward += 0.1  # Small reward for attempt
+                reward = 0.1  # Small reward for attempt
         else:
             # Other pieces - kill normally
-            reward += self._get_piece_value(target_piece)
-            self.board[to_row, to_col] = ''
+            reward = self._code_values[target_code]
         
+        move = encode_move(from_sq, to_sq, 1)
+        shooter = self.position.mailbox[from_sq]
+        self.position.make_move(move, paralyze)
+        if target_code & TYPE_MASK == KNIGHT:
+            self.move_history.append(MoveRecord(move, shooter, 0, True, paralyze))
+        else:
+            self.move_history.append(MoveRecord(move, shooter, target_code, True, None))
         return reward
     
+    def game_record(self) -> np.ndarray:
+        """Half-moves played so far as ``archess_records.MOVE_DTYPE`` records."""
+        return to_move_array(self.move_history)
+    
+    def _save_game(self):
+        """Append the current game to the game store, once."""
+        if self.game_store is None or self._game_saved or not self.move_history:
+            return
+        self.game_store.append(self.move_history, self._start_position,
+                               self.winner if self.game_over else None)
+        self._game_saved = True
+    
     def _get_piece_value(self, piece: str) -> float:
         """Get the value of a piece."""
         piece_type_map = {
@@ -236,193 +398,35 @@ class ArchessEnv(gym.Env):
         if not (0 <= from_row < 8 and 0 <= from_col < 8 and 0 <= to_row < 8 and 0 <= to_col < 8):
             return False
         
-        piece = self.board[from_row, from_col]
-        if piece == '':
+        # Check if piece exists and belongs to current player
+        from_sq = square(from_row, from_col)
+        code = self.position.mailbox[from_sq]
+        if not code or code >> 3 != self.position.side:
             return False
         
-        # Check if piece belongs to current player
-        is_white_piece = piece.isupper()
-        if (self.current_player == 'white') != is_white_piece:
-            return False
-        
-        # Check if target square has own piece
-        target_piece = self.board[to_row, to_col]
-        if target_piece != '' and (target_piece.isupper() == is_white_piece):
-            return False
-        
-        # Get possible moves for the piece
-        possible_moves = self._get_possible_moves(from_square)
-        return (to_row, to_col) in possible_moves
+        # Destinations never include squares holding own pieces
+        return bool(self.position.targets(from_sq) >> square(to_row, to_col) & 1)
     
     def _get_possible_moves(self, from_square: Tuple[int, int]) -> List[Tuple[int, int]]:
         """Get all possible moves for a piece at given square."""
-        from_row, from_col = from_square
-        piece = self.board[from_row, from_col].lower()
-        is_white = self.board[from_row, from_col].isupper()
-        moves = []
-        
-        if piece == 'p':  # Pawn
-            direction = -1 if is_white else 1
-            start_row = 6 if is_white else 1
-            
-            # Forward move
-            if 0 <= from_row + direction < 8 and self.board[from_row + direction, from_col] == '':
-                moves.append((from_row + direction, from_col))
-                # Two squares from start
-                if from_row == start_row and self.board[from_row + 2*direction, from_col] == '':
-                    moves.append((from_row + 2*direction, from_col))
-            
-            # Captures
-            for dc in [-1, 1]:
-                if 0 <= from_col + dc < 8 and 0 <= from_row + direction < 8:
-                    target = self.board[from_row + direction, from_col + dc]
-                    if target != '' and (target.isupper() != is_white):
-                        moves.append((from_row + direction, from_col + dc))
-        
-        elif piece == 'r':  # Rook
-            # Horizontal and vertical moves
-            directions = [(0, 1), (0, -1), (1, 0), (-1, 0)]
-            for dr, dc in directions:
-                for i in range(1, 8):
-                    new_row, new_col = from_row + i*dr, from_col + i*dc
-                    if not (0 <= new_row < 8 and 0 <= new_col < 8):
-                        break
-                    target = self.board[new_row, new_col]
-                    if target == '':
-                        moves.append((new_row, new_col))
-                    else:
-                        if target.isupper() != is_white:
-                            moves.append((new_row, new_col))
-                        break
-        
-        elif piece == 'n':  # Knight
-            # Check if knight is disabled (paralyzed)
-            if (from_row, from_col) in self.disabled_knights:
-                return []  # Disabled knights cannot move
-            
-            knight_moves = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                           (1, -2), (1, 2), (2, -1), (2, 1)]
-            for dr, dc in knight_moves:
-                new_row, new_col = from_row + dr, from_col + dc
-                if 0 <= new_row < 8 and 0 <= new_col < 8:
-                    target = self.board[new_row, new_col]
-                    if target == '' or target.isupper() != is_white:
-                        moves.append((new_row, new_col))
-        
-        elif piece == 'b':  # Bishop
-            directions = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
-            for dr, dc in directions:
-                for i in range(1, 8):
-                    new_row, new_col = from_row + i*dr, from_col + i*dc
-                    if not (0 <= new_row < 8 and 0 <= new_col < 8):
-                        break
-                    target = self.board[new_row, new_col]
-                    if target == '':
-                        moves.append((new_row, new_col))
-                    else:
-                        if target.isupper() != is_white:
-                            moves.append((new_row, new_col))
-                        break
-        
-        elif piece == 'q':  # Queen (combination of rook and bishop)
-            # Rook moves
-            directions = [(0, 1), (0, -1), (1, 0), (-1, 0)]
-            for dr, dc in directions:
-                for i in range(1, 8):
-                    new_row, new_col = from_row + i*dr, from_col + i*dc
-                    if not (0 <= new_row < 8 and 0 <= new_col < 8):
-                        break
-                    target = self.board[new_row, new_col]
-                    if target == '':
-                        moves.append((new_row, new_col))
-                    else:
-                        if target.isupper() != is_white:
-                            moves.append((new_row, new_col))
-                        break
-            
-            # Bishop moves
-            directions = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
-            for dr, dc in directions:
-                for i in range(1, 8):
-                    new_row, new_col = from_row + i*dr, from_col + i*dc
-                    if not (0 <= new_row < 8 and 0 <= new_col < 8):
-                        break
-                    target = self.board[new_row, new_col]
-                    if target == '':
-                        moves.append((new_row, new_col))
-                    else:
-                        if target.isupper() != is_white:
-                            moves.append((new_row, new_col))
-                        break
-        
-        elif piece == 'k':  # King
-            king_moves = [(-1, -1), (-1, 0), (-1, 1),
-                         (0, -1),           (0, 1),
-                         (1, -1),  (1, 0),  (1, 1)]
-            for dr, dc in king_moves:
-                new_row, new_col = from_row + dr, from_col + dc
-                if 0 <= new_row < 8 and 0 <= new_col < 8:
-                    target = self.board[new_row, new_col]
-                    if target == '' or target.isupper() != is_white:
-                        moves.append((new_row, new_col))
-        
-        elif piece == 'a':  # Archer
-            # Movement (like king, but only to empty squares)
-            for dr in [-1, 0, 1]:
-                for dc in [-1, 0, 1]:
-                    if dr == 0 and dc == 0:
-                        continue
-                    new_row, new_col = from_row + dr, from_col + dc
-                    if 0 <= new_row < 8 and 0 <= new_col < 8 and self.board[new_row, new_col] == '':
-                        moves.append((new_row, new_col))
-            
-            # Ranged attacks (1 or 2 cells forward)
-            attack_direction = -1 if is_white else 1
-            for distance in [1, 2]:
-                attack_row = from_row + distance * attack_direction
-                if 0 <= attack_row < 8:
-                    target = self.board[attack_row, from_col]
-                    if target != '' and (target.isupper() != is_white):
-                        # Can attack pawns, bishops, kings, knights, archers
-                        if target.lower() in ['p', 'b', 'k', 'n', 'a']:
-                            moves.append((attack_row, from_col))
-        
-        return moves
+        targets = self.position.targets(square(*from_square))
+        return [square_to_coords(sq) for sq in iter_squares(targets)]
     
     def _check_game_end(self) -> bool:
         """Check if game has ended."""
-        # Simple check: if either king is missing
-        white_king_exists = np.any(self.board == 'K')
-        black_king_exists = np.any(self.board == 'k')
-        
-        if not white_king_exists:
+        # King presence, piece counts and the last known mover are kept up
+        # to date by the position, so this rarely has to scan the board
+        if not self.position.king_alive(WHITE):
             self.winner = 'black'
             self.game_over = True
             return True
-        elif not black_king_exists:
+        elif not self.position.king_alive(BLACK):
             self.winner = 'white'
             self.game_over = True
             return True
         
-        # Check for stalemate - no valid moves available for current player
-        has_valid_moves = False
-        for from_row in range(8):
-            for from_col in range(8):
-                piece = self.board[from_row, from_col]
-                if piece != '':
-                    is_current_player_piece = (
-                        (self.current_player == 'white' and piece.isupper()) or
-                        (self.current_player == 'black' and piece.islower())
-                    )
-                    if is_current_player_piece:
-                        possible_moves = self._get_possible_moves((from_row, from_col))
-                        if possible_moves:
-                            has_valid_moves = True
-                            break
-            if has_valid_moves:
-                break
-        
-        if not has_valid_moves:
+        # Check for stalemate - no valid moves available for the side to move
+        if not self.position.has_legal_move():
             self.winner = 'draw'
             self.game_over = True
             return True
@@ -435,65 +439,93 @@ class ArchessEnv(gym.Env):
             self._random_opponent_move()
         elif self.opponent == "greedy":
             self._greedy_opponent_move()
-        # Add minimax opponent later
+        elif self.opponent == "minimax":
+            self._minimax_opponent_move()
+        else:
+            self._policy_opponent_move()
     
     def _random_opponent_move(self):
         """Execute a random move for the opponent."""
-        valid_moves = []
-        
-        for from_row in range(8):
-            for from_col in range(8):
-                piece = self.board[from_row, from_col]
-                if piece != '' and (piece.islower() == (self.current_player == 'black')):
-                    possible_moves = self._get_possible_moves((from_row, from_col))
-                    for to_row, to_col in possible_moves:
-                        valid_moves.append(((from_row, from_col), (to_row, to_col)))
+        valid_moves = self.position.legal_moves()
         
         if valid_moves:
-            from_square, to_square = valid_moves[np.random.randint(len(valid_moves))]
-            self._execute_move(from_square, to_square, 0)  # Default to normal move
+            move = valid_moves[self.np_random.integers(len(valid_moves))]
+            from_square, to_square, _ = self._decode_action(move)
+            self._apply_move(from_square, to_square)
     
     def _greedy_opponent_move(self):
         """Execute a greedy move (highest value capture) for the opponent."""
         best_move = None
         best_value = -1
-        
-        for from_row in range(8):
-            for from_col in range(8):
-                piece = self.board[from_row, from_col]
-                if piece != '' and (piece.islower() == (self.current_player == 'black')):
-                    possible_moves = self._get_possible_moves((from_row, from_col))
-                    for to_row, to_col in possible_moves:
-                        target = self.board[to_row, to_col]
-                        if target != '':
-                            value = self._get_piece_value(target)
-                            if value > best_value:
-                                best_value = value
-                                best_move = ((from_row, from_col), (to_row, to_col))
-        
-        if best_move:
-            from_square, to_square = best_move
-            self._execute_move(from_square, to_square, 0)
+        mailbox = self.position.mailbox
+        
+        for move in self.position.legal_moves():
+            target = mailbox[(move >> 1) & 63]
+            if target:
+                value = self._code_values[target]
+                if value > best_value:
+                    best_value = value
+                    best_move = move
+        
+        if best_move is not None:
+            from_square, to_square, _ = self._decode_action(best_move)
+            self._apply_move(from_square, to_square)
         else:
             self._random_opponent_move()  # Fallback to random if no captures
     
+    def _minimax_opponent_move(self):
+        """Execute the best move found by alpha-beta search for the opponent."""
+        if self._search_engine is None:
+            from archess_search import SearchEngine
+            self._search_engine = SearchEngine(**self.search_options)
+        
+        result = self._search_engine.search(self.position)
+        if result.move is not None:
+            from_square, to_square, _ = self._decode_action(result.move)
+            self._apply_move(from_square, to_square)
+        else:
+            self._random_opponent_move()
+    
+    def _policy_opponent_move(self):
+        """Execute the opponent policy's move, or a random one if it is illegal."""
+        move = self._opponent_policy(self.position)
+        if move in self.position.legal_moves():
+            from_square, to_square, _ = self._decode_action(move)
+            self._apply_move(from_square, to_square)
+        else:
+            self._random_opponent_move()
+    
     def _get_observation(self) -> np.ndarray:
         """Convert board state to observation array."""
-        obs = np.zeros((8, 8, 12), dtype=np.float32)
-        
-        piece_to_index = {
-            'P': 0, 'N': 1, 'B': 2, 'R': 3, 'Q': 4, 'K': 5,  # White pieces (0-5)
-            'p': 6, 'n': 7, 'b': 8, 'r': 9, 'q': 10, 'k': 11,  # Black pieces (6-11)
-            'A': 0, 'a': 6  # Archers map to same as pawns for simplicity
-        }
-        
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row, col]
-                if piece != '' and piece in piece_to_index:
-                    obs[row, col, piece_to_index[piece]] = 1.0
-        
-        return obs
+        codes = np.frombuffer(self.position.mailbox, dtype=np.uint8)
+        if self.obs_mode == "planes":
+            return OBSERVATION_TABLE[codes].reshape(8, 8, 12)
+        
+        # Same planes as encode_observations, written straight into the buffer
+        position = self.position
+        planes = self._obs_buffer[0]
+        np.take(_PLANES_V2_FLOAT if self.obs_mode == "planes_v2" else PLANES_V2_TABLE,
+                codes, axis=0, out=planes)
+        planes[:, 14] = squares_mask(position.paralyzed) if position.paralyzed else 0
+        planes[:, 15] = position.side
+        observation = planes.reshape(8, 8, len(PLANES_V2))
+        if self.obs_mode == "planes_v2_packed":
+            return np.packbits(observation, axis=-1, bitorder='little')
+        # The buffer is reused by the next call, so callers get their own copy
+        return observation.copy()
+    
+    def action_masks(self) -> np.ndarray:
+        """
+        Boolean mask over the action space marking the legal actions.
+        
+        Archer shots are marked with action type 1, every other move with
+        action type 0. The method name matches what sb3-contrib's
+        MaskablePPO looks up on the environment.
+        """
+        mask = np.zeros(self.action_space.n, dtype=bool)
+        if not self.game_over:
+            mask[self.position.legal_moves()] = True
+        return mask
     
     def _get_info(self) -> Dict[str, Any]:
         """Get info dictionary."""
@@ -502,68 +534,57 @@ class ArchessEnv(gym.Env):
             'move_count': len(self.move_history),
             'game_over': self.game_over,
             'winner': self.winner,
-            'disabled_knights': list(self.disabled_knights)
+            'disabled_knights': list(self.disabled_knights),
+            'action_mask': self.action_masks()
         }
     
+    def enable_profiling(self, mode: str = "counters", sample_every: int = 100):
+        """
+        Start collecting ``stats()``: call counts and cumulative ns of the hot
+        methods, invalid actions and archer shots. ``mode="sample"`` also
+        runs one step in ``sample_every`` under cProfile (see ``dump_profile``).
+        """
+        from archess_profiling import EnvProfiler
+        self.disable_profiling()
+        self._profiler = EnvProfiler(self, mode, sample_every)
+    
+    def disable_profiling(self):
+        """Remove the instrumentation; the env runs its original methods again."""
+        if self._profiler is not None:
+            self._profiler.restore()
+            self._profiler = None
+    
+    def stats(self, reset: bool = False) -> Dict[str, Any]:
+        """Profiling counters since the last reset, or {} while profiling is off."""
+        return self._profiler.stats(reset) if self._profiler is not None else {}
+    
+    def dump_profile(self, path: str) -> bool:
+        """Write the cProfile samples (``profile="sample"``) to ``path``; False if there are none."""
+        profile_stats = self._profiler.profile_stats() if self._profiler is not None else None
+        if profile_stats is None:
+            return False
+        profile_stats.dump_stats(path)
+        return True
+    
     def render(self):
         """Render the environment."""
-        if self.render_mode == "rgb_array":
-            return self._render_frame()
-        elif self.render_mode == "human":
-            return self._render_frame()
-    
-    def _render_frame(self):
-        """Render a single frame."""
-        if self.window is None and self.render_mode == "human":
-            pygame.init()
-            pygame.display.init()
-            self.window = pygame.display.set_mode((self.window_size, self.window_size))
-        if self.clock is None and self.render_mode == "human":
-            self.clock = pygame.time.Clock()
-        
-        canvas = pygame.Surface((self.window_size, self.window_size))
-        canvas.fill((255, 255, 255))
-        
-        # Draw board squares
-        square_size = self.window_size // 8
-        for row in range(8):
-            for col in range(8):
-                color = (240, 217, 181) if (row + col) % 2 == 0 else (181, 136, 99)
-                pygame.draw.rect(
-                    canvas, color,
-                    pygame.Rect(col * square_size, row * square_size, square_size, square_size)
-                )
-                
-                # Draw piece if present
-                piece = self.board[row, col]
-                if piece != '':
-                    self._draw_piece(canvas, piece, row, col, square_size)
-        
-        if self.render_mode == "human":
-            self.window.blit(canvas, canvas.get_rect())
-            pygame.event.pump()
-            pygame.display.update()
-            self.clock.tick(self.metadata["render_fps"])
-        else:
-            return np.transpose(
-                np.array(pygame.surfarray.pixels3d(canvas)), axes=(1, 0, 2)
-            )
-    
-    def _draw_piece(self, canvas, piece, row, col, square_size):
-        """Draw a piece on the canvas."""
-        # Simple text representation for now
-        font = pygame.font.Font(None, square_size // 2)
-        color = (255, 255, 255) if piece.isupper() else (0, 0, 0)
-        text = font.render(piece, True, color)
-        text_rect = text.get_rect(center=(col * square_size + square_size // 2, 
-                                         row * square_size + square_size // 2))
-        canvas.blit(text, text_rect)
+        if self.render_mode not in ("human", "rgb_array"):
+            return None
+        if self._renderer is None:
+            from archess_render import BoardRenderer
+            self._renderer = BoardRenderer(self.render_mode, self.window_size, self.metadata["render_fps"])
+        position = self.position
+        return self._renderer.render(np.frombuffer(position.mailbox, dtype=np.uint8),
+                                     squares_mask(position.paralyzed))
     
     def close(self):
         """Close the environment."""
-        if self.window is not None:
-            pygame.display.quit()
-            pygame.quit()
+        self._save_game()
+        if self._owns_store:
+            self.game_store.close()
+        if self._renderer is not None:
+            self._renderer.close()
+            self._renderer = None
 
 # Register the environment
 gym.register(
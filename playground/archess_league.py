@@ -0,0 +1,291 @@
+"""
+Self-play league for Archess.
+
+Plays round-robin matches between trained checkpoints and the built-in
+random, greedy and minimax players, and keeps an Elo table on disk so
+ratings carry over between league runs.
+
+Games are split into chunks that run on a process pool; each worker loads
+every player once. Within a chunk all games are played side by side, one
+ply per round, and each round's positions are grouped by the player to
+move, so a checkpoint decides all of its pending moves in one batched
+forward pass (``ModelPolicy.act``) instead of one call per game.
+
+Run ``python archess_league.py random greedy minimax models/ppo_archess_final.zip``.
+"""
+
+import json
+import os
+import random
+import time
+from collections import defaultdict
+from multiprocessing import get_context
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from archess_env import SEARCH_DEFAULTS
+from archess_policy import make_policy
+from archess_position import Position, WHITE, KNIGHT, ARCHER, TYPE_MASK, squares_mask
+
+
+class GameResult(NamedTuple):
+    white: str
+    black: str
+    winner: Optional[int]  # WHITE, BLACK, or None for a draw
+    plies: int
+
+
+class EloTable:
+    """
+    Elo ratings with win/draw/loss counts, persisted as JSON.
+
+    Args:
+        path: JSON file to load from and save to, None to keep it in memory
+        k_factor: Largest rating change per game
+        initial_rating: Rating of a player's first game
+    """
+
+    def __init__(self, path: Optional[str] = None, k_factor: float = 16.0,
+                 initial_rating: float = 1200.0):
+        self.path = path
+        self.k_factor = k_factor
+        self.initial_rating = initial_rating
+        self.players: Dict[str, dict] = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.players = json.load(f)
+
+    def entry(self, name: str) -> dict:
+        """Rating record of a player, created on first use."""
+        if name not in self.players:
+            self.players[name] = {"rating": self.initial_rating, "games": 0,
+                                  "wins": 0, "draws": 0, "losses": 0}
+        return self.players[name]
+
+    def rating(self, name: str) -> float:
+        return self.entry(name)["rating"]
+
+    def expected_score(self, name: str, opponent: str) -> float:
+        """Expected score of ``name`` against ``opponent`` (1 win, 0.5 draw)."""
+        return 1 / (1 + 10 ** ((self.rating(opponent) - self.rating(name)) / 400))
+
+    def update(self, result: GameResult):
+        """Apply one game's result to both players."""
+        white = self.entry(result.white)
+        black = self.entry(result.black)
+        score = 0.5 if result.winner is None else float(result.winner == WHITE)
+        delta = self.k_factor * (score - self.expected_score(result.white, result.black))
+        white["rating"] += delta
+        black["rating"] -= delta
+        for record, player_score in ((white, score), (black, 1 - score)):
+            record["games"] += 1
+            record["wins" if player_score == 1 else "losses" if player_score == 0 else "draws"] += 1
+
+    def leaderboard(self) -> List[Tuple[str, dict]]:
+        """Players sorted by rating, best first."""
+        return sorted(self.players.items(), key=lambda item: item[1]["rating"], reverse=True)
+
+    def save(self):
+        if self.path:
+            with open(self.path, "w") as f:
+                json.dump(self.players, f, indent=2)
+
+
+def _is_legal(position: Position, move: int) -> bool:
+    """Cheap check that a move belongs to the side to move and reaches its target."""
+    if move < 0 or move >= 8192:
+        return False
+    from_sq = move >> 7
+    code = position.mailbox[from_sq]
+    if not code or code >> 3 != position.side:
+        return False
+    return bool(position.targets(from_sq) >> ((move >> 1) & 63) & 1)
+
+
+def play_games(players: Dict[str, object], pairings: Sequence[Tuple[str, str]],
+               max_plies: int = 400, seed: Optional[int] = None) -> List[GameResult]:
+    """
+    Play one game per (white, black) pairing, all of them concurrently.
+
+    ``players`` maps names to policies (see ``archess_policy``). Each round
+    asks every player for its moves in the games where it is to move;
+    players with an ``act`` method get them as one batch. Illegal moves are
+    replaced by a random legal move, and games longer than ``max_plies``
+    are draws.
+    """
+    rng = random.Random(seed)
+    games = [Position.initial() for _ in pairings]
+    results: List[Optional[GameResult]] = [None] * len(pairings)
+    active = list(range(len(pairings)))
+    plies = 0
+
+    while active:
+        to_move = defaultdict(list)
+        for i in active:
+            to_move[pairings[i][games[i].side]].append(i)
+
+        for name, indices in to_move.items():
+            policy = players[name]
+            if hasattr(policy, "act"):
+                boards = np.stack([np.frombuffer(games[i].mailbox, dtype=np.uint8) for i in indices])
+                paralyzed = np.stack([squares_mask(games[i].paralyzed) for i in indices])
+                sides = np.array([games[i].side for i in indices], dtype=np.int8)
+                moves = policy.act(boards, paralyzed, sides).tolist()
+            else:
+                moves = [policy(games[i]) for i in indices]
+
+            for i, move in zip(indices, moves):
+                position = games[i]
+                if not _is_legal(position, move):
+                    move = rng.choice(position.legal_moves())
+                mailbox = position.mailbox
+                paralyze = (mailbox[move >> 7] & TYPE_MASK == ARCHER
+                            and mailbox[(move >> 1) & 63] & TYPE_MASK == KNIGHT
+                            and rng.random() < 0.5)
+                position.make_move(move, paralyze)
+
+        plies += 1
+        for i in active:
+            position = games[i]
+            mover = position.side ^ 1
+            if not position.king_alive(position.side):
+                results[i] = GameResult(*pairings[i], mover, plies)
+            elif plies >= max_plies or not position.has_legal_move():
+                results[i] = GameResult(*pairings[i], None, plies)
+        active = [i for i in active if results[i] is None]
+
+    return results
+
+
+# Players of the current worker process, loaded once by _init_worker
+_worker_players: Dict[str, object] = {}
+
+
+def _init_worker(specs: Dict[str, str], search_options: Optional[dict]):
+    global _worker_players
+    try:
+        import torch
+        torch.set_num_threads(1)  # One inference thread per worker process
+    except ImportError:
+        pass
+    _worker_players = {name: make_policy(spec, None, search_options) for name, spec in specs.items()}
+
+
+def seed_players(players: Dict[str, object], seed: int):
+    """Reseed every player's move sampling from ``seed`` and its name."""
+    for index, (name, player) in enumerate(players.items()):
+        if hasattr(player, "rng"):
+            player.rng.seed(f"{seed}/{name}")
+        if hasattr(player, "np_random"):
+            player.np_random = np.random.default_rng([seed, index])
+
+
+def _play_chunk(args) -> List[GameResult]:
+    pairings, max_plies, seed = args
+    # Seeded per chunk, not per worker: results do not depend on which worker plays it
+    seed_players(_worker_players, seed)
+    return play_games(_worker_players, pairings, max_plies, seed)
+
+
+def player_name(spec: str) -> str:
+    """League name of a player: built-in name or checkpoint file name."""
+    return os.path.splitext(os.path.basename(spec))[0]
+
+
+class League:
+    """
+    Round-robin league between Archess players.
+
+    Args:
+        players: Player specs ("random", "greedy", "minimax" or checkpoint paths),
+            or a dict of name -> spec
+        ratings_path: JSON file holding the Elo table, None to keep it in memory
+        n_workers: Worker processes, 0 to play in this process (default: CPU count)
+        games_per_chunk: Games each worker plays concurrently per task
+        max_plies: Half-moves before a game is scored as a draw
+        search_options: ``SearchEngine`` options for the minimax player, over ``SEARCH_DEFAULTS``
+        seed: Seed for schedules, coin flips and random players
+    """
+
+    def __init__(self, players: Union[Sequence[str], Dict[str, str]],
+                 ratings_path: Optional[str] = "league_ratings.json",
+                 n_workers: Optional[int] = None, games_per_chunk: int = 64,
+                 max_plies: int = 400, search_options: Optional[dict] = None,
+                 seed: Optional[int] = None):
+        if not isinstance(players, dict):
+            players = {player_name(spec): spec for spec in players}
+        self.specs = dict(players)
+        self.table = EloTable(ratings_path)
+        self.n_workers = os.cpu_count() if n_workers is None else n_workers
+        self.games_per_chunk = games_per_chunk
+        self.max_plies = max_plies
+        self.search_options = {**SEARCH_DEFAULTS, **(search_options or {})}
+        self.seed = seed
+
+    def schedule(self, games_per_pair: int) -> List[Tuple[str, str]]:
+        """Every pair of players meets ``games_per_pair`` times, alternating colors."""
+        names = list(self.specs)
+        pairings = []
+        for i, first in enumerate(names):
+            for second in names[i + 1:]:
+                for game in range(games_per_pair):
+                    pairings.append((first, second) if game % 2 == 0 else (second, first))
+        random.Random(self.seed).shuffle(pairings)
+        return pairings
+
+    def run(self, games_per_pair: int = 10, verbose: bool = True) -> EloTable:
+        """Play the round robin, update and save the Elo table, and return it."""
+        pairings = self.schedule(games_per_pair)
+        base_seed = self.seed if self.seed is not None else random.randrange(2 ** 31)
+        chunks = [(pairings[start:start + self.games_per_chunk], self.max_plies, base_seed + n)
+                  for n, start in enumerate(range(0, len(pairings), self.games_per_chunk))]
+
+        start = time.perf_counter()
+        games = 0
+        if self.n_workers <= 1:
+            _init_worker(self.specs, self.search_options)
+            chunk_results = map(_play_chunk, chunks)
+            pool = None
+        else:
+            pool = get_context("spawn").Pool(
+                self.n_workers, _init_worker, (self.specs, self.search_options))
+            chunk_results = pool.imap(_play_chunk, chunks)  # In order: Elo updates depend on it
+        try:
+            for results in chunk_results:
+                for result in results:
+                    self.table.update(result)
+                games += len(results)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        self.table.save()
+        if verbose:
+            elapsed = time.perf_counter() - start
+            print(f"Played {games} games in {elapsed:.1f}s ({games / max(elapsed, 1e-9):.1f} games/s)")
+            self.print_leaderboard()
+        return self.table
+
+    def print_leaderboard(self):
+        print(f"{'Player':30s} {'Elo':>7s} {'Games':>6s} {'W':>5s} {'D':>5s} {'L':>5s}")
+        for name, record in self.table.leaderboard():
+            print(f"{name:30s} {record['rating']:7.1f} {record['games']:6d} "
+                  f"{record['wins']:5d} {record['draws']:5d} {record['losses']:5d}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Round-robin Archess league with Elo ratings")
+    parser.add_argument("players", nargs="+", help='"random", "greedy", "minimax" or checkpoint paths')
+    parser.add_argument("--games", type=int, default=10, help="Games per pair of players")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (0: in-process)")
+    parser.add_argument("--ratings", default="league_ratings.json", help="Elo table JSON file")
+    parser.add_argument("--max-plies", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    League(args.players, ratings_path=args.ratings, n_workers=args.workers,
+           max_plies=args.max_plies, seed=args.seed).run(args.games)
@@ -0,0 +1,421 @@
+"""
+Monte Carlo Tree Search for Archess.
+
+PUCT search (as in AlphaZero) over the bitboard Position. An archer shot
+at a knight leads to a chance node with two equally likely children, the
+knight paralyzed or missed; simulations alternate between them, so each
+outcome gets half of the visits and the shot's value is their average.
+
+Priors and leaf values come from a pluggable evaluator, a callable
+
+    evaluator(positions, moves) -> (priors, values)
+
+taking a list of positions and the legal moves of each, and returning one
+prior array per position (aligned with its moves) plus an array of values
+in [-1, 1] for the side to move. ``HeuristicEvaluator`` uses the static
+evaluation of ``archess_search``; ``ModelEvaluator`` uses an SB3 model's
+policy and value heads.
+
+Leaves are collected in batches of ``batch_size`` and evaluated with one
+evaluator call. Virtual loss steers the simulations of a batch onto
+different paths; a selection that lands on a leaf already waiting for
+its evaluation is dropped and does not count towards ``num_simulations``.
+
+Two kinds of parallelism are available:
+
+* ``num_threads > 1``: threads share one tree (tree parallelism).
+  Selection and backup run under a lock, so this only gains while
+  evaluator calls release the GIL, e.g. torch forward passes of
+  ``ModelEvaluator``. With the pure-Python heuristic it barely helps.
+* ``num_processes > 1``: worker processes each search their own tree
+  from the root with a share of the simulations, and the root visits
+  are summed (root parallelism). This scales CPU-bound evaluators too.
+  The evaluator is pickled to the workers once, when the pool starts on
+  the first search; ``close()`` stops the pool.
+"""
+
+import math
+import threading
+import time
+from multiprocessing import get_context
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from archess_position import Position, KNIGHT, ARCHER, TYPE_MASK, squares_mask
+from archess_search import MVV_LVA, evaluate
+
+Evaluator = Callable[[List[Position], List[List[int]]], Tuple[List[np.ndarray], np.ndarray]]
+
+
+class HeuristicEvaluator:
+    """
+    Priors favouring captures by MVV-LVA, values from ``archess_search.evaluate``.
+
+    Args:
+        value_scale: Material difference that maps to a value of tanh(1) ~ 0.76
+        capture_weight: Prior weight of a capture per 100 MVV-LVA points (quiet moves weigh 1)
+    """
+
+    def __init__(self, value_scale: float = 5.0, capture_weight: float = 1.0):
+        self.value_scale = value_scale
+        self.capture_weight = capture_weight
+
+    def __call__(self, positions: List[Position], moves: List[List[int]]):
+        priors = []
+        values = np.empty(len(positions))
+        for i, (position, legal) in enumerate(zip(positions, moves)):
+            mailbox = position.mailbox
+            weights = np.array([1.0 + self.capture_weight * MVV_LVA[mailbox[(move >> 1) & 63]][mailbox[move >> 7]] / 100
+                                for move in legal])
+            priors.append(weights / weights.sum())
+            values[i] = math.tanh(evaluate(position) / self.value_scale)
+        return priors, values
+
+
+class ModelEvaluator:
+    """
+    Priors and values from a Stable Baselines3 model, batched over all leaves.
+
+    Priors are the model's masked action probabilities (see
+    ``ModelPolicy.evaluate``); values are its critic estimates (the best
+    Q-value for DQN) squashed into [-1, 1] by tanh(value / value_scale).
+
+    Args:
+        model: SB3 model, checkpoint path or ``ModelPolicy``
+        value_scale: Critic value that maps to tanh(1) ~ 0.76
+    """
+
+    def __init__(self, model, value_scale: float = 10.0):
+        from archess_policy import ModelPolicy
+
+        self.policy = model if isinstance(model, ModelPolicy) else ModelPolicy(model)
+        self.value_scale = value_scale
+
+    def __call__(self, positions: List[Position], moves: List[List[int]]):
+        boards = np.stack([np.frombuffer(position.mailbox, dtype=np.uint8) for position in positions])
+        paralyzed = np.stack([squares_mask(position.paralyzed) for position in positions])
+        sides = np.array([position.side for position in positions], dtype=np.int8)
+        probabilities, values = self.policy.evaluate(boards, paralyzed, sides)
+
+        priors = []
+        for row, legal in zip(probabilities, moves):
+            prior = row[legal]
+            total = prior.sum()
+            priors.append(prior / total if total > 0 else np.full(len(legal), 1.0 / len(legal)))
+        return priors, np.tanh(values / self.value_scale)
+
+
+class _Node:
+    """Decision node; edge statistics are from the point of view of its side to move."""
+
+    __slots__ = ("moves", "priors", "visits", "totals", "children", "chance", "terminal", "pending")
+
+    def __init__(self):
+        self.moves: Optional[List[int]] = None  # None until expanded
+        self.terminal: Optional[float] = None
+        self.pending = False  # Waiting for its evaluation in the current batch
+
+    def expand(self, moves: List[int], priors: np.ndarray, chance: List[bool]):
+        self.moves = moves
+        self.priors = np.asarray(priors, dtype=np.float64)
+        self.visits = np.zeros(len(moves))
+        self.totals = np.zeros(len(moves))
+        self.children: List[Optional[object]] = [None] * len(moves)
+        self.chance = chance
+
+
+class _ChanceNode:
+    """Knight shot: child 0 has the knight paralyzed, child 1 missed it."""
+
+    __slots__ = ("children", "visits")
+
+    def __init__(self):
+        self.children = [_Node(), _Node()]
+        self.visits = [0, 0]
+
+
+class MCTSResult(NamedTuple):
+    move: Optional[int]
+    value: float  # Root value for the side to move
+    visits: Dict[int, int]  # Root visit count per move
+    simulations: int
+
+    def policy(self, temperature: float = 1.0) -> np.ndarray:
+        """Visit distribution over the 8192 actions, the AlphaZero policy target."""
+        target = np.zeros(8192, dtype=np.float32)
+        if not self.visits:
+            return target
+        moves = list(self.visits)
+        counts = np.array([self.visits[move] for move in moves], dtype=np.float64)
+        if temperature == 0:
+            target[moves[int(counts.argmax())]] = 1.0
+            return target
+        counts = counts ** (1.0 / temperature)
+        target[moves] = counts / counts.sum()
+        return target
+
+
+class MCTS:
+    """
+    Batched PUCT search with chance nodes for knight paralysis.
+
+    Args:
+        evaluator: Prior/value function (default: ``HeuristicEvaluator()``)
+        num_simulations: Simulations per search
+        time_limit_ms: Wall-clock budget per search, None for no limit
+        batch_size: Leaves collected per evaluator call
+        c_puct: Exploration constant
+        virtual_loss: Loss added to every edge of an in-flight simulation
+        num_threads: Threads sharing the tree, 1 for single-threaded search
+        num_processes: Worker processes searching separate trees (root
+            parallelism), 1 to search in this process
+        dirichlet_alpha: Root prior noise for self-play, None to disable
+        noise_fraction: Weight of the root noise
+        temperature: 0 plays the most visited move, otherwise moves are
+            sampled from visits ** (1 / temperature)
+        seed: Seed for root noise and move sampling
+    """
+
+    def __init__(self, evaluator: Optional[Evaluator] = None, num_simulations: int = 200,
+                 time_limit_ms: Optional[float] = None, batch_size: int = 16,
+                 c_puct: float = 1.5, virtual_loss: float = 1.0, num_threads: int = 1,
+                 dirichlet_alpha: Optional[float] = None, noise_fraction: float = 0.25,
+                 temperature: float = 0.0, seed: Optional[int] = None, num_processes: int = 1):
+        self.evaluator = evaluator or HeuristicEvaluator()
+        self.num_simulations = num_simulations
+        self.time_limit_ms = time_limit_ms
+        self.batch_size = batch_size
+        self.c_puct = c_puct
+        self.virtual_loss = virtual_loss
+        self.num_threads = num_threads
+        self.num_processes = num_processes
+        self._pool = None
+        self.dirichlet_alpha = dirichlet_alpha
+        self.noise_fraction = noise_fraction
+        self.temperature = temperature
+        self.np_random = np.random.default_rng(seed)
+        self.collisions = 0
+
+    def __call__(self, position: Position) -> int:
+        """Policy interface (see ``archess_policy``): the searched move, -1 if none."""
+        move = self.search(position).move
+        return -1 if move is None else move
+
+    def search(self, position: Position) -> MCTSResult:
+        """Run the simulations from ``position`` (left unchanged) and pick a move."""
+        root = _Node()
+        moves = position.legal_moves()
+        if not moves or not position.king_alive(position.side):
+            return MCTSResult(None, 0.0, {}, 0)
+
+        priors, _ = self.evaluator([position], [moves])
+        priors = np.asarray(priors[0], dtype=np.float64)
+        if self.dirichlet_alpha is not None:
+            noise = self.np_random.dirichlet([self.dirichlet_alpha] * len(moves))
+            priors = (1 - self.noise_fraction) * priors + self.noise_fraction * noise
+        root.expand(moves, priors, self._chance_flags(position, moves))
+        if self.num_processes > 1:
+            return self._search_processes(root, position)
+
+        self.collisions = 0
+        self._simulations = 0  # Completed backups
+        self._in_flight = 0  # Leaves selected and waiting for their evaluation
+        self._deadline = None if self.time_limit_ms is None else time.perf_counter() + self.time_limit_ms / 1000
+        self._lock = threading.Lock()
+        if self.num_threads <= 1:
+            self._run(root, position.copy())
+        else:
+            threads = [threading.Thread(target=self._run, args=(root, position.copy()))
+                       for _ in range(self.num_threads)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        visits = {move: int(n) for move, n in zip(root.moves, root.visits)}
+        total = root.visits.sum()
+        value = float(root.totals.sum() / total) if total else 0.0
+        return MCTSResult(self._choose(root.moves, root.visits, root.priors), value, visits, self._simulations)
+
+    def _search_processes(self, root: _Node, position: Position) -> MCTSResult:
+        """Root parallelism: split the simulations over the pool and sum the root statistics."""
+        if self._pool is None:
+            options = dict(time_limit_ms=self.time_limit_ms, batch_size=self.batch_size, c_puct=self.c_puct,
+                           virtual_loss=self.virtual_loss, num_threads=self.num_threads,
+                           dirichlet_alpha=self.dirichlet_alpha, noise_fraction=self.noise_fraction)
+            self._pool = get_context("spawn").Pool(self.num_processes, _init_root_worker,
+                                                   (self.evaluator, options))
+        shares = [self.num_simulations // self.num_processes + (i < self.num_simulations % self.num_processes)
+                  for i in range(self.num_processes)]
+        seeds = self.np_random.integers(2 ** 63, size=self.num_processes)
+        data = position.to_bytes()
+        results = self._pool.map(_root_search, [(data, share, int(seed)) for share, seed in zip(shares, seeds)])
+
+        visits = np.zeros(len(root.moves))
+        value_total = 0.0
+        self.collisions = 0
+        for result, collisions in results:
+            visits += [result.visits.get(move, 0) for move in root.moves]
+            value_total += result.value * sum(result.visits.values())
+            self.collisions += collisions
+        total = visits.sum()
+        value = value_total / total if total else 0.0
+        return MCTSResult(self._choose(root.moves, visits, root.priors), value,
+                          {move: int(n) for move, n in zip(root.moves, visits)},
+                          sum(result.simulations for result, _ in results))
+
+    def close(self):
+        """Stop the root-parallel worker pool, if one was started."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_pool'] = None  # Pools stay with the process that started them
+        state.pop('_lock', None)
+        return state
+
+    def _choose(self, moves: List[int], visits: np.ndarray, priors: np.ndarray) -> int:
+        if self.temperature == 0:
+            return moves[int(visits.argmax())]
+        weights = visits ** (1.0 / self.temperature)
+        if weights.sum() == 0:
+            weights = priors
+        return moves[int(self.np_random.choice(len(moves), p=weights / weights.sum()))]
+
+    @staticmethod
+    def _chance_flags(position: Position, moves: Sequence[int]) -> List[bool]:
+        mailbox = position.mailbox
+        return [mailbox[move >> 7] & TYPE_MASK == ARCHER and mailbox[(move >> 1) & 63] & TYPE_MASK == KNIGHT
+                for move in moves]
+
+    def _budget_left(self) -> int:
+        """Simulations still to start: neither backed up nor waiting for an evaluation."""
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            return 0
+        return self.num_simulations - self._simulations - self._in_flight
+
+    def _run(self, root: _Node, position: Position):
+        """Select a batch of leaves, evaluate them together, back them up; repeat."""
+        while True:
+            batch = []
+            with self._lock:
+                budget = min(self.batch_size, self._budget_left())
+                if budget <= 0:
+                    return  # Any in-flight leaves are backed up by the threads that selected them
+                for _ in range(budget):
+                    path, leaf, moves = self._select(root, position)
+                    if moves is not None:
+                        batch.append((path, leaf, moves, position.copy()))
+                        self._in_flight += 1
+                    elif leaf.terminal is not None:
+                        self._backup(path, leaf.terminal)
+                        self._simulations += 1
+                    else:
+                        self._revert(path)  # Leaf already waiting in this batch
+                        self.collisions += 1
+                    for _ in path:
+                        position.pop()
+            if not batch:
+                continue
+
+            priors, values = self.evaluator([entry[3] for entry in batch], [entry[2] for entry in batch])
+
+            with self._lock:
+                for (path, leaf, moves, leaf_position), prior, value in zip(batch, priors, values):
+                    leaf.expand(moves, prior, self._chance_flags(leaf_position, moves))
+                    leaf.pending = False
+                    self._backup(path, float(value))
+                self._in_flight -= len(batch)
+                self._simulations += len(batch)
+
+    def _select(self, root: _Node, position: Position):
+        """
+        Walk down by PUCT from the root, pushing moves on ``position`` and
+        adding virtual loss. Returns (path, leaf, legal moves of the leaf or
+        None when it is terminal or already pending).
+        """
+        node = root
+        path = []
+        virtual_loss = self.virtual_loss
+        while node.moves is not None:
+            visits = node.visits
+            total = visits.sum()
+            q = np.where(visits > 0, node.totals / np.maximum(visits, 1e-9), 0.0)
+            u = self.c_puct * node.priors * math.sqrt(total + 1) / (1 + visits)
+            i = int((q + u).argmax())
+            visits[i] += virtual_loss
+            node.totals[i] -= virtual_loss
+
+            move = node.moves[i]
+            child = node.children[i]
+            if node.chance[i]:
+                if child is None:
+                    child = node.children[i] = _ChanceNode()
+                outcome = 0 if child.visits[0] <= child.visits[1] else 1
+                child.visits[outcome] += 1
+                position.push(move, outcome == 0)
+                path.append((node, i, child, outcome))
+                node = child.children[outcome]
+            else:
+                if child is None:
+                    child = node.children[i] = _Node()
+                position.push(move)
+                path.append((node, i, None, 0))
+                node = child
+
+            if node.terminal is not None:
+                return path, node, None
+
+        if node.pending:
+            return path, node, None
+        if not position.king_alive(position.side):
+            node.terminal = -1.0  # The last move captured this side's king
+            return path, node, None
+        moves = position.legal_moves()
+        if not moves:
+            node.terminal = 0.0  # No moves is a draw
+            return path, node, None
+        node.pending = True
+        return path, node, moves
+
+    def _backup(self, path, value: float):
+        """Add a leaf value (for the leaf's side to move) along the path, removing virtual loss."""
+        virtual_loss = self.virtual_loss
+        for node, i, _, _ in reversed(path):
+            value = -value
+            node.visits[i] += 1 - virtual_loss
+            node.totals[i] += value + virtual_loss
+
+    def _revert(self, path):
+        """Undo the virtual loss and chance visits of an abandoned simulation."""
+        virtual_loss = self.virtual_loss
+        for node, i, chance, outcome in path:
+            node.visits[i] -= virtual_loss
+            node.totals[i] += virtual_loss
+            if chance is not None:
+                chance.visits[outcome] -= 1
+
+
+# Search of the current root-parallel worker process, built once by _init_root_worker
+_worker_mcts: Optional[MCTS] = None
+
+
+def _init_root_worker(evaluator: Evaluator, options: dict):
+    global _worker_mcts
+    try:
+        import torch
+        torch.set_num_threads(1)  # One inference thread per worker process
+    except ImportError:
+        pass
+    _worker_mcts = MCTS(evaluator, **options)
+
+
+def _root_search(args) -> Tuple[MCTSResult, int]:
+    data, simulations, seed = args
+    _worker_mcts.num_simulations = simulations
+    _worker_mcts.np_random = np.random.default_rng(seed)
+    return _worker_mcts.search(Position.from_bytes(data)), _worker_mcts.collisions
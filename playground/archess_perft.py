@@ -0,0 +1,235 @@
+"""
+Perft for Archess move generation.
+
+``perft(position, depth)`` counts the leaves of the move tree ``depth``
+plies deep and splits them by the kind of move that reached them:
+
+- quiet: a move to an empty square
+- capture: a piece moving onto an enemy piece
+- shot: an archer shot that removes its target, or misses a knight
+- paralysis: an archer shot that paralyzes a knight
+
+A knight shot is a chance move, so it branches twice: once into a
+paralysis leaf and once into a shot leaf. Games stop once a king is
+captured, and a side with no moves adds no leaves, so both behave like
+checkmate in chess perft.
+
+``PERFT_SUITE`` pins the counts for the starting position and a few
+curated positions. Run this file to check them and print nodes per
+second, the standing benchmark for the move generator.
+"""
+
+import time
+from typing import Dict, List, NamedTuple
+
+from archess_position import (
+    Position, WHITE, BLACK, KNIGHT, TYPE_MASK, STARTING_ROWS, decode_move,
+)
+
+QUIET = 0
+CAPTURE = 1
+SHOT = 2
+PARALYSIS = 3
+
+
+class PerftResult(NamedTuple):
+    nodes: int
+    quiet: int
+    capture: int
+    shot: int
+    paralysis: int
+    seconds: float
+
+    @property
+    def nps(self) -> float:
+        """Leaves counted per second."""
+        return self.nodes / self.seconds if self.seconds > 0 else float('inf')
+
+    def counts(self) -> tuple:
+        """(nodes, quiet, capture, shot, paralysis), as stored in ``PERFT_SUITE``."""
+        return self[:5]
+
+
+def _perft(position: Position, depth: int, counts: List[int]):
+    """Add the leaf counts below ``position`` to ``counts`` (depth >= 1)."""
+    if not position.king_alive(position.side):
+        return  # The previous move captured a king
+    mailbox = position.mailbox
+    moves = position.legal_moves()
+
+    if depth == 1:
+        for move in moves:
+            target = mailbox[(move >> 1) & 63]
+            if move & 1:
+                counts[SHOT] += 1
+                if target & TYPE_MASK == KNIGHT:
+                    counts[PARALYSIS] += 1
+            elif target:
+                counts[CAPTURE] += 1
+            else:
+                counts[QUIET] += 1
+        return
+
+    for move in moves:
+        if move & 1 and mailbox[(move >> 1) & 63] & TYPE_MASK == KNIGHT:
+            for paralyze in (True, False):
+                position.push(move, paralyze)
+                _perft(position, depth - 1, counts)
+                position.pop()
+        else:
+            position.push(move)
+            _perft(position, depth - 1, counts)
+            position.pop()
+
+
+def perft(position: Position, depth: int) -> PerftResult:
+    """Count the leaves ``depth`` plies below ``position``, by move category."""
+    start = time.perf_counter()
+    counts = [0, 0, 0, 0]
+    if depth == 0:
+        nodes = 1
+    else:
+        _perft(position, depth, counts)
+        nodes = sum(counts)
+    return PerftResult(nodes, *counts, time.perf_counter() - start)
+
+
+def move_name(move: int) -> str:
+    """Coordinate notation for a move, e.g. ``e2e3``; archer shots use ``^``."""
+    from_sq, to_sq, shot = decode_move(move)
+
+    def name(sq: int) -> str:
+        return 'abcdefgh'[sq & 7] + str(8 - (sq >> 3))
+
+    return name(from_sq) + ('^' if shot else '') + name(to_sq)
+
+
+def divide(position: Position, depth: int) -> Dict[str, PerftResult]:
+    """Perft below every root move (``depth`` counts the root move), keyed by ``move_name``."""
+    results = {}
+    mailbox = position.mailbox
+    for move in position.legal_moves():
+        start = time.perf_counter()
+        counts = [0, 0, 0, 0]
+        knight_shot = move & 1 and mailbox[(move >> 1) & 63] & TYPE_MASK == KNIGHT
+        if depth <= 1:
+            if knight_shot:
+                counts[PARALYSIS] += 1
+            counts[SHOT if move & 1 else CAPTURE if mailbox[(move >> 1) & 63] else QUIET] += 1
+        else:
+            for paralyze in ((True, False) if knight_shot else (False,)):
+                position.push(move, paralyze)
+                _perft(position, depth - 1, counts)
+                position.pop()
+        results[move_name(move)] = PerftResult(sum(counts), *counts, time.perf_counter() - start)
+    return results
+
+
+# name -> (rows, side to move, paralyzed knights, {depth: (nodes, quiet, capture, shot, paralysis)})
+PERFT_SUITE = {
+    'start': (STARTING_ROWS, WHITE, (), {
+        1: (22, 22, 0, 0, 0),
+        2: (484, 484, 0, 0, 0),
+        3: (11906, 11880, 22, 4, 0),
+        4: (292780, 291183, 1159, 354, 84),
+    }),
+    # Archers of both colors within range of knights, pawns and each other
+    'archer_skirmish': ((
+        'r...k..r',
+        '.a..n.a.',
+        '..n..p..',
+        '.P..A...',
+        '..p.N.a.',
+        '.A....P.',
+        '...N..A.',
+        'R...K..R',
+    ), WHITE, (), {
+        1: (57, 49, 5, 2, 1),
+        2: (3349, 2921, 264, 163, 1),
+        3: (179373, 155129, 15882, 5610, 2752),
+    }),
+    # Black to move with one paralyzed knight per side
+    'paralyzed_knights': ((
+        'r.b.k..r',
+        'pp..a.pp',
+        '..n.....',
+        '...A.n..',
+        '..N.....',
+        '....a...',
+        'PP.N.PPP',
+        'R.B.K..R',
+    ), BLACK, ((2, 2), (4, 2)), {
+        1: (36, 35, 0, 1, 0),
+        2: (970, 929, 35, 5, 1),
+        3: (35160, 33822, 340, 952, 46),
+        4: (960145, 905731, 40645, 11046, 2723),
+    }),
+    'open_sliders': ((
+        '...qk..r',
+        '.b......',
+        '........',
+        '..Q.....',
+        '....B...',
+        '........',
+        '.....a..',
+        'R...K...',
+    ), WHITE, (), {
+        1: (51, 48, 3, 0, 0),
+        2: (2153, 2083, 69, 1, 0),
+        3: (100733, 93674, 7059, 0, 0),
+    }),
+    # Both kings can be taken within a few plies, so games end mid-tree
+    'king_hunt': ((
+        '....k...',
+        '...P....',
+        '....A...',
+        '........',
+        '........',
+        '...a....',
+        '....p...',
+        '....K...',
+    ), WHITE, (), {
+        1: (15, 12, 2, 1, 0),
+        2: (163, 144, 17, 2, 0),
+        3: (2311, 1984, 261, 66, 0),
+        4: (29437, 26500, 2586, 351, 0),
+    }),
+}
+
+
+def suite_position(name: str) -> Position:
+    """Position of a ``PERFT_SUITE`` entry."""
+    rows, side, paralyzed, _ = PERFT_SUITE[name]
+    return Position.from_rows(rows, side=side, paralyzed=paralyzed)
+
+
+def run_suite(max_depth: int = 4, verbose: bool = True) -> bool:
+    """Check every ``PERFT_SUITE`` count up to ``max_depth``; report nodes per second."""
+    passed = True
+    total_nodes = 0
+    total_seconds = 0.0
+    for name, (_, _, _, expected) in PERFT_SUITE.items():
+        position = suite_position(name)
+        for depth, counts in expected.items():
+            if depth > max_depth:
+                continue
+            result = perft(position, depth)
+            ok = result.counts() == counts
+            passed &= ok
+            total_nodes += result.nodes
+            total_seconds += result.seconds
+            if verbose:
+                status = "ok" if ok else f"FAILED, expected {counts}"
+                print(f"{name:18s} depth {depth}: {result.nodes:>9,d} nodes "
+                      f"{result.nps:>11,.0f} nps  {status}")
+    if verbose and total_seconds > 0:
+        print(f"Total: {total_nodes:,d} nodes in {total_seconds:.2f}s "
+              f"({total_nodes / total_seconds:,.0f} nps)")
+    return passed
+
+
+if __name__ == "__main__":
+    import sys
+
+    max_depth = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    sys.exit(0 if run_suite(max_depth) else 1)
@@ -0,0 +1,255 @@
+"""
+PettingZoo environments for Archess self-play.
+
+``raw_env`` is an ``AECEnv`` with two agents, "white" and "black", that
+take turns on the bitboard ``Position`` core. Every agent sees the board
+from its own side: black's observation is the color-swapped, vertically
+flipped position (``Position.mirrored()``), so both agents look like white
+to a policy, and black's actions are given in that flipped frame too
+(``mirror_move`` maps them back). This is the convention of
+``archess_policy.ModelPolicy``, so one network can play both colors.
+
+Observations are dicts of ``observation`` (any of ``archess_env.OBS_MODES``)
+and ``action_mask`` (int8 over the 8192 actions, all zeros for the agent
+not to move). Rewards follow ``ArchessEnv`` and go to the mover: captured
+piece value, 1.5 for paralyzing a knight, 0.1 for a shot that misses one,
+-0.1 for an illegal action, which leaves the same agent to move. Taking the
+king (+1000) ends the game and costs the losing agent -1000, so the two
+sides' final rewards are opposite. A side without legal moves draws, and
+games are truncated after ``max_steps`` steps, with no reward to either side.
+
+``env()`` adds the standard PettingZoo checks; ``parallel_env()`` returns
+``ArchessParallelEnv``, where both agents act every step and only the
+action of the side to move is played.
+"""
+
+from typing import Any, Dict, Optional
+
+import numpy as np
+from gymnasium import spaces
+from gymnasium.utils import seeding
+from pettingzoo import AECEnv, ParallelEnv
+from pettingzoo.utils import wrappers
+
+from archess_env import PIECE_VALUES, PieceType, encode_observations, observation_space
+from archess_policy import MIRROR_ACTIONS
+from archess_position import (
+    Position, WHITE, BLACK, KNIGHT, KING, TYPE_MASK, encode_move, mirror_move, squares_mask,
+)
+
+AGENTS = ("white", "black")
+CODE_VALUES = [PIECE_VALUES[PieceType(code & TYPE_MASK)] if code & TYPE_MASK else 0 for code in range(16)]
+
+
+def env(**kwargs) -> AECEnv:
+    """AEC environment with PettingZoo's bounds and call-order checks."""
+    aec_env = raw_env(**kwargs)
+    aec_env = wrappers.AssertOutOfBoundsWrapper(aec_env)
+    return wrappers.OrderEnforcingWrapper(aec_env)
+
+
+def parallel_env(**kwargs) -> 'ArchessParallelEnv':
+    return ArchessParallelEnv(**kwargs)
+
+
+class raw_env(AECEnv):
+    """
+    Two-agent Archess.
+
+    Args:
+        render_mode: None, "human" or "rgb_array" (drawn from white's side)
+        obs_mode: Observation encoding, one of ``archess_env.OBS_MODES``
+        max_steps: Steps (both agents, illegal actions included) before truncation
+    """
+
+    metadata = {
+        "render_modes": ["human", "rgb_array"],
+        "name": "archess_v0",
+        "is_parallelizable": True,
+        "render_fps": 4,
+    }
+
+    def __init__(self, render_mode: Optional[str] = None, obs_mode: str = "planes", max_steps: int = 400):
+        super().__init__()
+        self.render_mode = render_mode
+        self.obs_mode = obs_mode
+        self.max_steps = max_steps
+        self.possible_agents = list(AGENTS)
+        self.observation_spaces = {
+            agent: spaces.Dict({
+                "observation": observation_space(obs_mode),
+                "action_mask": spaces.Box(low=0, high=1, shape=(8192,), dtype=np.int8),
+            })
+            for agent in self.possible_agents
+        }
+        self.action_spaces = {agent: spaces.Discrete(8192) for agent in self.possible_agents}
+        self.position = Position.initial()
+        self.num_steps = 0
+        self.winner = None
+        self._renderer = None
+        self.np_random, _ = seeding.np_random(None)
+
+    def observation_space(self, agent: str) -> spaces.Space:
+        return self.observation_spaces[agent]
+
+    def action_space(self, agent: str) -> spaces.Space:
+        return self.action_spaces[agent]
+
+    def reset(self, seed: Optional[int] = None, options: Optional[Dict[str, Any]] = None):
+        """Start a game; ``options={"fen": ...}`` starts from an Archess FEN."""
+        if seed is not None:
+            self.np_random, _ = seeding.np_random(seed)
+        fen = (options or {}).get("fen")
+        self.position = Position.initial() if fen is None else Position.from_fen(fen)
+        self.num_steps = 0
+        self.winner = None
+        self.agents = self.possible_agents[:]
+        self.rewards = {agent: 0.0 for agent in self.agents}
+        self._cumulative_rewards = {agent: 0.0 for agent in self.agents}
+        self.terminations = {agent: False for agent in self.agents}
+        self.truncations = {agent: False for agent in self.agents}
+        self.infos = {agent: {} for agent in self.agents}
+        self.agent_selection = AGENTS[self.position.side]
+        self._check_game_end()
+
+    def observe(self, agent: str) -> Dict[str, np.ndarray]:
+        """The board from ``agent``'s side and its action mask."""
+        color = AGENTS.index(agent)
+        view = self.position if color == WHITE else self.position.mirrored()
+        observation = encode_observations(
+            np.frombuffer(view.mailbox, dtype=np.uint8)[None], squares_mask(view.paralyzed)[None],
+            np.array([view.side]), self.obs_mode,
+        )[0]
+        return {"observation": observation, "action_mask": self.action_mask(agent)}
+
+    def action_mask(self, agent: str) -> np.ndarray:
+        """int8 mask of ``agent``'s legal actions in its own frame, zeros when it is not to move."""
+        mask = np.zeros(8192, dtype=np.int8)
+        color = AGENTS.index(agent)
+        if self.position.side == color and self.agents and not self.terminations[agent]:
+            moves = np.array(self.position.legal_moves(), dtype=np.int64)
+            mask[moves if color == WHITE else MIRROR_ACTIONS[moves]] = 1
+        return mask
+
+    def step(self, action: int):
+        agent = self.agent_selection
+        if self.terminations[agent] or self.truncations[agent]:
+            self._was_dead_step(action)
+            return
+
+        color = AGENTS.index(agent)
+        move = int(action) if color == WHITE else mirror_move(int(action))
+        self._cumulative_rewards[agent] = 0.0
+        self.rewards = {name: 0.0 for name in self.agents}
+        self.rewards[agent] = self._play(move)
+        self.num_steps += 1
+
+        if not self._check_game_end() and self.num_steps >= self.max_steps:
+            self.truncations = {name: True for name in self.agents}
+            for name in self.agents:
+                self.infos[name]["winner"] = None
+        self.agent_selection = AGENTS[self.position.side]
+        self._accumulate_rewards()
+        if self.render_mode == "human":
+            self.render()
+
+    def _play(self, move: int) -> float:
+        """Play a move for the side to move and return its reward (-0.1 if illegal)."""
+        position = self.position
+        from_sq = move >> 7
+        to_sq = (move >> 1) & 63
+        code = position.mailbox[from_sq]
+        if not code or code >> 3 != position.side or not position.targets(from_sq) >> to_sq & 1:
+            return -0.1  # The same side moves again
+
+        target = position.mailbox[to_sq]
+        if position.is_ranged_attack(from_sq, to_sq):
+            if target & TYPE_MASK == KNIGHT:
+                paralyze = self.np_random.random() < 0.5  # Coin flip
+                position.make_move(encode_move(from_sq, to_sq, 1), paralyze)
+                return 1.5 if paralyze else 0.1
+            position.make_move(encode_move(from_sq, to_sq, 1))
+        else:
+            position.make_move(encode_move(from_sq, to_sq))
+        return float(CODE_VALUES[target])
+
+    def _check_game_end(self) -> bool:
+        """Mark both agents terminated if a king fell or the side to move is stuck."""
+        position = self.position
+        if not position.king_alive(WHITE):
+            self.winner = 'black'
+            self.rewards['white'] = -CODE_VALUES[KING]
+        elif not position.king_alive(BLACK):
+            self.winner = 'white'
+            self.rewards['black'] = -CODE_VALUES[KING]
+        elif not position.has_legal_move():
+            self.winner = 'draw'
+        else:
+            return False
+        self.terminations = {agent: True for agent in self.agents}
+        for agent in self.agents:
+            self.infos[agent]["winner"] = self.winner
+        return True
+
+    def render(self):
+        if self.render_mode not in ("human", "rgb_array"):
+            return None
+        if self._renderer is None:
+            from archess_render import BoardRenderer
+            self._renderer = BoardRenderer(self.render_mode, 512, self.metadata["render_fps"])
+        return self._renderer.render(np.frombuffer(self.position.mailbox, dtype=np.uint8),
+                                     squares_mask(self.position.paralyzed))
+
+    def close(self):
+        if self._renderer is not None:
+            self._renderer.close()
+            self._renderer = None
+
+
+class ArchessParallelEnv(ParallelEnv):
+    """
+    Simultaneous-action view of ``raw_env``: both agents submit an action
+    every step and the side to move's one is played (the other agent's
+    mask is all zeros, so any action will do). Same arguments as ``raw_env``.
+    """
+
+    metadata = raw_env.metadata
+
+    def __init__(self, **kwargs):
+        self.aec_env = raw_env(**kwargs)
+        self.possible_agents = self.aec_env.possible_agents
+        self.render_mode = self.aec_env.render_mode
+        self.agents = []
+
+    def observation_space(self, agent: str) -> spaces.Space:
+        return self.aec_env.observation_space(agent)
+
+    def action_space(self, agent: str) -> spaces.Space:
+        return self.aec_env.action_space(agent)
+
+    def reset(self, seed: Optional[int] = None, options: Optional[Dict[str, Any]] = None):
+        self.aec_env.reset(seed=seed, options=options)
+        self.agents = self.aec_env.agents[:]
+        return ({agent: self.aec_env.observe(agent) for agent in self.agents},
+                {agent: dict(self.aec_env.infos[agent]) for agent in self.agents})
+
+    def step(self, actions: Dict[str, int]):
+        aec_env = self.aec_env
+        aec_env.step(actions[aec_env.agent_selection])
+        observations = {agent: aec_env.observe(agent) for agent in self.agents}
+        rewards = {agent: aec_env.rewards[agent] for agent in self.agents}
+        terminations = dict(aec_env.terminations)
+        truncations = dict(aec_env.truncations)
+        infos = {agent: dict(aec_env.infos[agent]) for agent in self.agents}
+        self.agents = [agent for agent in self.agents if not (terminations[agent] or truncations[agent])]
+        return observations, rewards, terminations, truncations, infos
+
+    def state(self) -> np.ndarray:
+        """The board from white's side (``ArchessEnv``'s observation)."""
+        return self.aec_env.observe("white")["observation"]
+
+    def render(self):
+        return self.aec_env.render()
+
+    def close(self):
+        self.aec_env.close()
@@ -0,0 +1,221 @@
+"""
+Move-choosing policies for Archess opponents and league games.
+
+A policy is a callable ``policy(position) -> move`` that plays the side to
+move of a ``Position`` and returns a move int (the env action layout), or
+-1 when there is no move. Policies that can decide many games at once also
+provide ``act(boards, paralyzed, sides) -> moves`` over the array layout of
+``ArchessVecEnv``.
+
+``ModelPolicy`` turns a Stable Baselines3 checkpoint into such a policy:
+black-to-move positions are mirrored so the model, trained as white,
+always sees its own pieces moving up the board, and illegal actions are
+masked out of its logits (or Q-values) so every checkpoint plays legal moves.
+"""
+
+import random
+from typing import Any, Optional, Tuple
+
+import numpy as np
+
+from archess_env import OBS_MODES, encode_observations, observation_space
+from archess_position import (
+    Position, WHITE, BLACK, MIRROR_CODES, MIRROR_SQUARES, mirror_move, squares_mask,
+)
+
+_MIRROR_CODES = np.array(MIRROR_CODES, dtype=np.uint8)
+_MIRROR_SQUARES = np.array(MIRROR_SQUARES, dtype=np.intp)
+MIRROR_ACTIONS = np.array([mirror_move(action) for action in range(8192)], dtype=np.int64)
+
+
+def obs_mode_for(space) -> Tuple[str, bool]:
+    """
+    Observation mode whose space matches a model's observation space, and
+    whether the model sees it channels-first (SB3 transposes uint8 image
+    observations with ``VecTransposeImage``).
+    """
+    for mode in OBS_MODES:
+        candidate = observation_space(mode)
+        if candidate.dtype != space.dtype:
+            continue
+        if candidate.shape == space.shape:
+            return mode, False
+        if (candidate.shape[2],) + candidate.shape[:2] == space.shape:
+            return mode, True
+    raise ValueError(f"No Archess observation mode matches {space}")
+
+
+def mirror_batch(boards: np.ndarray, paralyzed: np.ndarray):
+    """Color-swapped, vertically flipped copies of (B, 64) boards and paralysis masks."""
+    return _MIRROR_CODES[boards[:, _MIRROR_SQUARES]], paralyzed[:, _MIRROR_SQUARES]
+
+
+def load_model(model_path: str):
+    """Load an SB3 checkpoint, picking the algorithm from its file name."""
+    name = model_path.lower()
+    if "maskableppo" in name:
+        from sb3_contrib import MaskablePPO
+        return MaskablePPO.load(model_path)
+    from stable_baselines3 import PPO, A2C, DQN
+    if "ppo" in name:
+        return PPO.load(model_path)
+    if "a2c" in name:
+        return A2C.load(model_path)
+    if "dqn" in name:
+        return DQN.load(model_path)
+    raise ValueError("Cannot determine algorithm from model path")
+
+
+class RandomPolicy:
+    """Uniformly random legal move."""
+
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = random.Random(seed)
+
+    def __call__(self, position: Position) -> int:
+        moves = position.legal_moves()
+        return self.rng.choice(moves) if moves else -1
+
+
+class GreedyPolicy:
+    """Highest-value capture or shot, else a random move (like ``opponent="greedy"``)."""
+
+    def __init__(self, seed: Optional[int] = None):
+        from archess_env import PIECE_VALUES, PieceType
+        self.rng = random.Random(seed)
+        self._code_values = [PIECE_VALUES[PieceType(code & 7)] if code & 7 else 0 for code in range(16)]
+
+    def __call__(self, position: Position) -> int:
+        moves = position.legal_moves()
+        if not moves:
+            return -1
+        best_move = None
+        best_value = -1
+        mailbox = position.mailbox
+        for move in moves:
+            target = mailbox[(move >> 1) & 63]
+            if target and self._code_values[target] > best_value:
+                best_value = self._code_values[target]
+                best_move = move
+        return best_move if best_move is not None else self.rng.choice(moves)
+
+
+class MinimaxPolicy:
+    """Alpha-beta search move; keyword arguments go to ``SearchEngine``."""
+
+    def __init__(self, **search_options):
+        from archess_search import SearchEngine
+        self.engine = SearchEngine(**search_options)
+
+    def __call__(self, position: Position) -> int:
+        move = self.engine.search(position).move
+        return -1 if move is None else move
+
+
+class ModelPolicy:
+    """
+    Plays the side to move with a Stable Baselines3 model trained as white.
+
+    Args:
+        model: PPO, A2C, DQN or MaskablePPO model (or a path to load)
+        deterministic: Take the best legal action instead of sampling
+        seed: Seed for sampling
+    """
+
+    def __init__(self, model: Any, deterministic: bool = True, seed: Optional[int] = None):
+        if isinstance(model, str):
+            model = load_model(model)
+        self.model = model
+        self.obs_mode, self.channels_first = obs_mode_for(model.observation_space)
+        self.deterministic = deterministic
+        self.np_random = np.random.default_rng(seed)
+        model.policy.set_training_mode(False)
+
+    def _forward(self, observations: np.ndarray, with_values: bool = False):
+        """(B, 8192) action logits (Q-values for DQN), and state values if asked."""
+        import torch
+
+        policy = self.model.policy
+        if self.channels_first:
+            observations = np.ascontiguousarray(observations.transpose(0, 3, 1, 2))
+        obs_tensor, _ = policy.obs_to_tensor(observations)
+        values = None
+        with torch.no_grad():
+            if hasattr(policy, "q_net"):
+                scores = policy.q_net(obs_tensor)
+            else:
+                scores = policy.get_distribution(obs_tensor).distribution.logits
+                if with_values:
+                    values = policy.predict_values(obs_tensor).reshape(-1).cpu().numpy().astype(np.float64)
+        return scores.cpu().numpy().astype(np.float64), values
+
+    def _masked_scores(self, boards: np.ndarray, paralyzed: np.ndarray, sides: np.ndarray,
+                       with_values: bool = False):
+        """Scores with illegal actions at -inf, on boards mirrored to white's side."""
+        from archess_vec_env import batch_action_masks, batch_destinations
+
+        boards = np.asarray(boards, dtype=np.uint8)
+        paralyzed = np.asarray(paralyzed, dtype=bool)
+        black = np.asarray(sides) == BLACK
+        if black.any():
+            boards = boards.copy()
+            paralyzed = paralyzed.copy()
+            boards[black], paralyzed[black] = mirror_batch(boards[black], paralyzed[black])
+
+        whites = np.full(len(boards), WHITE, dtype=np.int8)
+        masks = batch_action_masks(boards, batch_destinations(boards, paralyzed, whites))
+        scores, values = self._forward(encode_observations(boards, paralyzed, whites, self.obs_mode),
+                                       with_values)
+        return black, masks, scores, values
+
+    def act(self, boards: np.ndarray, paralyzed: np.ndarray, sides: np.ndarray) -> np.ndarray:
+        """One move per board for its side to move, in a single forward pass (-1 if none)."""
+        black, masks, scores, _ = self._masked_scores(boards, paralyzed, sides)
+        if not self.deterministic:
+            scores += self.np_random.gumbel(size=scores.shape)  # Samples from softmax(logits)
+        scores[~masks] = -np.inf
+
+        actions = scores.argmax(axis=1)
+        actions[~masks.any(axis=1)] = -1
+        flip = black & (actions >= 0)
+        actions[flip] = MIRROR_ACTIONS[actions[flip]]
+        return actions
+
+    def evaluate(self, boards: np.ndarray, paralyzed: np.ndarray, sides: np.ndarray):
+        """
+        Move probabilities and state values for the side to move, in one forward pass.
+
+        Returns (B, 8192) probabilities over legal actions (softmax of the
+        masked logits or Q-values) and (B,) values: the critic's estimate,
+        or the best legal Q-value for DQN.
+        """
+        black, masks, scores, values = self._masked_scores(boards, paralyzed, sides, with_values=True)
+        scores[~masks] = -np.inf
+        best = scores.max(axis=1)
+        if values is None:
+            values = np.where(np.isfinite(best), best, 0.0)
+        best[~np.isfinite(best)] = 0.0
+        probabilities = np.exp(scores - best[:, None])
+        totals = probabilities.sum(axis=1)
+        probabilities /= np.where(totals > 0, totals, 1.0)[:, None]
+        probabilities[black] = probabilities[black][:, MIRROR_ACTIONS]
+        return probabilities, values
+
+    def __call__(self, position: Position) -> int:
+        codes = np.frombuffer(position.mailbox, dtype=np.uint8)[None]
+        return int(self.act(codes, squares_mask(position.paralyzed)[None], np.array([position.side]))[0])
+
+
+def make_policy(spec: Any, seed: Optional[int] = None, search_options: Optional[dict] = None):
+    """Policy for "random", "greedy", "minimax", a checkpoint path or an SB3 model."""
+    if spec == "random":
+        return RandomPolicy(seed)
+    if spec == "greedy":
+        return GreedyPolicy(seed)
+    if spec == "minimax":
+        return MinimaxPolicy(**(search_options or {}))
+    if isinstance(spec, str) or hasattr(spec, "policy"):
+        return ModelPolicy(spec, seed=seed)
+    if callable(spec):
+        return spec
+    raise ValueError(f"Cannot build an Archess policy from {spec!r}")
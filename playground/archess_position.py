@@ -0,0 +1,662 @@
+"""
+Bitboard position core for the Archess environment.
+
+Every piece type and color is stored as a 64-bit occupancy bitboard (a plain
+Python int where bit ``row * 8 + col`` marks a square), next to a byte
+mailbox for constant-time square lookups. Per-square destination tables
+for knights, kings, archer steps, color-dependent archer shots, pawns and
+the eight slider rays are built once at import (or read from the ``.npy``
+file named by ``ARCHESS_MOVE_TABLES``) and shared with the vectorized
+environment; rooks, bishops and queens walk their rays up to the first
+blocker.
+
+Moves are plain ints using the same layout as ``ArchessEnv`` actions::
+
+    move = (from_square << 7) | (to_square << 1) | is_ranged_attack
+"""
+
+import os
+import random
+import numpy as np
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+# Colors
+WHITE = 0
+BLACK = 1
+
+# Piece types (values match archess_env.PieceType)
+EMPTY = 0
+PAWN = 1
+KNIGHT = 2
+BISHOP = 3
+ROOK = 4
+QUEEN = 5
+KING = 6
+ARCHER = 7
+
+# A piece code is ``piece_type | (color << 3)``: 1-7 white, 9-15 black
+BLACK_FLAG = 8
+TYPE_MASK = 7
+
+CODE_TO_CHAR = ['', 'P', 'N', 'B', 'R', 'Q', 'K', 'A',
+                '', 'p', 'n', 'b', 'r', 'q', 'k', 'a']
+CHAR_TO_CODE = {char: code for code, char in enumerate(CODE_TO_CHAR) if char}
+
+STARTING_ROWS = (
+    'rnbqkbnr',
+    'pappppap',
+    '........',
+    '........',
+    '........',
+    '........',
+    'PAPPPPAP',
+    'RNBQKBNR',
+)
+
+# Archess FEN: ranks from black's back rank (row 0) down, separated by '/',
+# digits for runs of empty squares and 'A'/'a' for archers. A '*' after a
+# knight marks it paralyzed. The second field is the side to move ('w'/'b').
+STARTING_FEN = 'rnbqkbnr/pappppap/8/8/8/8/PAPPPPAP/RNBQKBNR w'
+
+def square(row: int, col: int) -> int:
+    """Square index for a (row, col) pair, row 0 being black's back rank."""
+    return row * 8 + col
+
+
+def square_to_coords(sq: int) -> Tuple[int, int]:
+    """(row, col) pair for a square index."""
+    return sq >> 3, sq & 7
+
+
+def encode_move(from_sq: int, to_sq: int, ranged: int = 0) -> int:
+    """Encode a move as an ``ArchessEnv`` action integer."""
+    return (from_sq << 7) | (to_sq << 1) | ranged
+
+
+def decode_move(move: int) -> Tuple[int, int, int]:
+    """Decode a move into (from_square, to_square, is_ranged_attack)."""
+    return move >> 7, (move >> 1) & 63, move & 1
+
+
+# Flipping the board top to bottom and swapping colors turns a black-to-move
+# position into the equivalent white-to-move one (both maps are involutions)
+MIRROR_SQUARES = tuple((7 - (sq >> 3)) * 8 + (sq & 7) for sq in range(64))
+MIRROR_CODES = tuple(code ^ BLACK_FLAG if code & TYPE_MASK else code for code in range(16))
+
+
+def mirror_move(move: int) -> int:
+    """The same move seen from the other side of the board."""
+    return (MIRROR_SQUARES[move >> 7] << 7) | (MIRROR_SQUARES[(move >> 1) & 63] << 1) | (move & 1)
+
+
+def parse_fen(fen: str) -> Tuple[bytearray, int, int]:
+    """Parse an Archess FEN into (64 piece codes, paralyzed bitboard, side to move)."""
+    fields = fen.split()
+    if not 1 <= len(fields) <= 2:
+        raise ValueError(f"Invalid Archess FEN: {fen!r}")
+    codes = bytearray(64)
+    paralyzed = 0
+    sq = 0
+    row_end = 8
+    for char in fields[0]:
+        if char == '/':
+            if sq != row_end:
+                raise ValueError(f"Rank {9 - row_end // 8} of {fen!r} does not have 8 squares")
+            row_end += 8
+        elif char == '*':
+            if not sq or codes[sq - 1] & TYPE_MASK != KNIGHT:
+                raise ValueError(f"Paralysis marker not after a knight in {fen!r}")
+            paralyzed |= 1 << (sq - 1)
+        elif char.isdigit():
+            sq += int(char)
+        else:
+            code = CHAR_TO_CODE.get(char)
+            if code is None or sq >= row_end:
+                raise ValueError(f"Unexpected {char!r} in Archess FEN {fen!r}")
+            codes[sq] = code
+            sq += 1
+        if sq > row_end:
+            raise ValueError(f"Rank {9 - row_end // 8} of {fen!r} has more than 8 squares")
+    if sq != 64 or row_end != 64:
+        raise ValueError(f"Archess FEN {fen!r} does not describe 8 ranks of 8 squares")
+
+    side = WHITE
+    if len(fields) == 2:
+        if fields[1] not in ('w', 'b'):
+            raise ValueError(f"Side to move must be 'w' or 'b' in {fen!r}")
+        side = BLACK if fields[1] == 'b' else WHITE
+    return codes, paralyzed, side
+
+
+def iter_squares(bb: int):
+    """Yield the set squares of a bitboard, lowest first."""
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+KNIGHT_DELTAS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                 (1, -2), (1, 2), (2, -1), (2, 1))
+KING_DELTAS = ((-1, -1), (-1, 0), (-1, 1),
+               (0, -1), (0, 1),
+               (1, -1), (1, 0), (1, 1))
+
+# Pawns and archer shots move towards row 0 for white and row 7 for black
+FORWARD = (-1, 1)
+PAWN_START_ROW = (6, 1)
+
+# Archers can shoot pawns, bishops, kings, knights and archers
+ARCHER_TARGET_TYPES = (PAWN, BISHOP, KING, KNIGHT, ARCHER)
+
+# Ray directions; positive ones walk towards higher square indices, so their
+# nearest blocker is the lowest set bit, negative ones the highest.
+ROOK_DIRECTIONS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+BISHOP_DIRECTIONS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+RAY_POSITIVE = tuple(dr * 8 + dc > 0 for dr, dc in DIRECTIONS)
+
+# Rows of MOVE_TABLES; per-color tables are listed white first
+TABLE_NAMES = (
+    ('knight', 'king', 'archer_step')
+    + tuple(f'{name}_{color}' for name in ('archer_shot', 'pawn_push', 'pawn_double', 'pawn_capture')
+            for color in ('white', 'black'))
+    + tuple(f'ray_{d}' for d in range(len(DIRECTIONS)))
+)
+TABLE_INDEX = {name: i for i, name in enumerate(TABLE_NAMES)}
+
+
+def squares_mask(bb: int) -> np.ndarray:
+    """(64,) bool array with the set squares of a bitboard."""
+    bits = np.frombuffer(bb.to_bytes(8, 'little'), dtype=np.uint8)
+    return np.unpackbits(bits, bitorder='little').view(bool)
+
+
+def _build_step_table(deltas: Sequence[Tuple[int, int]]) -> List[int]:
+    """Bitboard of single-step destinations for every square."""
+    table = []
+    for sq in range(64):
+        row, col = square_to_coords(sq)
+        bb = 0
+        for dr, dc in deltas:
+            r, c = row + dr, col + dc
+            if 0 <= r < 8 and 0 <= c < 8:
+                bb |= 1 << square(r, c)
+        table.append(bb)
+    return table
+
+
+def _build_rays(dr: int, dc: int) -> List[int]:
+    """Bitboard of the full ray in one direction for every square."""
+    rays = []
+    for sq in range(64):
+        row, col = square_to_coords(sq)
+        bb = 0
+        r, c = row + dr, col + dc
+        while 0 <= r < 8 and 0 <= c < 8:
+            bb |= 1 << square(r, c)
+            r, c = r + dr, c + dc
+        rays.append(bb)
+    return rays
+
+
+def build_move_tables() -> np.ndarray:
+    """(len(TABLE_NAMES), 64) uint64 destination bitboards per table and square."""
+    tables = [_build_step_table(KNIGHT_DELTAS), _build_step_table(KING_DELTAS),
+              _build_step_table(KING_DELTAS)]
+    for deltas in (lambda d: ((d, 0), (2 * d, 0)),  # Archer shots
+                   lambda d: ((d, 0),),  # Pawn pushes
+                   lambda d: ((2 * d, 0),),  # Pawn double pushes
+                   lambda d: ((d, -1), (d, 1))):  # Pawn captures
+        tables.extend(_build_step_table(deltas(d)) for d in FORWARD)
+    # Double pushes only exist from the start row
+    for color in (WHITE, BLACK):
+        table = tables[TABLE_INDEX['pawn_double_white'] + color]
+        for sq in range(64):
+            if sq >> 3 != PAWN_START_ROW[color]:
+                table[sq] = 0
+    tables.extend(_build_rays(dr, dc) for dr, dc in DIRECTIONS)
+    return np.array(tables, dtype=np.uint64)
+
+
+def load_move_tables(cache_path: Optional[str] = None) -> np.ndarray:
+    """
+    Move tables from a cached ``.npy`` file, building (and caching) them if needed.
+
+    Without a path the tables are simply built. A cache file with the wrong
+    shape is rebuilt; delete it after changing the table layout.
+    """
+    if cache_path is None:
+        return build_move_tables()
+    try:
+        tables = np.load(cache_path)
+        if tables.shape == (len(TABLE_NAMES), 64) and tables.dtype == np.uint64:
+            return tables
+    except (OSError, ValueError):
+        pass
+    tables = build_move_tables()
+    try:
+        np.save(cache_path, tables)
+    except OSError:
+        pass  # Read-only location: keep the freshly built tables
+    return tables
+
+
+# Built once per process, or read from the file named by ARCHESS_MOVE_TABLES
+MOVE_TABLES = load_move_tables(os.environ.get('ARCHESS_MOVE_TABLES'))
+
+
+def _table(name: str) -> List[int]:
+    """One table as a list of Python int bitboards, indexed by square."""
+    return MOVE_TABLES[TABLE_INDEX[name]].tolist()
+
+
+KNIGHT_ATTACKS = _table('knight')
+KING_ATTACKS = _table('king')
+ARCHER_STEPS = _table('archer_step')
+ARCHER_SHOTS = [_table('archer_shot_white'), _table('archer_shot_black')]
+PAWN_PUSHES = [_table('pawn_push_white'), _table('pawn_push_black')]
+PAWN_DOUBLES = [_table('pawn_double_white'), _table('pawn_double_black')]
+PAWN_CAPTURES = [_table('pawn_capture_white'), _table('pawn_capture_black')]
+RAYS = [_table(f'ray_{d}') for d in range(len(DIRECTIONS))]
+ROOK_RAY_INDICES = (0, 1, 2, 3)
+BISHOP_RAY_INDICES = (4, 5, 6, 7)
+QUEEN_RAY_INDICES = ROOK_RAY_INDICES + BISHOP_RAY_INDICES
+
+# Zobrist keys: one per piece code (archers included) on every square, one
+# per paralyzed knight square and one for black to move. The fixed seed keeps
+# keys stable between runs and processes.
+_zobrist_rng = random.Random(0x41524348)
+ZOBRIST_PIECES = [[_zobrist_rng.getrandbits(64) if code & TYPE_MASK else 0 for _ in range(64)]
+                  for code in range(16)]
+ZOBRIST_PARALYZED = [_zobrist_rng.getrandbits(64) for _ in range(64)]
+ZOBRIST_SIDE = _zobrist_rng.getrandbits(64)
+
+
+def paralysis_key(bb: int) -> int:
+    """Zobrist contribution of a bitboard of paralyzed knights."""
+    key = 0
+    for sq in iter_squares(bb):
+        key ^= ZOBRIST_PARALYZED[sq]
+    return key
+
+
+def slider_attacks(sq: int, occupied: int, ray_indices: Iterable[int]) -> int:
+    """Squares reached along the given rays, including the first blocker."""
+    attacks = 0
+    for d in ray_indices:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            if RAY_POSITIVE[d]:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= RAYS[d][first]
+        attacks |= ray
+    return attacks
+
+
+class Position:
+    """
+    Archess position stored as bitboards.
+
+    Attributes:
+        pieces: Bitboard per piece code (16 entries, index 0 and 8 unused)
+        occupancy: Bitboard of all pieces per color
+        mailbox: Piece code per square
+        paralyzed: Bitboard of knights disabled by an archer shot
+        side: Color to move
+        key: Zobrist hash, updated incrementally by every board change
+        counts: Number of pieces per color
+        stack: Undo records of the moves played with ``push``
+    """
+
+    __slots__ = ('pieces', 'occupancy', 'mailbox', 'paralyzed', 'side', 'key', 'counts',
+                 'stack', '_movers', '_view')
+
+    def __init__(self):
+        self.pieces = [0] * 16
+        self.occupancy = [0, 0]
+        self.mailbox = bytearray(64)
+        self.paralyzed = 0
+        self.side = WHITE
+        self.key = 0
+        self.counts = [0, 0]
+        self.stack = []
+        self._movers = [0, 0]  # Last square found with a move, per color
+        self._view = None
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Iterable[str]], side: int = WHITE,
+                  paralyzed: Iterable[Tuple[int, int]] = ()) -> 'Position':
+        """Build a position from 8 rows of piece letters ('' or '.' for empty)."""
+        position = cls()
+        for row, pieces in enumerate(rows):
+            for col, char in enumerate(pieces):
+                if char and char != '.':
+                    position.put(square(row, col), CHAR_TO_CODE[char])
+        if side != WHITE:
+            position.side = side
+            position.key ^= ZOBRIST_SIDE
+        for row, col in paralyzed:
+            position.paralyzed |= 1 << square(row, col)
+        position.key ^= paralysis_key(position.paralyzed)
+        return position
+
+    @classmethod
+    def from_fen(cls, fen: str) -> 'Position':
+        """Build a position from an Archess FEN (see ``STARTING_FEN``)."""
+        return cls.from_codes(*parse_fen(fen))
+
+    @classmethod
+    def from_codes(cls, codes: Sequence[int], paralyzed: int = 0, side: int = WHITE) -> 'Position':
+        """Build a position from 64 piece codes, a paralysis bitboard and the side to move."""
+        position = cls()
+        for sq, code in enumerate(bytes(codes)):
+            if code:
+                position.put(sq, code)
+        position.paralyzed = int(paralyzed)
+        position.key ^= paralysis_key(position.paralyzed)
+        if side != WHITE:
+            position.side = int(side)
+            position.key ^= ZOBRIST_SIDE
+        return position
+
+    def mirrored(self) -> 'Position':
+        """Color-swapped, vertically flipped copy (without the undo stack)."""
+        codes = bytearray(64)
+        paralyzed = 0
+        for sq in iter_squares(self.occupancy[0] | self.occupancy[1]):
+            codes[MIRROR_SQUARES[sq]] = MIRROR_CODES[self.mailbox[sq]]
+            if self.paralyzed >> sq & 1:
+                paralyzed |= 1 << MIRROR_SQUARES[sq]
+        return Position.from_codes(codes, paralyzed, self.side ^ 1)
+
+    def fen(self) -> str:
+        """Archess FEN of this position."""
+        ranks = []
+        for row in range(8):
+            rank = ''
+            empty = 0
+            for sq in range(row * 8, row * 8 + 8):
+                code = self.mailbox[sq]
+                if not code:
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += CODE_TO_CHAR[code]
+                if self.paralyzed >> sq & 1:
+                    rank += '*'
+            ranks.append(rank + str(empty) if empty else rank)
+        return '/'.join(ranks) + (' b' if self.side == BLACK else ' w')
+
+    @classmethod
+    def initial(cls) -> 'Position':
+        """The Archess starting position."""
+        return cls.from_rows(STARTING_ROWS)
+
+    def copy(self) -> 'Position':
+        """Return an independent copy of this position."""
+        position = Position.__new__(Position)
+        position.pieces = self.pieces[:]
+        position.occupancy = self.occupancy[:]
+        position.mailbox = bytearray(self.mailbox)
+        position.paralyzed = self.paralyzed
+        position.side = self.side
+        position.key = self.key
+        position.counts = self.counts[:]
+        position.stack = self.stack[:]
+        position._movers = self._movers[:]
+        position._view = None
+        return position
+
+    def compute_key(self) -> int:
+        """Zobrist hash recomputed from scratch (``key`` is kept incrementally)."""
+        key = ZOBRIST_SIDE if self.side else 0
+        for sq, code in enumerate(self.mailbox):
+            key ^= ZOBRIST_PIECES[code][sq]
+        return key ^ paralysis_key(self.paralyzed)
+
+    def put(self, sq: int, code: int):
+        """Place a piece on an empty square."""
+        bit = 1 << sq
+        self.pieces[code] |= bit
+        self.occupancy[code >> 3] |= bit
+        self.mailbox[sq] = code
+        self.counts[code >> 3] += 1
+        self.key ^= ZOBRIST_PIECES[code][sq]
+        self._view = None
+
+    def remove(self, sq: int) -> int:
+        """Remove and return the piece on a square (0 if it was empty)."""
+        code = self.mailbox[sq]
+        if code:
+            mask = ~(1 << sq)
+            self.pieces[code] &= mask
+            self.occupancy[code >> 3] &= mask
+            self.counts[code >> 3] -= 1
+            self.key ^= ZOBRIST_PIECES[code][sq]
+            if self.paralyzed >> sq & 1:
+                self.paralyzed &= mask
+                self.key ^= ZOBRIST_PARALYZED[sq]
+            self.mailbox[sq] = EMPTY
+            self._view = None
+        return code
+
+    def targets(self, sq: int) -> int:
+        """Bitboard of destinations (moves and archer shots) for the piece on a square."""
+        code = self.mailbox[sq]
+        if not code:
+            return 0
+        color = code >> 3
+        piece = code & TYPE_MASK
+        own = self.occupancy[color]
+        enemy = self.occupancy[color ^ 1]
+
+        if piece == PAWN:
+            occupied = own | enemy
+            moves = PAWN_PUSHES[color][sq] & ~occupied
+            if moves:
+                moves |= PAWN_DOUBLES[color][sq] & ~occupied
+            return moves | (PAWN_CAPTURES[color][sq] & enemy)
+        if piece == KNIGHT:
+            if self.paralyzed >> sq & 1:
+                return 0
+            return KNIGHT_ATTACKS[sq] & ~own
+        if piece == BISHOP:
+            return slider_attacks(sq, own | enemy, BISHOP_RAY_INDICES) & ~own
+        if piece == ROOK:
+            return slider_attacks(sq, own | enemy, ROOK_RAY_INDICES) & ~own
+        if piece == QUEEN:
+            return slider_attacks(sq, own | enemy, QUEEN_RAY_INDICES) & ~own
+        if piece == KING:
+            return KING_ATTACKS[sq] & ~own
+        # Archer: step to empty neighbours, shoot 1-2 squares forward
+        return (ARCHER_STEPS[sq] & ~(own | enemy)) | self.archer_shots(sq)
+
+    def archer_shots(self, sq: int) -> int:
+        """Bitboard of squares the archer on ``sq`` can shoot at."""
+        code = self.mailbox[sq]
+        enemy_flag = BLACK_FLAG ^ (code & BLACK_FLAG)
+        shootable = 0
+        for piece in ARCHER_TARGET_TYPES:
+            shootable |= self.pieces[piece | enemy_flag]
+        return ARCHER_SHOTS[code >> 3][sq] & shootable
+
+    def is_ranged_attack(self, from_sq: int, to_sq: int) -> bool:
+        """Whether moving from ``from_sq`` to ``to_sq`` is an archer shot."""
+        return (self.mailbox[from_sq] & TYPE_MASK == ARCHER
+                and self.mailbox[to_sq] != EMPTY)
+
+    def legal_moves(self, color: Optional[int] = None) -> List[int]:
+        """All moves for a color (default: side to move), by ascending from-square."""
+        if color is None:
+            color = self.side
+        occupied = self.occupancy[0] | self.occupancy[1]
+        mailbox = self.mailbox
+        moves = []
+        for from_sq in iter_squares(self.occupancy[color]):
+            base = from_sq << 7
+            ranged = mailbox[from_sq] & TYPE_MASK == ARCHER
+            for to_sq in iter_squares(self.targets(from_sq)):
+                shot = 1 if ranged and occupied >> to_sq & 1 else 0
+                moves.append(base | (to_sq << 1) | shot)
+        return moves
+
+    def has_legal_move(self, color: Optional[int] = None) -> bool:
+        """
+        Whether a color (default: side to move) has at least one move.
+
+        The piece that last proved the color could move almost always still
+        can, so only its destinations are checked; the color's other pieces
+        are scanned only once that piece is gone or blocked.
+        """
+        if color is None:
+            color = self.side
+        if not self.counts[color]:
+            return False
+        sq = self._movers[color]
+        code = self.mailbox[sq]
+        if code and code >> 3 == color and self.targets(sq):
+            return True
+        for from_sq in iter_squares(self.occupancy[color]):
+            if self.targets(from_sq):
+                self._movers[color] = from_sq
+                return True
+        return False
+
+    def king_alive(self, color: int) -> bool:
+        """Whether the king of a color is still on the board."""
+        return self.pieces[KING | (color << 3)] != 0
+
+    def king_square(self, color: int) -> Optional[int]:
+        """Square of a color's king, or None once it has been captured."""
+        bb = self.pieces[KING | (color << 3)]
+        return bb.bit_length() - 1 if bb else None
+
+    def make_move(self, move: int, paralyze: bool = False) -> Tuple[int, int, int]:
+        """
+        Play a move for the side to move without validating it.
+
+        Archer shots stay on their square: a shot knight is paralyzed when
+        ``paralyze`` is set (the caller's coin flip), any other target is
+        removed. The side to move is switched afterwards.
+
+        Returns the undo record ``(move, captured_code, paralysis_delta)``
+        where ``paralysis_delta`` holds the paralysis bits the move toggled.
+        """
+        from_sq = move >> 7
+        to_sq = (move >> 1) & 63
+        mailbox = self.mailbox
+        code = mailbox[from_sq]
+        target = mailbox[to_sq]
+        paralyzed = self.paralyzed
+
+        if code & TYPE_MASK == ARCHER and target:
+            if target & TYPE_MASK == KNIGHT:
+                if paralyze and not self.paralyzed >> to_sq & 1:
+                    self.paralyzed |= 1 << to_sq
+                    self.key ^= ZOBRIST_PARALYZED[to_sq]
+                target = EMPTY  # Nothing was captured
+            else:
+                self.remove(to_sq)
+        else:
+            if target:
+                self.remove(to_sq)
+            self.remove(from_sq)
+            self.put(to_sq, code)
+
+        self.side ^= 1
+        self.key ^= ZOBRIST_SIDE
+        return move, target, paralyzed ^ self.paralyzed
+
+    def unmake_move(self, record: Tuple[int, int, int]):
+        """Take back a move using the record returned by ``make_move``."""
+        move, captured, paralysis_delta = record
+        from_sq = move >> 7
+        to_sq = (move >> 1) & 63
+
+        self.side ^= 1
+        self.key ^= ZOBRIST_SIDE
+        # An archer shot leaves the shooter on its square
+        if not self.mailbox[from_sq]:
+            self.put(from_sq, self.remove(to_sq))
+        if captured:
+            self.put(to_sq, captured)
+        if paralysis_delta:
+            self.paralyzed ^= paralysis_delta
+            self.key ^= paralysis_key(paralysis_delta)
+
+    def push(self, move: int, paralyze: bool = False):
+        """Play a move and remember how to take it back with ``pop``."""
+        self.stack.append(self.make_move(move, paralyze))
+
+    def pop(self) -> int:
+        """Take back the last pushed move and return it."""
+        record = self.stack.pop()
+        self.unmake_move(record)
+        return record[0]
+
+    def to_bytes(self) -> bytes:
+        """
+        Compact binary encoding: at most 25 bytes for any Archess game.
+
+        Layout: one byte for the side to move, the 64-bit occupancy
+        (little-endian), then one 4-bit piece code per occupied square in
+        ascending square order, two per byte, low nibble first. Codes 0 and
+        8 never mark a piece, so they stand for paralyzed white and black
+        knights.
+        """
+        mailbox = self.mailbox
+        paralyzed = self.paralyzed
+        occupied = self.occupancy[0] | self.occupancy[1]
+        nibbles = [mailbox[sq] & BLACK_FLAG if paralyzed >> sq & 1 else mailbox[sq]
+                   for sq in iter_squares(occupied)]
+        if len(nibbles) & 1:
+            nibbles.append(0)
+        packed = bytes(nibbles[i] | (nibbles[i + 1] << 4) for i in range(0, len(nibbles), 2))
+        return bytes((self.side,)) + occupied.to_bytes(8, 'little') + packed
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Position':
+        """Rebuild a position from ``to_bytes`` output (without the undo stack)."""
+        if len(data) < 9 or data[0] > BLACK:
+            raise ValueError("Not an Archess position encoding")
+        occupied = int.from_bytes(data[1:9], 'little')
+        count = bin(occupied).count('1')
+        if len(data) != 9 + (count + 1) // 2:
+            raise ValueError(f"Expected {9 + (count + 1) // 2} bytes for {count} pieces, got {len(data)}")
+
+        position = cls()
+        paralyzed = 0
+        for i, sq in enumerate(iter_squares(occupied)):
+            byte = data[9 + (i >> 1)]
+            code = byte >> 4 if i & 1 else byte & 15
+            if not code & TYPE_MASK:
+                code |= KNIGHT
+                paralyzed |= 1 << sq
+            position.put(sq, code)
+        position.paralyzed = paralyzed
+        position.key ^= paralysis_key(paralyzed)
+        if data[0] != WHITE:
+            position.side = data[0]
+            position.key ^= ZOBRIST_SIDE
+        return position
+
+    def to_array(self) -> np.ndarray:
+        """8x8 int8 array of piece codes (a view over the mailbox)."""
+        return np.frombuffer(self.mailbox, dtype=np.int8).reshape(8, 8)
+
+    def board_view(self) -> np.ndarray:
+        """8x8 array of piece letters ('' for empty), cached until the next change."""
+        if self._view is None:
+            view = _CHAR_TABLE[np.frombuffer(self.mailbox, dtype=np.uint8)].reshape(8, 8)
+            view.flags.writeable = False
+            self._view = view
+        return self._view
+
+
+_CHAR_TABLE = np.array(CODE_TO_CHAR)
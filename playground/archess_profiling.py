@@ -0,0 +1,196 @@
+"""
+Opt-in profiling for the Archess environments.
+
+``PhaseTimer`` times named phases by wrapping attributes of an instance or
+module; ``EnvProfiler`` uses it to instrument one ``ArchessEnv`` with call
+counts and cumulative nanoseconds for its hot methods, plus counters for
+invalid-action penalties and archer shots:
+
+    env = ArchessEnv(profile="counters")   # or env.enable_profiling()
+    ...
+    env.stats()  # {'steps': ..., 'invalid_actions': ..., 'archer_shots': ..., 'methods': {...}}
+
+Only the profiled env instance is touched: its methods are shadowed by
+timed instance attributes, and ``disable_profiling()`` deletes them again,
+so an env that never enabled profiling runs exactly the original code.
+
+``profile="sample"`` additionally runs one step in ``sample_every`` under
+``cProfile``; ``env.dump_profile(path)`` writes the aggregate for snakeviz
+or ``python -m pstats``. For a sampling profiler such as py-spy, leave
+profiling off: the env's own functions then show up unwrapped in the stacks.
+"""
+
+import cProfile
+import pstats
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+PROFILE_MODES = ("counters", "sample")
+PROFILED_METHODS = (
+    '_get_possible_moves',
+    '_is_valid_move',
+    '_check_game_end',
+    '_opponent_move',
+    '_get_observation',
+    'step',
+)
+
+
+class PhaseTimer:
+    """
+    Wall time per phase, collected by wrapping methods.
+
+    ``wrap(owner, name, phase)`` replaces an attribute of an instance or
+    module with a timed version until ``restore()``; ``phase(name)`` times
+    a block inline. ``total_ns`` is the cumulative time of each phase,
+    ``ns`` its exclusive time: a nested phase is charged to itself only.
+    """
+
+    def __init__(self):
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.ns: Dict[str, int] = defaultdict(int)
+        self.total_ns: Dict[str, int] = defaultdict(int)
+        self._stack: List[List[int]] = []  # [start, nested time] of each open phase
+        self._patches = []
+
+    def phase(self, name: str) -> '_Phase':
+        """Reusable context manager charging its block to ``name``."""
+        return _Phase(self, name)
+
+    def wrap(self, owner, attr: str, phase: str):
+        original = getattr(owner, attr)
+        block = self.phase(phase)
+
+        def timed(*args, **kwargs):
+            with block:
+                return original(*args, **kwargs)
+
+        self.patch(owner, attr, timed)
+
+    def patch(self, owner, attr: str, replacement: Callable):
+        """Replace an attribute until ``restore()``."""
+        self._patches.append((owner, attr, getattr(owner, attr), attr in vars(owner)))
+        setattr(owner, attr, replacement)
+
+    def restore(self):
+        """Put every wrapped attribute back."""
+        for owner, attr, original, owned in reversed(self._patches):
+            if owned:
+                setattr(owner, attr, original)
+            else:
+                delattr(owner, attr)  # Instance attribute shadowing a method
+        self._patches.clear()
+
+    def clear(self):
+        """Zero every phase's counters."""
+        self.calls.clear()
+        self.ns.clear()
+        self.total_ns.clear()
+
+    def report(self, total_ns: int) -> Dict[str, dict]:
+        """Phase -> calls, exclusive seconds and share of ``total_ns``, plus ``other``."""
+        phases = {name: {'calls': self.calls[name], 'seconds': ns / 1e9, 'share': ns / max(total_ns, 1)}
+                  for name, ns in sorted(self.ns.items(), key=lambda item: -item[1])}
+        other = max(total_ns - sum(self.ns.values()), 0)
+        phases['other'] = {'calls': 0, 'seconds': other / 1e9, 'share': other / max(total_ns, 1)}
+        return phases
+
+
+class _Phase:
+    """Timed block of a ``PhaseTimer``; state lives on the timer's stack, so it nests and re-enters."""
+
+    def __init__(self, timer: PhaseTimer, name: str):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.timer._stack.append([time.perf_counter_ns(), 0])
+
+    def __exit__(self, *exc_info):
+        timer = self.timer
+        start, nested = timer._stack.pop()
+        elapsed = time.perf_counter_ns() - start
+        timer.ns[self.name] += elapsed - nested
+        timer.total_ns[self.name] += elapsed
+        timer.calls[self.name] += 1
+        if timer._stack:
+            timer._stack[-1][1] += elapsed
+
+
+class EnvProfiler:
+    """
+    Instrumentation of one ``ArchessEnv``, normally managed through
+    ``env.enable_profiling()`` / ``env.stats()``.
+
+    Args:
+        env: Environment to instrument
+        mode: "counters", or "sample" to also cProfile every ``sample_every``-th step
+        sample_every: Steps between cProfile samples
+    """
+
+    def __init__(self, env, mode: str = "counters", sample_every: int = 100):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.mode = mode
+        self.sample_every = max(1, sample_every)
+        self.profile = cProfile.Profile() if mode == "sample" else None
+        self.timer = PhaseTimer()
+        self.invalid_actions = 0
+        self.archer_shots = 0
+
+        for attr in PROFILED_METHODS:
+            self.timer.wrap(env, attr, attr.lstrip('_'))
+
+        is_valid_move = env._is_valid_move
+        handle_archer_attack = env._handle_archer_attack
+        step = env.step
+
+        def counted_is_valid_move(*args):
+            valid = is_valid_move(*args)
+            if not valid:
+                self.invalid_actions += 1  # Only the agent's moves are validated
+            return valid
+
+        def counted_handle_archer_attack(*args):
+            self.archer_shots += 1
+            return handle_archer_attack(*args)
+
+        def sampled_step(action):
+            if self.timer.calls['step'] % self.sample_every == self.sample_every - 1:
+                self.profile.enable()
+                try:
+                    return step(action)
+                finally:
+                    self.profile.disable()
+            return step(action)
+
+        self.timer.patch(env, '_is_valid_move', counted_is_valid_move)
+        self.timer.patch(env, '_handle_archer_attack', counted_handle_archer_attack)
+        if self.profile is not None:
+            self.timer.patch(env, 'step', sampled_step)
+
+    def stats(self, reset: bool = False) -> Dict[str, Any]:
+        """Counters since the last reset; ``methods`` maps names to calls and cumulative ns."""
+        calls, total_ns = self.timer.calls, self.timer.total_ns
+        stats = {
+            'steps': calls['step'],
+            'invalid_actions': self.invalid_actions,
+            'archer_shots': self.archer_shots,
+            'methods': {attr: {'calls': calls[attr.lstrip('_')], 'ns': total_ns[attr.lstrip('_')]}
+                        for attr in PROFILED_METHODS},
+        }
+        if reset:
+            self.timer.clear()
+            self.invalid_actions = 0
+            self.archer_shots = 0
+        return stats
+
+    def profile_stats(self) -> Optional[pstats.Stats]:
+        """Aggregate of the sampled steps, None outside sample mode or before the first sample."""
+        if self.profile is None or not self.profile.getstats():
+            return None
+        return pstats.Stats(self.profile)
+
+    def restore(self):
+        self.timer.restore()
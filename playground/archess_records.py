@@ -0,0 +1,285 @@
+"""
+Archess game records and an on-disk game store.
+
+A game is its starting position plus one 5-byte ``MOVE_DTYPE`` record per
+half-move: the encoded action, the moving piece's code, the code of the
+piece it removed, and flags for archer shots and the paralysis coin.
+
+``GameStore`` appends finished games to a directory of raw, append-only
+NumPy record files:
+
+    moves_00000.bin, ...   MOVE_DTYPE records, at most ``chunk_moves`` per file
+    games.bin              GAME_DTYPE index: chunk, offset, length, result, start position
+    meta.json              record layout and chunk size
+
+Every file is read back with ``np.memmap``, so streaming through hundreds
+of millions of moves only pages in the chunk being read, and a single game
+is one index lookup plus a slice. A game never spans two chunks.
+"""
+
+import json
+import os
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from archess_position import Position
+
+MOVE_DTYPE = np.dtype([
+    ('action', '<u2'),    # (from << 7) | (to << 1) | shot, as in the env's action space
+    ('piece', 'u1'),      # Code of the moving (or shooting) piece
+    ('captured', 'u1'),   # Code of the piece removed from the board, 0 if none
+    ('flags', 'u1'),      # FLAG_SHOT | FLAG_COIN | FLAG_PARALYZED
+])
+FLAG_SHOT = 1        # Archer shot; the archer stays on its square
+FLAG_COIN = 2        # The shot hit a knight, so the paralysis coin was flipped
+FLAG_PARALYZED = 4   # ...and came up heads
+
+# Game results in the index
+WHITE_WINS = 0
+BLACK_WINS = 1
+DRAW = 2
+UNFINISHED = -1  # Truncated or abandoned
+RESULTS = {'white': WHITE_WINS, 'black': BLACK_WINS, 'draw': DRAW, None: UNFINISHED}
+
+START_BYTES = 25  # Position.to_bytes() is at most 25 bytes
+GAME_DTYPE = np.dtype([
+    ('chunk', '<u4'),
+    ('offset', '<u4'),    # First move's record within the chunk
+    ('length', '<u4'),    # Half-moves
+    ('result', 'i1'),
+    ('start', 'u1', (START_BYTES,)),  # Position.to_bytes() of the start, zero padded
+])
+
+
+class MoveRecord(NamedTuple):
+    action: int
+    piece: int
+    captured: int
+    shot: bool
+    paralyzed: Optional[bool]  # Coin result of a knight shot, None when no coin was flipped
+
+    @property
+    def flags(self) -> int:
+        flags = FLAG_SHOT if self.shot else 0
+        if self.paralyzed is not None:
+            flags |= FLAG_COIN | (FLAG_PARALYZED if self.paralyzed else 0)
+        return flags
+
+    @classmethod
+    def from_row(cls, row) -> 'MoveRecord':
+        """Record from one ``MOVE_DTYPE`` row."""
+        flags = int(row['flags'])
+        return cls(int(row['action']), int(row['piece']), int(row['captured']),
+                   bool(flags & FLAG_SHOT), bool(flags & FLAG_PARALYZED) if flags & FLAG_COIN else None)
+
+
+def to_move_array(moves: Sequence[MoveRecord]) -> np.ndarray:
+    """Pack move records into a ``MOVE_DTYPE`` array."""
+    array = np.empty(len(moves), dtype=MOVE_DTYPE)
+    for i, move in enumerate(moves):
+        array[i] = (move.action, move.piece, move.captured, move.flags)
+    return array
+
+
+def encode_start(position: Position) -> np.ndarray:
+    """Start position as the zero-padded ``to_bytes`` field of the index."""
+    field = np.zeros(START_BYTES, dtype=np.uint8)
+    data = position.to_bytes()
+    field[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+    return field
+
+
+def decode_start(field: np.ndarray) -> Position:
+    """Inverse of ``encode_start``: the length follows from the occupancy bits."""
+    data = bytes(field)
+    count = bin(int.from_bytes(data[1:9], 'little')).count('1')
+    return Position.from_bytes(data[:9 + (count + 1) // 2])
+
+
+def replay(start: Position, moves: np.ndarray) -> Iterator[Tuple[Position, MoveRecord]]:
+    """
+    Yield (position before the move, move) for every half-move of a game.
+
+    The same position object is updated in place after each yield, coin
+    results included, so copy it to keep it.
+    """
+    position = start.copy()
+    for row in moves:
+        record = MoveRecord.from_row(row)
+        yield position, record
+        position.make_move(record.action, bool(record.paralyzed))
+
+
+class GameStore:
+    """
+    Chunked, memory-mappable store of Archess games.
+
+    Args:
+        path: Store directory, created if missing
+        mode: "a" to append (and read), "r" for read-only access
+        chunk_moves: Move records per chunk file, for a new store
+    """
+
+    def __init__(self, path: str, mode: str = "a", chunk_moves: int = 1 << 22):
+        if mode not in ("a", "r"):
+            raise ValueError(f"Unsupported mode: {mode}")
+        self.path = path
+        self.mode = mode
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta["move_dtype"] != _descr(MOVE_DTYPE) or meta["game_dtype"] != _descr(GAME_DTYPE):
+                raise ValueError(f"{path} holds records in another layout")
+            chunk_moves = meta["chunk_moves"]
+        elif mode == "r":
+            raise FileNotFoundError(f"No game store at {path}")
+        else:
+            os.makedirs(path, exist_ok=True)
+            with open(meta_path, "w") as f:
+                json.dump({"move_dtype": _descr(MOVE_DTYPE), "game_dtype": _descr(GAME_DTYPE),
+                           "chunk_moves": chunk_moves}, f)
+        self.chunk_moves = chunk_moves
+
+        # Write position: the last chunk and how full it is
+        self._chunk = 0
+        while os.path.exists(self._chunk_path(self._chunk + 1)):
+            self._chunk += 1
+        self._fill = _file_records(self._chunk_path(self._chunk), MOVE_DTYPE)
+        self._games = _file_records(os.path.join(path, "games.bin"), GAME_DTYPE)
+
+        self._moves_file = None
+        self._index_file = None
+        self._maps = {}
+        if mode == "a":
+            self._index_file = open(os.path.join(path, "games.bin"), "ab")
+
+    def _chunk_path(self, chunk: int) -> str:
+        return os.path.join(self.path, f"moves_{chunk:05d}.bin")
+
+    def append(self, moves: Union[np.ndarray, Sequence[MoveRecord]], start: Optional[Position] = None,
+               result: Union[int, str, None] = UNFINISHED) -> int:
+        """
+        Add a game and return its index.
+
+        Args:
+            moves: ``MOVE_DTYPE`` array or move records, in play order
+            start: Starting position (default: the standard one)
+            result: WHITE_WINS, BLACK_WINS, DRAW, UNFINISHED, or an env
+                winner label ('white', 'black', 'draw', None)
+        """
+        if self.mode != "a":
+            raise ValueError("Game store is read-only")
+        if not isinstance(moves, np.ndarray):
+            moves = to_move_array(moves)
+        if len(moves) > self.chunk_moves:
+            raise ValueError(f"Game of {len(moves)} moves exceeds the chunk size {self.chunk_moves}")
+        if not isinstance(result, int):
+            result = RESULTS[result]
+
+        if self._fill + len(moves) > self.chunk_moves:
+            self._close_moves_file()
+            self._chunk += 1
+            self._fill = 0
+        if self._moves_file is None:
+            self._moves_file = open(self._chunk_path(self._chunk), "ab")
+        self._moves_file.write(np.ascontiguousarray(moves, dtype=MOVE_DTYPE).tobytes())
+
+        entry = np.zeros(1, dtype=GAME_DTYPE)
+        entry['chunk'] = self._chunk
+        entry['offset'] = self._fill
+        entry['length'] = len(moves)
+        entry['result'] = result
+        entry['start'] = encode_start(start if start is not None else Position.initial())
+        self._index_file.write(entry.tobytes())
+
+        self._fill += len(moves)
+        self._games += 1
+        return self._games - 1
+
+    def flush(self):
+        """Write buffered games to disk so readers (and memmaps) see them."""
+        if self._moves_file is not None:
+            self._moves_file.flush()
+        if self._index_file is not None:
+            self._index_file.flush()
+
+    def _close_moves_file(self):
+        if self._moves_file is not None:
+            self._moves_file.close()
+            self._moves_file = None
+
+    def close(self):
+        self._close_moves_file()
+        if self._index_file is not None:
+            self._index_file.close()
+            self._index_file = None
+        self._maps.clear()
+
+    def __enter__(self) -> 'GameStore':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._games
+
+    @property
+    def num_moves(self) -> int:
+        """Half-moves over all games."""
+        return int(self.index['length'].sum(dtype=np.int64)) if self._games else 0
+
+    @property
+    def index(self) -> np.ndarray:
+        """Memory-mapped ``GAME_DTYPE`` index, one row per game."""
+        return self._map(os.path.join(self.path, "games.bin"), GAME_DTYPE, self._games)
+
+    def chunk(self, chunk: int) -> np.ndarray:
+        """Memory-mapped ``MOVE_DTYPE`` records of one chunk file."""
+        size = self._fill if chunk == self._chunk else _file_records(self._chunk_path(chunk), MOVE_DTYPE)
+        return self._map(self._chunk_path(chunk), MOVE_DTYPE, size)
+
+    def _map(self, path: str, dtype: np.dtype, size: int) -> np.ndarray:
+        """Cached read-only memmap of the first ``size`` records of a file."""
+        if size == 0:
+            return np.empty(0, dtype=dtype)
+        cached = self._maps.get(path)
+        if cached is None or len(cached) < size:
+            self.flush()
+            cached = self._maps[path] = np.memmap(path, dtype=dtype, mode="r")
+        return cached[:size]
+
+    def moves(self, game: int) -> np.ndarray:
+        """Move records of one game (a memmap slice)."""
+        entry = self.index[game]
+        offset = int(entry['offset'])
+        return self.chunk(int(entry['chunk']))[offset:offset + int(entry['length'])]
+
+    def game(self, game: int) -> Tuple[Position, np.ndarray, int]:
+        """(start position, move records, result) of one game."""
+        entry = self.index[game]
+        return decode_start(entry['start']), self.moves(game), int(entry['result'])
+
+    def iter_games(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[Position, np.ndarray, int]]:
+        """Stream games in store order, one chunk mapping at a time."""
+        for game in range(start, len(self) if stop is None else stop):
+            yield self.game(game)
+
+    def iter_chunks(self) -> Iterator[np.ndarray]:
+        """Stream every move record, one memory-mapped chunk at a time."""
+        for chunk in range(self._chunk + 1):
+            records = self.chunk(chunk)
+            if len(records):
+                yield records
+
+
+def _descr(dtype: np.dtype) -> List:
+    """JSON round-trippable dtype description."""
+    return json.loads(json.dumps(dtype.descr))
+
+
+def _file_records(path: str, dtype: np.dtype) -> int:
+    """Whole records in a file, 0 if it does not exist."""
+    return os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
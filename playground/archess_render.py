@@ -0,0 +1,232 @@
+"""
+Rendering backend for ArchessEnv.
+
+Kept out of archess_env so that training workers and subprocess envs,
+which never render, do not import pygame: the env loads this module the
+first time ``render()`` is called with a render mode set.
+
+Pieces come from the SVG set in ``docs/graphics/regular`` (the same files
+the web version uses, archers included). ``piece_tiles`` rasterizes them
+once per square size and composites every piece onto both square colors,
+giving a NumPy tile atlas; a frame is then just tiles copied into place.
+``BoardRenderer`` keeps its last frame and copies only the squares whose
+piece (or paralysis) changed since, so a typical move redraws 2-3 tiles.
+
+``render_boards`` turns a batch of B boards into a (B, H, W, 3) array with
+one gather from the atlas, and ``tile_frames`` lays such a batch out as a
+grid; the vectorized envs use them for SB3's ``VecVideoRecorder``. Pygame
+is only needed once per square size, to rasterize the atlas.
+"""
+
+import io
+import os
+import re
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+from archess_position import CHAR_TO_CODE, KNIGHT, TYPE_MASK
+
+LIGHT_SQUARE = (240, 217, 181)
+DARK_SQUARE = (181, 136, 99)
+PARALYZED_MARK = (200, 40, 40)
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+GRAPHICS_DIRS = (
+    os.path.join(_HERE, "..", "docs", "graphics", "regular"),
+    os.path.join(_HERE, "..", "graphics", "regular"),
+)
+
+# Atlas index of a square: piece code (0-15) plus 16 for a paralyzed knight
+NUM_TILE_KEYS = 32
+PARALYZED_KEY = 16
+
+
+def find_graphics_dir() -> Optional[str]:
+    """First of ``GRAPHICS_DIRS`` holding the piece SVGs, None if none does."""
+    for path in GRAPHICS_DIRS:
+        if os.path.exists(os.path.join(path, "wa.svg")):
+            return os.path.abspath(path)
+    return None
+
+
+def _load_svg(path: str, size: int):
+    """Rasterize an SVG at size x size pixels into a per-pixel alpha Surface."""
+    import pygame
+    with open(path) as f:
+        data = f.read()
+    # SDL's SVG loader sizes by the width/height attributes, which these files
+    # leave out or set to "100%"; pin them so the viewBox scales to the square
+    match = re.search(r'<svg\b[^>]*>', data)
+    tag = re.sub(r'\s(?:width|height)="[^"]*"', '', match.group(0))
+    tag = tag.replace('<svg', f'<svg width="{size}" height="{size}"', 1)
+    svg = data[:match.start()] + tag + data[match.end():]
+    return pygame.image.load(io.BytesIO(svg.encode()), "piece.svg")
+
+
+def _render_letter(letter: str, size: int):
+    """Fallback sprite: the piece letter, when no SVG set is available."""
+    import pygame
+    if not pygame.font.get_init():
+        pygame.font.init()
+    color = (255, 255, 255) if letter.isupper() else (0, 0, 0)
+    text = pygame.font.Font(None, size // 2).render(letter, True, color)
+    sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+    sprite.blit(text, text.get_rect(center=(size // 2, size // 2)))
+    return sprite
+
+
+@lru_cache(maxsize=8)
+def piece_tiles(square_size: int, graphics_dir: Optional[str] = None) -> np.ndarray:
+    """
+    (32, 2, S, S, 3) uint8 atlas: tile of every square key on a light (0)
+    and dark (1) square. Keys are piece codes, +16 for a paralyzed knight
+    (marked with a red dot); key 0 is the empty square.
+    """
+    import pygame
+    graphics_dir = graphics_dir or find_graphics_dir()
+    size = square_size
+    tiles = np.empty((NUM_TILE_KEYS, 2, size, size, 3), dtype=np.uint8)
+    tiles[:, 0] = LIGHT_SQUARE
+    tiles[:, 1] = DARK_SQUARE
+
+    yy, xx = np.mgrid[:size, :size]
+    radius = max(2, size // 10)
+    dot = (yy - 1.5 * radius) ** 2 + (xx - (size - 1.5 * radius)) ** 2 <= radius ** 2
+
+    for letter, code in CHAR_TO_CODE.items():
+        color = 'w' if letter.isupper() else 'b'
+        path = os.path.join(graphics_dir, f"{color}{letter.lower()}.svg") if graphics_dir else None
+        sprite = _load_svg(path, size) if path and os.path.exists(path) else _render_letter(letter, size)
+        # surfarray is (x, y); tiles are (row, col) like the frame
+        rgb = pygame.surfarray.array3d(sprite).transpose(1, 0, 2).astype(np.float32)
+        alpha = pygame.surfarray.array_alpha(sprite).T[..., None].astype(np.float32) / 255
+        for shade in (0, 1):
+            background = tiles[code, shade].astype(np.float32)
+            tiles[code, shade] = np.rint(background * (1 - alpha) + rgb * alpha).astype(np.uint8)
+        if code & TYPE_MASK == KNIGHT:
+            tiles[code | PARALYZED_KEY] = tiles[code]
+            tiles[code | PARALYZED_KEY][:, dot] = PARALYZED_MARK
+    tiles.setflags(write=False)  # Shared by every renderer of this size
+    return tiles
+
+
+def board_keys(codes: np.ndarray, paralyzed: np.ndarray) -> np.ndarray:
+    """Atlas keys of squares: piece codes, +16 where a knight is paralyzed."""
+    return np.asarray(codes, dtype=np.uint8) | (np.asarray(paralyzed, dtype=np.uint8) * PARALYZED_KEY)
+
+
+# Square color of every square: 0 light, 1 dark
+SQUARE_SHADES = (np.add.outer(np.arange(8), np.arange(8)) & 1).reshape(64)
+
+
+def compose_boards(tiles: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """(B, 8S, 8S, 3) frames of (B, 64) square keys, gathered from a ``piece_tiles`` atlas."""
+    batch, size = len(keys), tiles.shape[2]
+    squares = tiles[keys, SQUARE_SHADES]  # (B, 64, S, S, 3)
+    return (squares.reshape(batch, 8, 8, size, size, 3)
+            .transpose(0, 1, 3, 2, 4, 5)
+            .reshape(batch, 8 * size, 8 * size, 3))
+
+
+def render_boards(codes: np.ndarray, paralyzed: np.ndarray, board_size: int = 256,
+                  graphics_dir: Optional[str] = None) -> np.ndarray:
+    """
+    Render a batch of positions in one vectorized composite.
+
+    Args:
+        codes: (B, 64) square codes, as in ``ArchessVecEnv.boards``
+        paralyzed: (B, 64) paralyzed-knight mask
+        board_size: Frame size in pixels (rounded down to a multiple of 8)
+
+    Returns:
+        (B, H, W, 3) uint8 frames
+    """
+    tiles = piece_tiles(board_size // 8, graphics_dir)
+    return compose_boards(tiles, board_keys(codes, paralyzed))
+
+
+def tile_frames(frames: np.ndarray, columns: Optional[int] = None) -> np.ndarray:
+    """
+    Lay (N, H, W, 3) frames out as one image, row by row, padding with black.
+    The default grid matches SB3's ``tile_images``: ceil(sqrt(N)) rows.
+    """
+    count, height, width, channels = frames.shape
+    if columns is None:
+        rows = int(np.ceil(np.sqrt(count)))
+        columns = int(np.ceil(count / rows))
+    rows = -(-count // columns)
+    grid = np.zeros((rows * columns, height, width, channels), dtype=frames.dtype)
+    grid[:count] = frames
+    return (grid.reshape(rows, columns, height, width, channels)
+            .transpose(0, 2, 1, 3, 4)
+            .reshape(rows * height, columns * width, channels))
+
+
+class BoardRenderer:
+    """
+    Draws Archess positions from the cached tile atlas.
+
+    Args:
+        render_mode: "human" to show a window, "rgb_array" to return frames
+        window_size: Board size in pixels (rounded down to a multiple of 8)
+        render_fps: Frame rate cap of the window
+        graphics_dir: Directory of the piece SVGs (default: ``find_graphics_dir()``)
+    """
+
+    def __init__(self, render_mode: str, window_size: int = 512, render_fps: int = 4,
+                 graphics_dir: Optional[str] = None):
+        self.render_mode = render_mode
+        self.square_size = window_size // 8
+        self.window_size = self.square_size * 8
+        self.render_fps = render_fps
+        self.tiles = piece_tiles(self.square_size, graphics_dir)
+        self.frame = np.empty((self.window_size, self.window_size, 3), dtype=np.uint8)
+        self._drawn = np.full(64, -1, dtype=np.int16)  # Key drawn on each square, -1 before the first frame
+        self.window = None
+        self.clock = None
+
+    def render(self, codes: np.ndarray, paralyzed: np.ndarray):
+        """
+        Draw a position given its 64 square codes and paralyzed mask.
+
+        Returns a fresh (H, W, 3) frame in rgb_array mode; only squares that
+        changed since the previous call are redrawn.
+        """
+        keys = board_keys(codes, paralyzed)
+        changed = np.flatnonzero(keys != self._drawn)
+        size = self.square_size
+        if len(changed) > 16:
+            # Mostly new board: assemble it from the atlas in one gather
+            self.frame[:] = compose_boards(self.tiles, keys[None])[0]
+        else:
+            for sq in changed:
+                row, col = divmod(int(sq), 8)
+                self.frame[row * size:(row + 1) * size, col * size:(col + 1) * size] = \
+                    self.tiles[keys[sq], SQUARE_SHADES[sq]]
+        self._drawn[:] = keys
+
+        if self.render_mode == "human":
+            self._show()
+            return None
+        return self.frame.copy()  # Callers such as video recorders keep their frames
+
+    def _show(self):
+        import pygame
+        if self.window is None:
+            pygame.init()
+            pygame.display.init()
+            self.window = pygame.display.set_mode((self.window_size, self.window_size))
+            self.clock = pygame.time.Clock()
+        pygame.surfarray.blit_array(self.window, self.frame.transpose(1, 0, 2))
+        pygame.event.pump()
+        pygame.display.update()
+        self.clock.tick(self.render_fps)
+
+    def close(self):
+        if self.window is not None:
+            import pygame
+            pygame.display.quit()
+            pygame.quit()
+            self.window = None
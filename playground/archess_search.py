@@ -0,0 +1,334 @@
+"""
+Alpha-beta search for Archess.
+
+Negamax with alpha-beta pruning and iterative deepening over the bitboard
+Position: moves are pushed and popped, never copied. Captures and archer
+shots are searched first in MVV-LVA order, the knight-paralysis coin flip
+is averaged over both outcomes, and every search runs under an optional
+node and/or wall-clock budget. When the budget runs out, the best move of
+the last completed depth is played.
+
+Searched positions are cached in a transposition table keyed by the
+position's incremental Zobrist hash, which also supplies the first move to
+try when a position comes back.
+"""
+
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from archess_env import PIECE_VALUES, PieceType
+from archess_position import (
+    Position, WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, ARCHER,
+    TYPE_MASK, BLACK_FLAG, square,
+)
+
+MATE_SCORE = 100000.0
+MATE_BOUND = MATE_SCORE - 1000  # Scores beyond this are king captures
+INFINITY = float('inf')
+
+# Transposition table bound types
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# Material per piece code, positive for white
+MATERIAL = [0.0] * 16
+for _code in range(16):
+    if _code & TYPE_MASK:
+        _value = float(PIECE_VALUES[PieceType(_code & TYPE_MASK)])
+        MATERIAL[_code] = -_value if _code & BLACK_FLAG else _value
+
+# Center control bonuses, as in the web version's evaluation
+CENTER = sum(1 << square(r, c) for r, c in ((3, 3), (3, 4), (4, 3), (4, 4)))
+NEAR_CENTER = sum(1 << square(r, c) for r in range(2, 6) for c in range(2, 6)) & ~CENTER
+CENTER_BONUS = 0.5
+NEAR_CENTER_BONUS = 0.2
+
+# MVV-LVA ordering: most valuable victim first, cheapest attacker on ties
+ORDER_RANK = {PAWN: 1, ARCHER: 2, KNIGHT: 3, BISHOP: 3, ROOK: 5, QUEEN: 9, KING: 10}
+MVV_LVA = [[0] * 16 for _ in range(16)]
+for _victim in range(16):
+    for _attacker in range(16):
+        if _victim & TYPE_MASK and _attacker & TYPE_MASK:
+            victim_rank = 50 if _victim & TYPE_MASK == KING else ORDER_RANK[_victim & TYPE_MASK]
+            MVV_LVA[_victim][_attacker] = 100 * victim_rank - ORDER_RANK[_attacker & TYPE_MASK]
+
+
+def _popcount(bb: int) -> int:
+    return bin(bb).count('1')
+
+
+def evaluate(position: Position) -> float:
+    """Static evaluation from the side to move's point of view."""
+    pieces = position.pieces
+    score = 0.0
+    for code in range(1, 16):
+        if pieces[code]:
+            score += MATERIAL[code] * _popcount(pieces[code])
+
+    white, black = position.occupancy
+    score += CENTER_BONUS * (_popcount(white & CENTER) - _popcount(black & CENTER))
+    score += NEAR_CENTER_BONUS * (_popcount(white & NEAR_CENTER) - _popcount(black & NEAR_CENTER))
+
+    # Kings that wander off their back ranks are exposed
+    white_king = position.king_square(WHITE)
+    black_king = position.king_square(BLACK)
+    if white_king is not None and white_king >> 3 < 6:
+        score -= 1
+    if black_king is not None and black_king >> 3 > 1:
+        score += 1
+
+    return score if position.side == WHITE else -score
+
+
+class TTEntry(NamedTuple):
+    key: int
+    depth: int
+    score: float
+    bound: int
+    move: Optional[int]
+    age: int
+
+
+class TranspositionTable:
+    """
+    Fixed-size transposition table with depth-preferred replacement.
+
+    Slots are indexed by the low bits of the Zobrist key and keep the full
+    key, so a slot holding another position is reported as a collision
+    rather than returned. A stored entry is only replaced by the same
+    position, by a search at least as deep, or once it is left over from an
+    earlier search.
+
+    Args:
+        size: Number of slots, rounded down to a power of two
+    """
+
+    def __init__(self, size: int = 1 << 16):
+        self.size = 1 << max(0, int(size).bit_length() - 1)
+        self._mask = self.size - 1
+        self._slots: List[Optional[TTEntry]] = [None] * self.size
+        self.age = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+
+    def probe(self, key: int) -> Optional[TTEntry]:
+        """Entry stored for ``key``, or None."""
+        entry = self._slots[key & self._mask]
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.key != key:
+            self.collisions += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def store(self, key: int, depth: int, score: float, bound: int, move: Optional[int]):
+        """Save a search result unless the slot holds a deeper current entry."""
+        index = key & self._mask
+        entry = self._slots[index]
+        if entry is None or entry.key == key or entry.age != self.age or depth >= entry.depth:
+            self._slots[index] = TTEntry(key, depth, score, bound, move, self.age)
+
+    def new_search(self):
+        """Mark existing entries as old so new results may replace them."""
+        self.age += 1
+
+    def clear(self):
+        """Drop every entry and reset the counters."""
+        self._slots = [None] * self.size
+        self.hits = self.misses = self.collisions = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Probe counters and the number of filled slots."""
+        return {
+            'size': self.size,
+            'filled': self.size - self._slots.count(None),
+            'hits': self.hits,
+            'misses': self.misses,
+            'collisions': self.collisions,
+        }
+
+
+def _score_to_table(score: float, ply: int) -> float:
+    """Make king-capture scores relative to the stored node, not the root."""
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _score_from_table(score: float, ply: int) -> float:
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class SearchResult(NamedTuple):
+    move: Optional[int]
+    score: float
+    depth: int
+    nodes: int
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+class SearchEngine:
+    """
+    Iterative-deepening alpha-beta search.
+
+    Args:
+        max_depth: Deepest iteration to search (plies)
+        time_limit_ms: Wall-clock budget per move, None for no limit
+        node_limit: Node budget per move, None for no limit
+        table_size: Transposition table slots, 0 to search without one
+    """
+
+    def __init__(self, max_depth: int = 3, time_limit_ms: Optional[float] = 100,
+                 node_limit: Optional[int] = None, table_size: int = 1 << 16):
+        self.max_depth = max_depth
+        self.time_limit_ms = time_limit_ms
+        self.node_limit = node_limit
+        self.table = TranspositionTable(table_size) if table_size else None
+        self.nodes = 0
+        self._deadline = None
+
+    def search(self, position: Position) -> SearchResult:
+        """Find the best move for the side to move; the position is left unchanged."""
+        self.nodes = 0
+        start = time.perf_counter()
+        self._deadline = None if self.time_limit_ms is None else start + self.time_limit_ms / 1000
+        stack_size = len(position.stack)
+        if self.table is not None:
+            self.table.new_search()
+
+        moves = position.legal_moves()
+        if not moves:
+            return SearchResult(None, 0.0, 0, 0)
+
+        best = SearchResult(self._order(position, moves)[0], 0.0, 0, 0)
+        for depth in range(1, self.max_depth + 1):
+            try:
+                move, score = self._search_root(position, moves, depth, best.move)
+            except _BudgetExceeded:
+                while len(position.stack) > stack_size:
+                    position.pop()
+                break
+            best = SearchResult(move, score, depth, self.nodes)
+
+            # Don't start a deeper iteration that would almost surely time out
+            if self._deadline is not None:
+                elapsed = time.perf_counter() - start
+                if elapsed > 0.8 * self.time_limit_ms / 1000:
+                    break
+
+        return best._replace(nodes=self.nodes)
+
+    def _search_root(self, position: Position, moves: List[int], depth: int, first: int):
+        """Search every root move to ``depth`` and return (best move, score)."""
+        alpha = -INFINITY
+        best_move = None
+        for move in self._order(position, moves, first):
+            score = self._search_move(position, move, depth, alpha, INFINITY, 0)
+            if best_move is None or score > alpha:
+                alpha = score
+                best_move = move
+        return best_move, alpha
+
+    def _negamax(self, position: Position, depth: int, alpha: float, beta: float, ply: int) -> float:
+        """Score of the position for the side to move."""
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise _BudgetExceeded
+        if self.nodes & 1023 == 0:
+            self._check_deadline()  # The clock is read only every 1024 nodes
+
+        # The previous move captured this side's king
+        if not position.king_alive(position.side):
+            return -MATE_SCORE + ply
+        if depth == 0:
+            return evaluate(position)
+
+        table = self.table
+        hash_move = None
+        if table is not None:
+            entry = table.probe(position.key)
+            if entry is not None:
+                hash_move = entry.move
+                if entry.depth >= depth:
+                    score = _score_from_table(entry.score, ply)
+                    if (entry.bound == EXACT
+                            or (entry.bound == LOWER and score >= beta)
+                            or (entry.bound == UPPER and score <= alpha)):
+                        return score
+
+        moves = position.legal_moves()
+        if not moves:
+            return 0.0  # No moves is a draw in Archess
+
+        original_alpha = alpha
+        best = -INFINITY
+        best_move = None
+        for move in self._order(position, moves, hash_move):
+            score = self._search_move(position, move, depth, alpha, beta, ply)
+            if score > best:
+                best = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if table is not None:
+            if best >= beta:
+                bound = LOWER
+            elif best <= original_alpha:
+                bound = UPPER
+            else:
+                bound = EXACT
+            table.store(position.key, depth, _score_to_table(best, ply), bound, best_move)
+        return best
+
+    def _search_move(self, position: Position, move: int, depth: int,
+                     alpha: float, beta: float, ply: int) -> float:
+        """Score of playing ``move``, averaging both paralysis outcomes for knight shots."""
+        mailbox = position.mailbox
+        to_sq = (move >> 1) & 63
+        if mailbox[move >> 7] & TYPE_MASK == ARCHER and mailbox[to_sq] & TYPE_MASK == KNIGHT:
+            # Chance node: a full window keeps both halves of the average exact
+            total = 0.0
+            for paralyze in (True, False):
+                position.push(move, paralyze)
+                total -= self._negamax(position, depth - 1, -INFINITY, INFINITY, ply + 1)
+                position.pop()
+            return total / 2
+
+        position.push(move)
+        score = -self._negamax(position, depth - 1, -beta, -alpha, ply + 1)
+        position.pop()
+        return score
+
+    def _order(self, position: Position, moves: List[int], first: Optional[int] = None) -> List[int]:
+        """Captures and archer shots first (MVV-LVA), then quiet moves; ``first`` leads."""
+        mailbox = position.mailbox
+        ordered = sorted(
+            moves,
+            key=lambda move: MVV_LVA[mailbox[(move >> 1) & 63]][mailbox[move >> 7]],
+            reverse=True,
+        )
+        if first is not None and first in moves:
+            ordered.remove(first)
+            ordered.insert(0, first)
+        return ordered
+
+    def _check_deadline(self):
+        """Abort the search once the time budget is spent."""
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            raise _BudgetExceeded
@@ -0,0 +1,281 @@
+"""
+Process-sharded vectorized Archess environment.
+
+Each worker process owns a contiguous slice of the games and steps it with
+its own ArchessVecEnv. Actions, observations, rewards, dones and terminal
+data live in ``multiprocessing.shared_memory`` arrays, so only short
+command messages cross the pipes and nothing is pickled per game.
+"""
+
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+from gymnasium import spaces
+from typing import Any, Dict, List, Optional, Tuple
+from stable_baselines3.common.vec_env import VecEnv
+
+from archess_env import observation_space
+from archess_vec_env import ArchessVecEnv, RENDER_FPS, require_all_games, split_by_game
+
+WINNER_CODES = {None: 0, 'white': 1, 'black': 2, 'draw': 3}
+WINNER_NAMES = {code: name for name, code in WINNER_CODES.items()}
+
+# Settings held by every worker's ArchessVecEnv; set_attr forwards them
+WORKER_ATTRS = ("opponent", "max_episode_steps")
+
+
+def _buffer_layout(num_envs: int, obs_mode: str) -> Dict[str, Tuple[Tuple[int, ...], str]]:
+    """Shape and dtype of every shared array."""
+    space = observation_space(obs_mode)
+    observations = ((num_envs, *space.shape), space.dtype.name)
+    return {
+        'actions': ((num_envs,), 'int64'),
+        'observations': observations,
+        'terminal_observations': observations,
+        'rewards': ((num_envs,), 'float32'),
+        'dones': ((num_envs,), 'bool'),
+        'truncated': ((num_envs,), 'bool'),
+        'winners': ((num_envs,), 'int8'),
+        'action_masks': ((num_envs, 8192), 'bool'),
+        'boards': ((num_envs, 64), 'uint8'),      # Filled on request, for rendering
+        'paralyzed': ((num_envs, 64), 'bool'),
+    }
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Open a block created by the parent, which owns and unlinks it.
+
+    Workers share the parent's resource tracker, so on Python < 3.13 the
+    attach only re-registers the same name instead of adding a second owner.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _as_arrays(blocks: Dict[str, shared_memory.SharedMemory], layout) -> Dict[str, np.ndarray]:
+    """NumPy views over the shared blocks."""
+    return {
+        name: np.ndarray(shape, dtype=dtype, buffer=blocks[name].buf)
+        for name, (shape, dtype) in layout.items()
+    }
+
+
+def _worker(remote, parent_remote, block_names: Dict[str, str], num_envs: int,
+            start: int, stop: int, opponent: str, max_episode_steps: int, seed: Optional[int],
+            obs_mode: str, search_options: Optional[Dict[str, Any]]):
+    """Step the games ``start:stop`` on request, reading and writing shared arrays."""
+    parent_remote.close()
+    blocks = {name: _attach(block_name) for name, block_name in block_names.items()}
+    layout = _buffer_layout(num_envs, obs_mode)
+    arrays = {name: array[start:stop] for name, array in _as_arrays(blocks, layout).items()}
+    env = ArchessVecEnv(stop - start, opponent=opponent, max_episode_steps=max_episode_steps,
+                        seed=seed, obs_mode=obs_mode, env_offset=start, search_options=search_options)
+
+    try:
+        while True:
+            command, data = remote.recv()
+            if command == "step":
+                observations, rewards, dones, infos = env.step(arrays['actions'])
+                arrays['observations'][:] = observations
+                arrays['rewards'][:] = rewards
+                arrays['dones'][:] = dones
+                for i in np.flatnonzero(dones):
+                    arrays['terminal_observations'][i] = infos[i]["terminal_observation"]
+                    arrays['truncated'][i] = infos[i]["TimeLimit.truncated"]
+                    arrays['winners'][i] = WINNER_CODES[infos[i]["winner"]]
+                remote.send(None)
+            elif command == "reset":
+                if data is not None:
+                    env.seed(data)
+                arrays['observations'][:] = env.reset()
+                remote.send(None)
+            elif command == "action_masks":
+                arrays['action_masks'][:] = env.action_masks()
+                remote.send(None)
+            elif command == "boards":
+                arrays['boards'][:] = env.boards
+                arrays['paralyzed'][:] = env.paralyzed
+                remote.send(None)
+            elif command == "set_attr":
+                env.set_attr(*data)
+                remote.send(None)
+            elif command == "close":
+                break
+            else:
+                raise NotImplementedError(f"`{command}` is not implemented in the worker")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        del arrays
+        for block in blocks.values():
+            block.close()
+        remote.close()
+
+
+class ArchessSubprocVecEnv(VecEnv):
+    """
+    Archess games sharded over worker processes that share memory buffers.
+
+    Args:
+        num_envs: Total number of games
+        n_workers: Number of worker processes, each stepping a slice of the games
+        opponent: Opponent for black ("random", "greedy", "minimax" or a checkpoint
+            path, loaded once per worker and batched over its games)
+        max_episode_steps: Truncate games after this many agent moves
+        seed: Seed shared by every worker; each game draws from its own stream
+            (see ``BatchRNG``), so seeded rollouts with the built-in opponents
+            match ``ArchessVecEnv(num_envs, seed=seed)`` whatever ``n_workers`` is
+        start_method: multiprocessing start method (default: forkserver if available, else spawn)
+        obs_mode: Observation encoding, one of ``archess_env.OBS_MODES``
+        render_mode: None or "rgb_array"; workers only copy their boards into
+            shared memory, and this process renders them (see ``ArchessVecEnv``)
+        render_games: Games drawn by ``render()``
+        render_board_size: Pixel size of each drawn board
+        search_options: ``SearchEngine`` options of the minimax opponent
+            (default: ``archess_env.SEARCH_DEFAULTS``)
+    """
+
+    render_mode = None
+
+    def __init__(self, num_envs: int = 1024, n_workers: int = 4, opponent: str = "random",
+                 max_episode_steps: int = 200, seed: Optional[int] = None,
+                 start_method: Optional[str] = None, obs_mode: str = "planes",
+                 render_mode: Optional[str] = None, render_games: int = 16,
+                 render_board_size: int = 256, search_options: Optional[Dict[str, Any]] = None):
+        if not 1 <= n_workers <= num_envs:
+            raise ValueError(f"n_workers must be between 1 and num_envs, got {n_workers}")
+        if render_mode not in (None, "rgb_array"):
+            raise ValueError(f"Unsupported render mode for batched games: {render_mode}")
+        self.render_mode = render_mode  # Read back by VecEnv.__init__
+        self.render_games = min(render_games, num_envs)
+        self.render_board_size = render_board_size
+
+        action_space = spaces.Discrete(8192)
+        super().__init__(num_envs, observation_space(obs_mode), action_space)
+        self.metadata["render_fps"] = RENDER_FPS
+
+        layout = _buffer_layout(num_envs, obs_mode)
+        self._blocks = {
+            name: shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize))
+            for name, (shape, dtype) in layout.items()
+        }
+        self._arrays = _as_arrays(self._blocks, layout)
+        self._arrays['winners'][:] = 0
+
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(start_method)
+
+        bounds = np.linspace(0, num_envs, n_workers + 1).astype(int)
+        block_names = {name: block.name for name, block in self._blocks.items()}
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(n_workers)])
+        self.processes = []
+        for i, (work_remote, remote) in enumerate(zip(self.work_remotes, self.remotes)):
+            args = (work_remote, remote, block_names, num_envs, bounds[i], bounds[i + 1],
+                    opponent, max_episode_steps, seed, obs_mode, search_options)
+            process = ctx.Process(target=_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        self.opponent = opponent
+        self.max_episode_steps = max_episode_steps
+        self.search_options = search_options
+        self.obs_mode = obs_mode
+        self.n_workers = n_workers
+        self.waiting = False
+        self.closed = False
+
+    def _broadcast(self, command: str, data: Optional[List[Any]] = None):
+        """Send a command to every worker and wait until all of them are done."""
+        for i, remote in enumerate(self.remotes):
+            remote.send((command, None if data is None else data[i]))
+        for remote in self.remotes:
+            remote.recv()
+
+    def reset(self) -> np.ndarray:
+        """Reset every game; a seed set through ``seed()`` is passed to every worker."""
+        self._broadcast("reset", [self._seeds[0]] * self.n_workers)
+        self._reset_seeds()
+        self._reset_options()
+        return self._arrays['observations'].copy()
+
+    def step_async(self, actions: np.ndarray):
+        self._arrays['actions'][:] = np.asarray(actions).reshape(self.num_envs)
+        for remote in self.remotes:
+            remote.send(("step", None))
+        self.waiting = True
+
+    def step_wait(self):
+        for remote in self.remotes:
+            remote.recv()
+        self.waiting = False
+
+        arrays = self._arrays
+        dones = arrays['dones'].copy()
+        infos = [{} for _ in range(self.num_envs)]
+        for i in np.flatnonzero(dones):
+            infos[i]["terminal_observation"] = arrays['terminal_observations'][i].copy()
+            infos[i]["TimeLimit.truncated"] = bool(arrays['truncated'][i])
+            infos[i]["winner"] = WINNER_NAMES[int(arrays['winners'][i])]
+        return arrays['observations'].copy(), arrays['rewards'].copy(), dones, infos
+
+    def action_masks(self) -> np.ndarray:
+        """(B, 8192) boolean mask of legal actions for every game."""
+        self._broadcast("action_masks")
+        return self._arrays['action_masks'].copy()
+
+    def render_frames(self) -> np.ndarray:
+        """(render_games, H, W, 3) frames of the first ``render_games`` games."""
+        from archess_render import render_boards
+        self._broadcast("boards")
+        n = self.render_games
+        return render_boards(self._arrays['boards'][:n], self._arrays['paralyzed'][:n], self.render_board_size)
+
+    def get_images(self) -> List[np.ndarray]:
+        return list(self.render_frames())
+
+    def render(self, mode: Optional[str] = None) -> Optional[np.ndarray]:
+        """Grid image of the rendered games (``rgb_array`` mode only)."""
+        if (mode or self.render_mode) != "rgb_array":
+            return super().render(mode)
+        from archess_render import tile_frames
+        return tile_frames(self.render_frames())
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self._arrays = {}
+        for block in self._blocks.values():
+            block.close()
+            block.unlink()
+        self.closed = True
+
+    def get_attr(self, attr_name: str, indices=None) -> List[Any]:
+        value = getattr(self, attr_name)
+        return [value for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name: str, value: Any, indices=None):
+        """Set a batch-level attribute; ``WORKER_ATTRS`` are also sent to every worker."""
+        require_all_games(attr_name, self._get_indices(indices), self.num_envs)
+        if attr_name in WORKER_ATTRS:
+            self._broadcast("set_attr", [(attr_name, value)] * self.n_workers)
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs) -> List[Any]:
+        """Call a batch-level method and split its per-game result by env index."""
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return split_by_game(result, self._get_indices(indices), self.num_envs)
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> List[bool]:
+        return [False for _ in self._get_indices(indices)]
@@ -0,0 +1,629 @@
+"""
+Vectorized Archess environment.
+
+Holds a batch of games as stacked NumPy arrays (piece codes, paralysis
+masks, side to move, step counters) and steps all of them in one call:
+agent moves, the built-in opponent's replies, game-end checks and
+auto-resets are array operations over the batch axis. Move generation
+works on ``uint64`` bitboards, one destination set per board and square.
+Implements the Stable Baselines3 ``VecEnv`` interface so it can replace
+``make_vec_env`` in ``train_agent``.
+"""
+
+import numpy as np
+from gymnasium import spaces
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from stable_baselines3.common.vec_env import VecEnv
+
+from archess_env import ArchessEnv, PIECE_VALUES, PLANES_V2, SEARCH_DEFAULTS, PieceType, encode_observations, observation_space
+from archess_position import (
+    Position, WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, ARCHER,
+    TYPE_MASK, BLACK_FLAG, MOVE_TABLES, TABLE_INDEX, ARCHER_TARGET_TYPES, RAY_POSITIVE,
+    parse_fen, squares_mask,
+)
+
+_ZERO = np.uint64(0)
+_ONE = np.uint64(1)
+_SHIFTS = tuple(np.uint64(shift) for shift in (1, 2, 4, 8, 16, 32))
+
+
+def _rows(*names: str) -> np.ndarray:
+    """Rows of the shared move tables, stacked in the given order."""
+    return MOVE_TABLES[[TABLE_INDEX[name] for name in names]]
+
+
+KNIGHT_BB = MOVE_TABLES[TABLE_INDEX['knight']]
+KING_BB = MOVE_TABLES[TABLE_INDEX['king']]
+ARCHER_STEP_BB = MOVE_TABLES[TABLE_INDEX['archer_step']]
+ARCHER_SHOT_BB = _rows('archer_shot_white', 'archer_shot_black')
+PAWN_PUSH_BB = _rows('pawn_push_white', 'pawn_push_black')
+PAWN_DOUBLE_BB = _rows('pawn_double_white', 'pawn_double_black')
+PAWN_CAPTURE_BB = _rows('pawn_capture_white', 'pawn_capture_black')
+RAY_BB = _rows(*(f'ray_{d}' for d in range(8)))
+SHOOTABLE = np.zeros(16, dtype=bool)
+for _piece in ARCHER_TARGET_TYPES:
+    SHOOTABLE[[_piece, _piece | BLACK_FLAG]] = True
+
+# Capture value per piece code
+CODE_VALUES = np.zeros(16, dtype=np.float32)
+for _code in range(16):
+    if _code & TYPE_MASK:
+        CODE_VALUES[_code] = PIECE_VALUES[PieceType(_code & TYPE_MASK)]
+VALUE_CLASSES = sorted(set(CODE_VALUES[CODE_VALUES > 0].tolist()), reverse=True)
+
+# Number of set bits per byte value
+POPCOUNT8 = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+
+STARTING_BOARD = np.frombuffer(Position.initial().mailbox, dtype=np.uint8)
+
+def split_by_game(result: Any, indices: List[int], num_envs: int) -> List[Any]:
+    """Per-env values of a batch-level result: its rows if it has one per game, else the result for each env."""
+    if isinstance(result, (np.ndarray, list, tuple)) and len(result) == num_envs:
+        return [result[i] for i in indices]
+    return [result for _ in indices]
+
+
+def require_all_games(attr_name: str, indices: List[int], num_envs: int):
+    """Batch-level attributes apply to every game, so a subset of indices is an error."""
+    if sorted(indices) != list(range(num_envs)):
+        raise ValueError(f"{attr_name!r} is shared by all games and cannot be set for a subset of them")
+
+
+# Loaded positions tried per reset before giving up on a FEN file of finished games
+MAX_POSITION_DRAWS = 100
+RENDER_FPS = ArchessEnv.metadata["render_fps"]
+
+
+def pack_squares(squares: np.ndarray) -> np.ndarray:
+    """Pack a (B, 64) boolean square mask into (B,) uint64 bitboards."""
+    packed = np.packbits(squares, axis=1, bitorder='little')
+    return packed.view('<u8').reshape(len(squares)).astype(np.uint64, copy=False)
+
+
+def unpack_squares(bitboards: np.ndarray) -> np.ndarray:
+    """Unpack uint64 bitboards of any shape into a boolean array with a trailing 64 axis."""
+    as_bytes = bitboards.astype('<u8', copy=False).view(np.uint8)
+    bits = np.unpackbits(as_bytes.reshape(*bitboards.shape, 8), axis=-1, bitorder='little')
+    return bits.view(bool)
+
+
+def _highest_bit(bitboards: np.ndarray) -> np.ndarray:
+    """Isolate the highest set bit of each bitboard."""
+    smeared = bitboards.copy()
+    for shift in _SHIFTS:
+        smeared |= smeared >> shift
+    return smeared ^ (smeared >> _ONE)
+
+
+def batch_destinations(boards: np.ndarray, paralyzed: np.ndarray, sides: np.ndarray) -> np.ndarray:
+    """
+    Destination bitboards for a batch of positions.
+
+    Args:
+        boards: (B, 64) uint8 piece codes
+        paralyzed: (B, 64) bool paralyzed-knight squares
+        sides: (B,) color to move per board
+
+    Returns:
+        (B, 64) uint64, the moves and archer shots of the side-to-move piece
+        on each square (0 for empty squares and enemy pieces)
+    """
+    occupied_squares = boards != 0
+    own_squares = occupied_squares & ((boards >> 3) == sides[:, None])
+    own = pack_squares(own_squares)[:, None]
+    enemy = pack_squares(occupied_squares & ~own_squares)[:, None]
+    occupied = own | enemy
+    free = ~occupied
+    shootable = pack_squares(SHOOTABLE[boards] & ~own_squares)[:, None]
+    types = np.where(own_squares, boards & TYPE_MASK, 0)
+
+    destinations = np.zeros(boards.shape, dtype=np.uint64)
+
+    # Knights (unless paralyzed) and kings jump to anything not their own
+    np.copyto(destinations, KNIGHT_BB & ~own, where=(types == KNIGHT) & ~paralyzed)
+    np.copyto(destinations, KING_BB & ~own, where=types == KING)
+
+    # Archers step onto empty squares and shoot forward at shootable pieces
+    archer_moves = (ARCHER_STEP_BB & free) | (ARCHER_SHOT_BB[sides] & shootable)
+    np.copyto(destinations, archer_moves, where=types == ARCHER)
+
+    # Pawns push onto empty squares (twice from the start row) and capture diagonally
+    pushes = PAWN_PUSH_BB[sides] & free
+    doubles = np.where(pushes != _ZERO, PAWN_DOUBLE_BB[sides] & free, _ZERO)
+    pawn_moves = pushes | doubles | (PAWN_CAPTURE_BB[sides] & enemy)
+    np.copyto(destinations, pawn_moves, where=types == PAWN)
+
+    # Sliders walk each ray up to and including the first blocker
+    queens = types == QUEEN
+    for sliders, directions in (((types == ROOK) | queens, range(0, 4)),
+                                ((types == BISHOP) | queens, range(4, 8))):
+        if not sliders.any():
+            continue
+        attacks = np.zeros(boards.shape, dtype=np.uint64)
+        for direction in directions:
+            ray = RAY_BB[direction]
+            blockers = ray & occupied
+            if RAY_POSITIVE[direction]:
+                nearest = blockers & (~blockers + _ONE)
+                attacks |= ray & ((nearest << _ONE) - _ONE)
+            else:
+                # Bit 0 acts as a sentinel so an unblocked ray keeps every square
+                nearest = _highest_bit(blockers | _ONE)
+                attacks |= ray & ~(nearest - _ONE)
+        np.copyto(destinations, destinations | (attacks & ~own), where=sliders)
+
+    return destinations
+
+
+def batch_legal_moves(boards: np.ndarray, paralyzed: np.ndarray, sides: np.ndarray) -> np.ndarray:
+    """(B, 64, 64) boolean from-square/to-square legality for a batch of positions."""
+    return unpack_squares(batch_destinations(boards, paralyzed, sides))
+
+
+def batch_action_masks(boards: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+    """(B, 8192) action masks from piece codes and ``batch_destinations`` output."""
+    legal = unpack_squares(destinations)
+    # Archer shots use action type 1, like ArchessEnv.action_masks
+    shooters = (boards & TYPE_MASK) == ARCHER
+    shots = legal & shooters[:, :, None] & (boards != 0)[:, None, :]
+    masks = np.zeros((len(boards), 64, 64, 2), dtype=bool)
+    masks[..., 0] = legal & ~shots
+    masks[..., 1] = shots
+    return masks.reshape(len(boards), 8192)
+
+
+class BatchRNG:
+    """
+    Counter-based random numbers with one independent stream per game.
+
+    Draw ``k`` of game ``i`` is a SplitMix64 hash of (seed, i, k), so a
+    game's coin flips and opponent choices depend only on the seed, its
+    global index and how many draws it made before: the same games give
+    bit-identical trajectories whatever the batch size, sharding or number
+    of workers, and every batch of draws is still one array operation.
+
+    Args:
+        seed: Stream seed, None for a random one
+        num_envs: Number of games
+        offset: Global index of the first game (for shards of a larger batch)
+    """
+
+    def __init__(self, seed: Optional[int], num_envs: int, offset: int = 0):
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        key = np.array([seed & 0xFFFFFFFFFFFFFFFF], dtype=np.uint64)
+        ids = np.arange(offset, offset + num_envs, dtype=np.uint64)
+        self.streams = _splitmix64(key ^ _splitmix64(ids))
+        self.counters = np.zeros(num_envs, dtype=np.uint64)
+
+    def random(self, rows: np.ndarray) -> np.ndarray:
+        """One uniform float in [0, 1) per listed game, advancing their streams."""
+        bits = _splitmix64(self.streams[rows] + self.counters[rows] * _GOLDEN)
+        self.counters[rows] += _ONE
+        return (bits >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer over uint64 arrays (wrapping arithmetic)."""
+    z = x + _GOLDEN
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+class FenLoader:
+    """
+    Streams Archess FEN positions into batches of board arrays.
+
+    Lines are read lazily and parsed one chunk at a time, so a file with
+    millions of positions never sits in memory. Blank lines and lines
+    starting with '#' are skipped.
+
+    Args:
+        source: Path of a text file with one FEN per line, or any iterable of FEN strings
+        chunk_size: Positions parsed per refill
+        loop: Start over at the end of a file (ignored for plain iterables)
+    """
+
+    def __init__(self, source: Union[str, Iterable[str]], chunk_size: int = 4096, loop: bool = True):
+        self.path = source if isinstance(source, str) else None
+        self.loop = loop and self.path is not None
+        self._file = None
+        self._lines = self._open() if self.path is not None else iter(source)
+        self._boards = np.zeros((chunk_size, 64), dtype=np.uint8)
+        self._paralyzed = np.zeros((chunk_size, 64), dtype=bool)
+        self._sides = np.zeros(chunk_size, dtype=np.int8)
+        self._count = 0
+        self._index = 0
+
+    def _open(self) -> Iterator[str]:
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.path)
+        return iter(self._file)
+
+    def _next_fen(self) -> Optional[str]:
+        """Next non-empty line, reopening the file once per pass when looping."""
+        reopened = False
+        while True:
+            for line in self._lines:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    return line
+            if not self.loop or reopened:
+                return None
+            self._lines = self._open()
+            reopened = True
+
+    def _fill(self):
+        """Parse the next chunk of positions into the buffers."""
+        count = 0
+        while count < len(self._sides):
+            fen = self._next_fen()
+            if fen is None:
+                break
+            codes, paralyzed, side = parse_fen(fen)
+            self._boards[count] = np.frombuffer(codes, dtype=np.uint8)
+            self._paralyzed[count] = squares_mask(paralyzed)
+            self._sides[count] = side
+            count += 1
+        if not count:
+            raise EOFError("No Archess positions left to load")
+        self._count = count
+        self._index = 0
+
+    def take(self, n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The next ``n`` positions as (boards, paralyzed, sides) arrays."""
+        boards = np.empty((n, 64), dtype=np.uint8)
+        paralyzed = np.empty((n, 64), dtype=bool)
+        sides = np.empty(n, dtype=np.int8)
+        done = 0
+        while done < n:
+            if self._index == self._count:
+                self._fill()
+            k = min(n - done, self._count - self._index)
+            chunk = slice(self._index, self._index + k)
+            boards[done:done + k] = self._boards[chunk]
+            paralyzed[done:done + k] = self._paralyzed[chunk]
+            sides[done:done + k] = self._sides[chunk]
+            self._index += k
+            done += k
+        return boards, paralyzed, sides
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ArchessVecEnv(VecEnv):
+    """
+    Batch of Archess games stepped with NumPy array operations.
+
+    The agent plays white in every game; black replies with the built-in
+    ``random`` or ``greedy`` opponent, or with a policy (a callable
+    position -> move, an SB3 model or a checkpoint path, see
+    ``archess_policy``). A policy with an ``act`` method, such as a model,
+    decides the replies of all games waiting on black in one batched call;
+    illegal replies fall back to random moves. Finished games are reset in place and
+    report ``terminal_observation`` and ``winner`` in their info dict.
+    ``opponent="minimax"`` searches every reply with ``search_options``, on
+    top of the fixed node budget of ``archess_env.SEARCH_DEFAULTS``.
+
+    With ``positions`` (a ``FenLoader``) every reset draws the next loaded
+    position instead of the starting one, e.g. for curriculum or endgame
+    training; where black is to move, the opponent replies first.
+
+    Coin flips and random replies come from ``BatchRNG``, one stream per
+    game: ``env_offset`` is the global index of the first game when this
+    batch is a shard of a larger one, so seeded shards replay exactly the
+    games of the unsharded batch.
+
+    With ``render_mode="rgb_array"``, ``render()`` draws the first
+    ``render_games`` games as one grid image in a single NumPy composite
+    (see ``archess_render.render_boards``), which is what SB3's
+    ``VecVideoRecorder`` records.
+    """
+
+    render_mode = None
+
+    def __init__(self, num_envs: int = 256, opponent: Any = "random",
+                 max_episode_steps: int = 200, seed: Optional[int] = None,
+                 obs_mode: str = "planes", positions: Optional[FenLoader] = None,
+                 env_offset: int = 0, render_mode: Optional[str] = None,
+                 render_games: int = 16, render_board_size: int = 256,
+                 search_options: Optional[Dict[str, Any]] = None):
+        if render_mode not in (None, "rgb_array"):
+            raise ValueError(f"Unsupported render mode for batched games: {render_mode}")
+        self.render_mode = render_mode  # Read back by VecEnv.__init__
+        self.render_games = min(render_games, num_envs)
+        self.render_board_size = render_board_size
+        action_space = spaces.Discrete(8192)
+        super().__init__(num_envs, observation_space(obs_mode), action_space)
+        self.metadata["render_fps"] = RENDER_FPS
+
+        self._policy_seed = seed
+        self.search_options = {**SEARCH_DEFAULTS, **(search_options or {})}
+        self._set_opponent(opponent)
+        self.obs_mode = obs_mode
+        self.positions = positions
+        self._obs_buffer = None
+        if obs_mode != "planes":
+            dtype = np.float32 if obs_mode == "planes_v2" else np.uint8
+            self._obs_buffer = np.empty((num_envs, 64, len(PLANES_V2)), dtype=dtype)
+        self.max_episode_steps = max_episode_steps
+        self.env_offset = env_offset
+        self.rng = BatchRNG(seed, num_envs, env_offset)
+
+        # Game state, one row per game
+        self.boards = np.tile(STARTING_BOARD, (num_envs, 1))
+        self.paralyzed = np.zeros((num_envs, 64), dtype=bool)
+        self.sides = np.full(num_envs, WHITE, dtype=np.int8)
+        self.episode_steps = np.zeros(num_envs, dtype=np.int32)
+        self.dones = np.zeros(num_envs, dtype=bool)
+
+        self._starting_destinations = batch_destinations(
+            self.boards[:1], self.paralyzed[:1], self.sides[:1]
+        )[0]
+        self._destinations = np.tile(self._starting_destinations, (num_envs, 1))
+        self._actions = None
+
+    def reset(self) -> np.ndarray:
+        """Reset every game to the starting position."""
+        if self._seeds[0] is not None:
+            self.rng = BatchRNG(self._seeds[0], self.num_envs, self.env_offset)
+        self._reset_seeds()
+        self._reset_options()
+
+        self._reset_games(np.arange(self.num_envs))
+        self.dones[:] = False
+        return self._get_observations()
+
+    def step_async(self, actions: np.ndarray):
+        self._actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+
+    def step_wait(self):
+        actions = self._actions
+        rows = np.arange(self.num_envs)
+        from_sq = (actions >> 7) & 63
+        to_sq = (actions >> 1) & 63
+
+        # Agent moves; illegal ones are penalized and leave the board untouched
+        reachable = self._destinations[rows, from_sq] >> to_sq.astype(np.uint64)
+        valid = (reachable & _ONE).astype(bool) & (actions >= 0) & (actions < 8192)
+        rewards = np.full(self.num_envs, -0.1, dtype=np.float32)
+        movers = np.flatnonzero(valid)
+        rewards[movers] = self._apply_moves(movers, from_sq[movers], to_sq[movers])
+
+        destinations = self._destinations
+        destinations[movers] = batch_destinations(
+            self.boards[movers], self.paralyzed[movers], self.sides[movers]
+        )
+        terminated = np.zeros(self.num_envs, dtype=bool)
+        terminated[movers] = self._finished(movers)
+
+        # Opponent replies wherever the game goes on
+        repliers = movers[~terminated[movers]]
+        if len(repliers):
+            reply_from, reply_to = self._choose_opponent_moves(repliers)
+            self._apply_moves(repliers, reply_from, reply_to)
+            destinations[repliers] = batch_destinations(
+                self.boards[repliers], self.paralyzed[repliers], self.sides[repliers]
+            )
+            terminated[repliers] = self._finished(repliers)
+
+        self.episode_steps += 1
+        truncated = ~terminated & (self.episode_steps >= self.max_episode_steps)
+        dones = terminated | truncated
+
+        observations = self._get_observations()
+        infos = [{} for _ in range(self.num_envs)]
+        finished = np.flatnonzero(dones)
+        if len(finished):
+            winners = self._winners(finished)
+            for i, winner in zip(finished, winners):
+                infos[i]["terminal_observation"] = observations[i].copy()
+                infos[i]["TimeLimit.truncated"] = bool(truncated[i])
+                infos[i]["winner"] = winner if terminated[i] else None
+            self._reset_games(finished)
+            observations[finished] = self._get_observations(finished)
+
+        self.dones = dones
+        return observations, rewards, dones, infos
+
+    def _reset_games(self, rows: np.ndarray):
+        """Put the given games back to the starting (or next loaded) position."""
+        self.episode_steps[rows] = 0
+        if self.positions is None:
+            self.boards[rows] = STARTING_BOARD
+            self.paralyzed[rows] = False
+            self.sides[rows] = WHITE
+            self._destinations[rows] = self._starting_destinations
+            return
+
+        # Positions that are over before white moves (already decided, or
+        # ended by the opponent's first reply) are replaced by the next ones
+        for _ in range(MAX_POSITION_DRAWS):
+            self.boards[rows], self.paralyzed[rows], self.sides[rows] = self.positions.take(len(rows))
+            self._destinations[rows] = batch_destinations(
+                self.boards[rows], self.paralyzed[rows], self.sides[rows]
+            )
+            # Loaded positions with black to move get the opponent's reply first
+            black = rows[self.sides[rows] == BLACK]
+            black = black[~self._finished(black)]
+            if len(black):
+                reply_from, reply_to = self._choose_opponent_moves(black)
+                self._apply_moves(black, reply_from, reply_to)
+                self._destinations[black] = batch_destinations(
+                    self.boards[black], self.paralyzed[black], self.sides[black]
+                )
+            rows = rows[self._finished(rows)]
+            if not len(rows):
+                return
+        raise ValueError(f"No playable position in {MAX_POSITION_DRAWS} draws from the FEN loader")
+
+    def _apply_moves(self, rows: np.ndarray, from_sq: np.ndarray, to_sq: np.ndarray) -> np.ndarray:
+        """Play one already validated move per listed game and return the mover's rewards."""
+        boards = self.boards
+        pieces = boards[rows, from_sq]
+        targets = boards[rows, to_sq]
+        rewards = CODE_VALUES[targets]
+
+        # Archer shots stay put; shot knights are paralyzed on a coin flip
+        shots = ((pieces & TYPE_MASK) == ARCHER) & (targets != 0)
+        knight_shots = shots & ((targets & TYPE_MASK) == KNIGHT)
+        if knight_shots.any():
+            shot_rows = np.flatnonzero(knight_shots)
+            heads = self.rng.random(rows[shot_rows]) < 0.5
+            rewards[shot_rows] = np.where(heads, 1.5, 0.1)
+            hit = shot_rows[heads]
+            self.paralyzed[rows[hit], to_sq[hit]] = True
+
+        # Captured pieces (by moving or shooting) leave the board
+        captures = (targets != 0) & ~knight_shots
+        self.paralyzed[rows[captures], to_sq[captures]] = False
+        boards[rows[captures], to_sq[captures]] = 0
+
+        moving = ~shots
+        boards[rows[moving], to_sq[moving]] = pieces[moving]
+        boards[rows[moving], from_sq[moving]] = 0
+
+        self.sides[rows] ^= 1
+        return rewards
+
+    def _policy_moves(self, rows: np.ndarray) -> np.ndarray:
+        """The opponent policy's move per listed game, batched when it has ``act``."""
+        policy = self._opponent_policy
+        boards = self.boards[rows]
+        paralyzed = self.paralyzed[rows]
+        sides = self.sides[rows]
+        if hasattr(policy, "act"):
+            return np.asarray(policy.act(boards, paralyzed, sides), dtype=np.int64)
+        return np.array([
+            policy(Position.from_codes(bytes(board), int(pack_squares(mask[None])[0]), int(side)))
+            for board, mask, side in zip(boards, paralyzed, sides)
+        ], dtype=np.int64)
+
+    def _choose_opponent_moves(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Pick one reply per listed game with the opponent."""
+        destinations = self._destinations[rows]
+        n = len(rows)
+        from_sq = np.zeros(n, dtype=np.int64)
+        to_sq = np.zeros(n, dtype=np.int64)
+        pending = np.ones(n, dtype=bool)
+
+        if self._opponent_policy is not None:
+            moves = self._policy_moves(rows)
+            from_sq = (moves >> 7) & 63
+            to_sq = (moves >> 1) & 63
+            reachable = destinations[np.arange(n), from_sq] >> to_sq.astype(np.uint64)
+            pending = ~(reachable & _ONE).astype(bool) | (moves < 0) | (moves >= 8192)
+        elif self.opponent == "greedy":
+            # Highest-value capture, lowest from-square and target on ties
+            values = CODE_VALUES[self.boards[rows]]
+            for value in VALUE_CLASSES:
+                captures = destinations & pack_squares(values == value)[:, None]
+                found = pending & (captures != _ZERO).any(axis=1)
+                if found.any():
+                    picked = np.flatnonzero(found)
+                    from_sq[picked] = (captures[picked] != _ZERO).argmax(axis=1)
+                    best = captures[picked, from_sq[picked]]
+                    to_sq[picked] = unpack_squares(best).argmax(axis=1)
+                    pending &= ~found
+
+        # Uniform random legal move (also the greedy fallback without captures)
+        if pending.any():
+            picked = np.flatnonzero(pending)
+            candidates = destinations[picked]
+            counts = POPCOUNT8[candidates.astype('<u8', copy=False).view(np.uint8)
+                               .reshape(len(picked), 64, 8)].sum(axis=2)
+            totals = np.cumsum(counts, axis=1)
+            draws = (self.rng.random(rows[picked]) * totals[:, -1]).astype(np.int64)
+            chosen_from = (totals > draws[:, None]).argmax(axis=1)
+            index = draws - (totals[np.arange(len(picked)), chosen_from] - counts[np.arange(len(picked)), chosen_from])
+            targets = unpack_squares(candidates[np.arange(len(picked)), chosen_from])
+            chosen_to = (np.cumsum(targets, axis=1) > index[:, None]).argmax(axis=1)
+            from_sq[picked] = chosen_from
+            to_sq[picked] = chosen_to
+
+        return from_sq, to_sq
+
+    def _finished(self, rows: np.ndarray) -> np.ndarray:
+        """Whether a king is gone or the side to move has no legal move."""
+        boards = self.boards[rows]
+        kings = (boards == KING).any(axis=1) & (boards == (KING | BLACK_FLAG)).any(axis=1)
+        return ~kings | ~(self._destinations[rows] != _ZERO).any(axis=1)
+
+    def _winners(self, rows: np.ndarray) -> List[str]:
+        """Winner label per listed game, as in ArchessEnv's info."""
+        boards = self.boards[rows]
+        white_king = (boards == KING).any(axis=1)
+        black_king = (boards == (KING | BLACK_FLAG)).any(axis=1)
+        return ['black' if not w else 'white' if not b else 'draw'
+                for w, b in zip(white_king, black_king)]
+
+    def _get_observations(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Observation batch for every game, or for the listed ones."""
+        if rows is not None:
+            return encode_observations(self.boards[rows], self.paralyzed[rows], self.sides[rows],
+                                       self.obs_mode)
+        observations = encode_observations(self.boards, self.paralyzed, self.sides,
+                                           self.obs_mode, self._obs_buffer)
+        # SB3 keeps the returned batch around, so the reused buffer is copied
+        if self._obs_buffer is not None and self.obs_mode != "planes_v2_packed":
+            observations = observations.copy()
+        return observations
+
+    def action_masks(self) -> np.ndarray:
+        """(B, 8192) boolean mask of legal actions for every game."""
+        return batch_action_masks(self.boards, self._destinations)
+
+    def render_frames(self) -> np.ndarray:
+        """(render_games, H, W, 3) frames of the first ``render_games`` games."""
+        from archess_render import render_boards
+        n = self.render_games
+        return render_boards(self.boards[:n], self.paralyzed[:n], self.render_board_size)
+
+    def get_images(self) -> List[np.ndarray]:
+        return list(self.render_frames())
+
+    def render(self, mode: Optional[str] = None) -> Optional[np.ndarray]:
+        """Grid image of the rendered games (``rgb_array`` mode only)."""
+        if (mode or self.render_mode) != "rgb_array":
+            return super().render(mode)
+        from archess_render import tile_frames
+        return tile_frames(self.render_frames())
+
+    def close(self):
+        if self.positions is not None:
+            self.positions.close()
+
+    def get_attr(self, attr_name: str, indices=None) -> List[Any]:
+        value = getattr(self, attr_name)
+        return [value for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name: str, value: Any, indices=None):
+        require_all_games(attr_name, self._get_indices(indices), self.num_envs)
+        if attr_name == "opponent":
+            self._set_opponent(value)
+        else:
+            setattr(self, attr_name, value)
+
+    def _set_opponent(self, opponent: Any):
+        """Use a built-in opponent by name, or load any other as a policy."""
+        self.opponent = opponent
+        self._opponent_policy = None
+        if not (isinstance(opponent, str) and opponent in ("random", "greedy")):
+            from archess_policy import make_policy
+            self._opponent_policy = make_policy(opponent, self._policy_seed, self.search_options)
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs) -> List[Any]:
+        """Call a batch-level method and split its per-game result by env index."""
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return split_by_game(result, self._get_indices(indices), self.num_envs)
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> List[bool]:
+        return [False for _ in self._get_indices(indices)]
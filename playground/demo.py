@@ -136,43 +136,11 @@ def ai_vs_ai_demo():
     pygame.quit()
 
 def benchmark_environment():
-    """Benchmark the environment performance."""
-    print("Benchmarking Archess Environment...")
-    
-    env = ArchessEnv(opponent="random")
-    
-    # Test random actions
-    total_steps = 0
-    total_episodes = 100
-    total_rewards = []
-    
-    import time
-    start_time = time.time()
-    
-    for episode in range(total_episodes):
-        obs, info = env.reset()
-        episode_reward = 0
-        steps = 0
-        done = False
-        
-        while not done and steps < 200:  # Limit episode length
-            action = env.action_space.sample()
-            obs, reward, terminated, truncated, info = env.step(action)
-            episode_reward += reward
-            steps += 1
-            done = terminated or truncated
-        
-        total_steps += steps
-        total_rewards.append(episode_reward)
-    
-    end_time = time.time()
+    """Benchmark the environment performance (see archess_benchmark.py for all scenarios)."""
+    from archess_benchmark import run_benchmarks
     
-    print(f"Completed {total_episodes} episodes in {end_time - start_time:.2f} seconds")
-    print(f"Average steps per episode: {total_steps / total_episodes:.1f}")
-    print(f"Steps per second: {total_steps / (end_time - start_time):.1f}")
-    print(f"Average reward: {np.mean(total_rewards):.2f} ± {np.std(total_rewards):.2f}")
-    
-    env.close()
+    print("Benchmarking Archess Environment...")
+    run_benchmarks(["legal_random", "masked", "vectorized_b256"])
 
 if __name__ == "__main__":
     print("Archess Environment Demo")
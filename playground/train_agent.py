@@ -6,20 +6,107 @@ import gymnasium as gym
 import numpy as np
 from stable_baselines3 import PPO, A2C, DQN
 from stable_baselines3.common.env_util import make_vec_env
-from stable_baselines3.common.evaluation import evaluate_policy
-from stable_baselines3.common.callbacks import EvalCallback, StopTrainingOnRewardThreshold
+from stable_baselines3.common.vec_env import VecMonitor, VecVideoRecorder
+from stable_baselines3.common.logger import Image
+from stable_baselines3.common.callbacks import BaseCallback, CallbackList, StopTrainingOnRewardThreshold
 import matplotlib.pyplot as plt
 from archess_env import ArchessEnv
+from archess_policy import load_model
 
 def create_archess_env():
     """Create and return an Archess environment."""
     return ArchessEnv(opponent="random")
 
-def train_agent(algorithm="PPO", total_timesteps=100000, opponent="random"):
-    """Train an RL agent to play Archess."""
+class ProfilingCallback(BaseCallback):
+    """
+    Record the training envs' ``stats()`` in the logger (and so TensorBoard)
+    every ``log_freq`` calls, summed over envs and reset after each record.
+    """
+    
+    def __init__(self, log_freq=2048, verbose=0):
+        super().__init__(verbose)
+        self.log_freq = log_freq
+    
+    def _on_step(self):
+        if self.n_calls % self.log_freq == 0:
+            self.record_stats()
+        return True
+    
+    def record_stats(self):
+        per_env = [stats for stats in self.training_env.env_method("stats", reset=True) if stats]
+        steps = sum(stats['steps'] for stats in per_env)
+        if not steps:
+            return
+        self.logger.record("profile/invalid_action_rate", sum(s['invalid_actions'] for s in per_env) / steps)
+        self.logger.record("profile/archer_shots_per_step", sum(s['archer_shots'] for s in per_env) / steps)
+        for method in per_env[0]['methods']:
+            calls = sum(stats['methods'][method]['calls'] for stats in per_env)
+            ns = sum(stats['methods'][method]['ns'] for stats in per_env)
+            name = method.lstrip('_')
+            if name != "step":
+                self.logger.record(f"profile/{name}_calls_per_step", calls / steps)
+            self.logger.record(f"profile/{name}_us_per_step", ns / steps / 1000)
+
+class BoardImageCallback(BaseCallback):
+    """Log a grid image of the training games to TensorBoard every ``log_freq`` calls."""
+    
+    def __init__(self, log_freq=10000, verbose=0):
+        super().__init__(verbose)
+        self.log_freq = log_freq
+    
+    def _on_step(self):
+        if self.n_calls % self.log_freq == 0:
+            frame = self.training_env.render()
+            if frame is not None:
+                self.logger.record("games/boards", Image(frame, "HWC"), exclude=("stdout", "log", "json", "csv"))
+        return True
+
+def train_agent(algorithm="PPO", total_timesteps=100000, opponent="random", n_envs=4, batched=False,
+                n_workers=1, profile=False, video_freq=0):
+    """
+    Train an RL agent to play Archess.
+    
+    With ``batched=True`` the ``n_envs`` games run inside one ArchessVecEnv
+    (array-stepped, meant for hundreds of games) instead of separate
+    ArchessEnv copies. With ``n_workers > 1`` they are additionally split
+    over that many worker processes sharing memory buffers.
+    
+    With ``profile=True`` the ArchessEnv copies collect hot-path counters
+    (see archess_profiling) that are logged to TensorBoard under ``profile/``.
+    
+    With ``video_freq > 0`` the training games render to rgb_array: every
+    ``video_freq`` steps a grid of them is logged to TensorBoard under
+    ``games/boards`` and, if moviepy is installed, a 200-step mp4 is saved
+    to ./videos/ by SB3's VecVideoRecorder. Batched envs draw all their games
+    in one NumPy composite (see archess_render.render_boards).
+    """
+    if profile and (batched or n_workers > 1):
+        raise ValueError("profile=True instruments ArchessEnv copies; use batched=False and n_workers=1")
     
     # Create environment
-    env = make_vec_env(lambda: ArchessEnv(opponent=opponent), n_envs=4)
+    render_mode = "rgb_array" if video_freq else None
+    if n_workers > 1:
+        from archess_subproc_env import ArchessSubprocVecEnv
+        env = VecMonitor(ArchessSubprocVecEnv(num_envs=n_envs, n_workers=n_workers, opponent=opponent,
+                                              render_mode=render_mode))
+    elif batched:
+        from archess_vec_env import ArchessVecEnv
+        env = VecMonitor(ArchessVecEnv(num_envs=n_envs, opponent=opponent, render_mode=render_mode))
+    else:
+        env = make_vec_env(lambda: ArchessEnv(opponent=opponent, render_mode=render_mode,
+                                              profile="counters" if profile else None),
+                           n_envs=n_envs)
+    
+    if video_freq:
+        try:
+            env = VecVideoRecorder(env, f"./videos/{algorithm.lower()}_archess",
+                                   record_video_trigger=lambda step: step % video_freq == 0,
+                                   video_length=200)
+        except gym.error.DependencyNotInstalled as e:
+            print(f"Not saving videos ({e}); board images still go to TensorBoard")
+    
+    # Keep the rollout size at 8192 transitions however many games run
+    rollout_steps = max(8, 8192 // n_envs)
     
     # Create evaluation environment
     eval_env = ArchessEnv(opponent=opponent)
@@ -31,7 +118,24 @@ def train_agent(algorithm="PPO", total_timesteps=100000, opponent="random"):
             env, 
             verbose=1,
             learning_rate=3e-4,
-            n_steps=2048,
+            n_steps=rollout_steps,
+            batch_size=64,
+            n_epochs=10,
+            gamma=0.99,
+            gae_lambda=0.95,
+            clip_range=0.2,
+            ent_coef=0.01,
+            tensorboard_log="./archess_tensorboard/"
+        )
+    elif algorithm == "MaskablePPO":
+        # Optional dependency: only needed for masked-policy training
+        from sb3_contrib import MaskablePPO
+        model = MaskablePPO(
+            "MlpPolicy",
+            env,
+            verbose=1,
+            learning_rate=3e-4,
+            n_steps=rollout_steps,
             batch_size=64,
             n_epochs=10,
             gamma=0.99,
@@ -74,7 +178,14 @@ def train_agent(algorithm="PPO", total_timesteps=100000, opponent="random"):
     else:
         raise ValueError(f"Unknown algorithm: {algorithm}")
     
-    # Create evaluation callback
+    # Create evaluation callback (the masked variant feeds action masks to the policy)
+    if algorithm == "MaskablePPO":
+        from sb3_contrib.common.maskable.callbacks import MaskableEvalCallback as EvalCallback
+        from sb3_contrib.common.maskable.evaluation import evaluate_policy
+    else:
+        from stable_baselines3.common.callbacks import EvalCallback
+        from stable_baselines3.common.evaluation import evaluate_policy
+    
     eval_callback = EvalCallback(
         eval_env,
         best_model_save_path=f'./models/{algorithm.lower()}_archess_best',
@@ -87,10 +198,17 @@ def train_agent(algorithm="PPO", total_timesteps=100000, opponent="random"):
     print(f"Training {algorithm} agent against {opponent} opponent...")
     print(f"Total timesteps: {total_timesteps}")
     
+    callbacks = [eval_callback]
+    if profile:
+        callbacks.append(ProfilingCallback())
+    if video_freq:
+        callbacks.append(BoardImageCallback(video_freq))
+    callback = CallbackList(callbacks) if len(callbacks) > 1 else eval_callback
+    
     # Train the agent
     model.learn(
         total_timesteps=total_timesteps,
-        callback=eval_callback,
+        callback=callback,
         progress_bar=True
     )
     
@@ -110,14 +228,8 @@ def test_agent(model_path, n_episodes=10, render=False):
     """Test a trained agent."""
     
     # Load the model
-    if "ppo" in model_path.lower():
-        model = PPO.load(model_path)
-    elif "a2c" in model_path.lower():
-        model = A2C.load(model_path)
-    elif "dqn" in model_path.lower():
-        model = DQN.load(model_path)
-    else:
-        raise ValueError("Cannot determine algorithm from model path")
+    masked = "maskableppo" in model_path.lower()
+    model = load_model(model_path)
     
     # Create test environment
     env = ArchessEnv(render_mode="human" if render else None, opponent="random")
@@ -131,7 +243,10 @@ def test_agent(model_path, n_episodes=10, render=False):
         done = False
         
         while not done:
-            action, _ = model.predict(obs, deterministic=True)
+            if masked:
+                action, _ = model.predict(obs, deterministic=True, action_masks=env.action_masks())
+            else:
+                action, _ = model.predict(obs, deterministic=True)
             obs, reward, terminated, truncated, info = env.step(action)
             episode_reward += reward
             done = terminated or truncated
@@ -7,35 +7,10 @@ from typing import List, Tuple
 
 def get_valid_actions(env) -> List[int]:
     """Get all valid actions for the current player."""
-    valid_actions = []
-    
-    for from_row in range(8):
-        for from_col in range(8):
-            piece = env.board[from_row, from_col]
-            if piece != '':
-                # Check if piece belongs to current player
-                is_white_piece = piece.isupper()
-                if (env.current_player == 'white') == is_white_piece:
-                    # Check if this piece is disabled (for knights)
-                    piece_key = f"{from_row}-{from_col}"
-                    if piece.lower() == 'n' and (from_row, from_col) in env.disabled_knights:
-                        continue
-                    
-                    # Get possible moves for this piece
-                    possible_moves = env._get_possible_moves((from_row, from_col))
-                    
-                    for to_row, to_col in possible_moves:
-                        # Check if this is a ranged attack
-                        is_ranged = (piece.lower() == 'a' and 
-                                   abs(to_row - from_row) <= 2 and 
-                                   to_col == from_col and 
-                                   env.board[to_row, to_col] != '')
-                        
-                        action_type = 1 if is_ranged else 0
-                        action = env._encode_action((from_row, from_col), (to_row, to_col), action_type)
-                        valid_actions.append(action)
-    
-    return valid_actions
+    if env.game_over:
+        return []
+    # Position moves already use the action encoding (type 1 for archer shots)
+    return env.position.legal_moves()
 
 def sample_valid_action(env) -> int:
     """Sample a valid action for the current player."""